@@ -3,12 +3,18 @@ import argparse
 from logger import log
 from utils import get_config
 from crawler.factory import get_crawler
+from crawler.multisite import MultiSiteRunner
 
 
-def main(config_fpath):
+def main(config_fpath, resume):
     config = get_config(config_fpath)
+    if resume:
+        config["resume"] = True
     log.setup_logging(log_dir=config["output_dpath"], 
                       config_fpath=config["logger_fpath"])
+    if config.get("jobs"):
+        MultiSiteRunner(config).run()
+        return
     crawler = get_crawler(**config)
     crawler.start_crawling()
 
@@ -19,5 +25,8 @@ if __name__ == "__main__":
                         default="config.yml", 
                         help="path to config file",
                         dest="config_fpath") 
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="continue an interrupted run, skipping urls which are already crawled")
     args = parser.parse_args()
     main(**vars(args))
@@ -0,0 +1,66 @@
+"""
+Fingerprints/s and near-duplicates found by the dedup methods on synthetic articles: each original is published
+again with a fraction of its words replaced, and unrelated articles should never match.
+
+    python -m benchmarks.dedup --articles 2000 --edits 0.01 0.05 0.1
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from crawler.dedup import DedupIndex, MinHash, SimHash
+
+# about the number of Vietnamese syllables in use
+VOCABULARY_SIZE = 7000
+
+
+def make_article(rng, vocabulary, num_words) -> list:
+    return [rng.choice(vocabulary) for _ in range(num_words)]
+
+
+def edit_article(rng, vocabulary, words, fraction) -> list:
+    words = list(words)
+    for _ in range(int(len(words) * fraction)):
+        words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return words
+
+
+def run(fingerprint, originals, copies) -> tuple:
+    with tempfile.TemporaryDirectory() as dpath:
+        index = DedupIndex(os.path.join(dpath, "dedup.sqlite3"), fingerprint)
+        start = time.perf_counter()
+        false_positives = sum(index.find_original(f"original-{i}", text) is not None
+                              for i, text in enumerate(originals))
+        found = sum(index.find_original(f"copy-{i}", text) == f"original-{i}" for i, text in enumerate(copies))
+        elapsed = time.perf_counter() - start
+        index.close()
+    return found, false_positives, (len(originals) + len(copies)) / elapsed
+
+
+def main(num_articles, num_words, edits, threshold, max_distance, seed):
+    rng = random.Random(seed)
+    vocabulary = [f"từ{i}" for i in range(VOCABULARY_SIZE)]
+    articles = [make_article(rng, vocabulary, num_words) for _ in range(num_articles)]
+    originals = [" ".join(words) for words in articles]
+
+    print(f"{'method':<22} {'edits':>6} {'found':>7} {'false +':>8} {'articles/s':>11}")
+    for fraction in edits:
+        copies = [" ".join(edit_article(rng, vocabulary, words, fraction)) for words in articles]
+        for fingerprint in (MinHash(threshold), SimHash(max_distance)):
+            found, false_positives, rate = run(fingerprint, originals, copies)
+            print(f"{fingerprint.name:<22} {fraction:>6} {found / num_articles:>7.1%} {false_positives:>8} {rate:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate detection benchmark")
+    parser.add_argument("--articles", type=int, default=2000, help="originals, each one published again edited")
+    parser.add_argument("--words", type=int, default=500, help="words per article")
+    parser.add_argument("--edits", type=float, nargs="+", default=[0.01, 0.05, 0.1],
+                        help="fractions of the words replaced in copies")
+    parser.add_argument("--threshold", type=float, default=0.6, help="dedup_threshold of minhash")
+    parser.add_argument("--max-distance", type=int, default=3, dest="max_distance", help="dedup_max_distance of simhash")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.articles, args.words, args.edits, args.threshold, args.max_distance, args.seed)
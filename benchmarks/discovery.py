@@ -0,0 +1,62 @@
+"""
+Urls found, requests, bytes downloaded and time of url discovery from listing pages, the RSS feed and the sitemaps
+of a category.
+
+    python -m benchmarks.discovery --webname dantri --pages 20 --date-cutoff 1
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from benchmarks.server import NewsServer
+from crawler.factory import get_crawler
+
+SOURCES = ("listing", "rss", "sitemap")
+
+
+def run(webname, output_dpath, article_type, **config):
+    crawler = get_crawler(webname, task="type", article_type=article_type, output_dpath=output_dpath,
+                          collect_metrics=True, **config)
+    start = time.perf_counter()
+    articles_urls = crawler.get_urls_of_type(article_type)
+    elapsed = time.perf_counter() - start
+
+    counters = crawler.metrics.snapshot()["counters"]
+    num_requests = sum(counter["value"] for counter in counters.get("responses_total", []))
+    num_bytes = sum(counter["value"] for counter in counters.get("bytes_downloaded_total", []))
+    return len(articles_urls), num_requests, num_bytes, elapsed
+
+
+def main(webname, article_type, pages, per_page, date_cutoff, num_workers, latency):
+    logging.basicConfig(level=logging.WARNING)
+    server = NewsServer(latency=latency, webname=webname, pages_per_type=pages, per_page=per_page).start()
+    crawler = get_crawler(webname)
+    article_type = article_type or crawler.article_type_dict[0]
+    config = dict(num_workers=num_workers, total_pages=pages, date_cutoff=date_cutoff, base_url=server.base_url)
+    if date_cutoff is not None:
+        config.update(pagination="adaptive", total_pages=0)
+
+    print(f"{'discovery':<10} {'urls':>6} {'requests':>9} {'KB':>9} {'seconds':>8}")
+    try:
+        for source in SOURCES:
+            with tempfile.TemporaryDirectory() as output_dpath:
+                num_urls, num_requests, num_bytes, elapsed = run(webname, output_dpath, article_type,
+                                                                 discovery=source, **config)
+            print(f"{source:<10} {num_urls:>6} {num_requests:>9} {num_bytes / 1024:9.1f} {elapsed:8.2f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Url discovery benchmark")
+    parser.add_argument("--webname", default="vnexpress", choices=["vnexpress", "dantri", "vietnamnet"])
+    parser.add_argument("--article-type", default=None, dest="article_type")
+    parser.add_argument("--pages", type=int, default=20, help="listing pages per category")
+    parser.add_argument("--per-page", type=int, default=20, dest="per_page")
+    parser.add_argument("--date-cutoff", type=float, default=None, dest="date_cutoff",
+                        help="only articles of the last days, with adaptive pagination for listing pages")
+    parser.add_argument("--num-workers", type=int, default=8, dest="num_workers")
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency in seconds")
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,91 @@
+"""
+Distributed crawl against NewsServer: a coordinator enqueues article urls and several local worker processes
+crawl them from the shared work queue (the SQLite database, or the coordinator over HTTP with --http).
+--kill terminates the first worker in the middle of the crawl, its leased urls are crawled by the others
+once their lease expired.
+
+    python -m benchmarks.distributed --processes 1 2 4 --num-urls 400 --latency 0.05
+    python -m benchmarks.distributed --processes 3 --http --kill
+"""
+import argparse
+import glob
+import logging
+import multiprocessing
+import tempfile
+import threading
+import time
+
+from benchmarks.server import NewsServer
+from crawler.factory import get_crawler
+
+QUEUE_PORT = 8765
+
+
+def run_worker(webname, config):
+    logging.basicConfig(level=logging.WARNING)
+    get_crawler(webname, distributed="worker", **config).start_crawling()
+
+
+def run(webname, base_url, num_processes, num_urls, output_dpath, use_http, kill, config):
+    urls_fpath = f"{output_dpath}/urls.txt"
+    with open(urls_fpath, "w") as urls_file:
+        urls_file.write("\n".join(f"{base_url}/article-{i}.html" for i in range(num_urls)))
+    config = dict(base_url=base_url, output_dpath=f"{output_dpath}/result", task="url", urls_fpath=urls_fpath,
+                  poll_seconds=0.2, **config)
+
+    coordinator = get_crawler(webname, distributed="coordinator",
+                              queue_port=QUEUE_PORT if use_http else 0, queue_host="127.0.0.1", **config)
+    results = dict()
+    coordinator_thread = threading.Thread(target=lambda: results.update(failed=coordinator.start_crawling()))
+
+    start = time.perf_counter()
+    coordinator_thread.start()
+    if use_http:
+        config["queue_url"] = f"http://127.0.0.1:{QUEUE_PORT}"
+        # workers only find a queue once the coordinator serves it
+        time.sleep(0.5)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(webname, config)) for _ in range(num_processes)]
+    for worker in workers:
+        worker.start()
+    if kill:
+        time.sleep(2)
+        workers[0].terminate()
+    for worker in workers:
+        worker.join()
+    coordinator_thread.join()
+    elapsed = time.perf_counter() - start
+
+    num_files = len(glob.glob(f"{output_dpath}/result/url_*.txt"))
+    return elapsed, num_files, results.get("failed")
+
+
+def main(processes, num_urls, num_workers, latency, use_http, kill, lease_seconds):
+    logging.basicConfig(level=logging.WARNING)
+    webname = "vnexpress"
+    config = dict(num_workers=num_workers, lease_batch=num_workers * 2, lease_seconds=lease_seconds)
+
+    print(f"{'processes':>9} {'urls/s':>8} {'written':>8} {'failed':>7} {'elapsed':>8}")
+    for num_processes in processes:
+        server = NewsServer(latency=latency, webname=webname).start()
+        try:
+            with tempfile.TemporaryDirectory() as output_dpath:
+                elapsed, num_files, num_failed = run(webname, server.base_url, num_processes, num_urls,
+                                                     output_dpath, use_http, kill, config)
+        finally:
+            server.stop()
+        print(f"{num_processes:>9} {num_urls / elapsed:8.1f} {num_files:>8} {num_failed:>7} {elapsed:8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed crawl benchmark with local worker processes")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="numbers of worker processes")
+    parser.add_argument("--num-urls", type=int, default=400, dest="num_urls")
+    parser.add_argument("--num-workers", type=int, default=4, dest="num_workers", help="threads per worker process")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency in seconds")
+    parser.add_argument("--http", action="store_true", dest="use_http",
+                        help="workers use the queue served by the coordinator instead of the SQLite file")
+    parser.add_argument("--kill", action="store_true", help="terminate the first worker after 2 seconds")
+    parser.add_argument("--lease-seconds", type=float, default=5, dest="lease_seconds")
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,52 @@
+"""
+Compare the thread and async engines of BaseCrawler.crawl_urls against a local stand-in server.
+
+    python -m benchmarks.engines --num-urls 500 --latency 0.2
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from benchmarks.server import NewsServer
+from crawler.factory import get_crawler
+
+
+def run_engine(base_url, num_urls, output_dpath, **config):
+    urls_fpath = f"{output_dpath}/urls.txt"
+    with open(urls_fpath, "w") as urls_file:
+        urls_file.write("\n".join(f"{base_url}/article-{i}.html" for i in range(num_urls)))
+
+    crawler = get_crawler("vnexpress", task="url", urls_fpath=urls_fpath,
+                          output_dpath=f"{output_dpath}/result", **config)
+    start = time.perf_counter()
+    crawler.start_crawling()
+    return time.perf_counter() - start
+
+
+def main(num_urls, latency, num_workers, max_in_flight):
+    logging.basicConfig(level=logging.WARNING)
+    # small pages: measure the engines, not the parser
+    server = NewsServer(latency=latency, noise=False).start()
+
+    engines = {
+        f"thread (num_workers={num_workers})": dict(engine="thread", num_workers=num_workers),
+        f"async (max_in_flight={max_in_flight})": dict(engine="async", max_in_flight=max_in_flight),
+    }
+    try:
+        for name, config in engines.items():
+            with tempfile.TemporaryDirectory() as output_dpath:
+                elapsed = run_engine(server.base_url, num_urls, output_dpath, **config)
+            print(f"{name:<32} {elapsed:8.2f}s {num_urls / elapsed:10.1f} urls/s")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread vs async engine benchmark")
+    parser.add_argument("--num-urls", type=int, default=500, dest="num_urls")
+    parser.add_argument("--latency", type=float, default=0.2, help="server latency in seconds")
+    parser.add_argument("--num-workers", type=int, default=16, dest="num_workers")
+    parser.add_argument("--max-in-flight", type=int, default=200, dest="max_in_flight")
+    args = parser.parse_args()
+    main(**vars(args))
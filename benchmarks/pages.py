@@ -0,0 +1,190 @@
+"""
+Synthetic pages mimicking the markup of each supported website.
+Article pages are surrounded by the menus, related articles, comments and scripts of a real page.
+Pages recorded from the real websites by benchmarks.record are used instead when they exist.
+"""
+import datetime
+import email.utils
+import hashlib
+import os
+import time
+
+FIXTURES_DPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+NOISE = "\n".join(
+    f'<div class="box-category"><h3 class="title-related"><a href="/related-{i}.html">Tin liên quan {i}</a></h3>'
+    f'<p class="description-related">Tóm tắt tin liên quan số {i} được hiển thị bên dưới bài viết.</p>'
+    f'<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{"related": {i}}});</script></div>'
+    for i in range(150)
+)
+
+PARAGRAPH = "Đoạn văn thứ {i} của bài viết, nội dung được lặp lại để có độ dài giống một bài báo thật trên trang tin tức."
+
+ARTICLE_TEMPLATES = {
+    "vnexpress": """<html><head><title>{title}</title></head><body>
+<header>{noise}</header>
+<h1 class="title-detail">{title}</h1>
+<p class="description"><span class="location-stamp">Hà Nội</span>Mô tả bài viết {title}</p>
+<article class="fck_detail">
+<figure class="tplCaption"><picture><img data-src="/images/{title}.jpg"/></picture></figure>
+{paragraphs}
+<figure class="tplCaption"><picture><img data-src="/images/{title}-1.jpg"/></picture></figure>
+</article>
+<section class="comment">{noise}</section>
+</body></html>""",
+    "dantri": """<html><head><title>{title}</title></head><body>
+<header>{noise}</header>
+<h1 class="title-page detail">{title}</h1>
+<h2 class="singular-sapo">Mô tả bài viết {title}</h2>
+<div class="singular-content">
+<figure class="image align-center"><img src="/images/{title}.jpg"/></figure>
+{paragraphs}
+<figure class="image align-center"><img data-src="/images/{title}-1.jpg"/></figure>
+</div>
+<section class="article-related">{noise}</section>
+</body></html>""",
+    "vietnamnet": """<html><head><title>{title}</title></head><body>
+<header>{noise}</header>
+<h1 class="content-detail-title">{title}</h1>
+<h2 class="content-detail-sapo sm-sapo-mb-0">Mô tả bài viết {title}</h2>
+<div class="maincontent main-content">
+<figure class="image"><img src="/images/{title}.jpg"/></figure>
+{paragraphs}
+<figure class="image"><img data-original="/images/{title}-1.jpg"/></figure>
+</div>
+<section class="article-relate">{noise}</section>
+</body></html>""",
+}
+
+PARAGRAPH_TAGS = {
+    "vnexpress": '<p class="Normal">{text}</p>',
+    "dantri": "<p>{text}</p>",
+    "vietnamnet": "<p>{text}</p>",
+}
+
+
+def make_article(webname, title, num_paragraphs=20, noise=True) -> bytes:
+    paragraphs = "\n".join(PARAGRAPH_TAGS[webname].format(text=PARAGRAPH.format(i=i)) for i in range(num_paragraphs))
+    html = ARTICLE_TEMPLATES[webname].format(title=title, paragraphs=paragraphs, noise=NOISE if noise else "")
+    return html.encode("utf-8")
+
+LISTING_ITEMS = {
+    "vnexpress": '<article class="item-news" data-publishtime="{published}"><h3 class="title-news"><a href="{href}">{title}</a></h3></article>',
+    "dantri": '<article class="article-item"><h3 class="article-title"><a href="{href}">{title}</a></h3></article>',
+    "vietnamnet": '<div class="horizontalPost"><h3 class="horizontalPost__main-title vnn-title"><a href="{href}">{title}</a></h3></div>',
+}
+
+# seconds between two articles of a listing
+PUBLISH_INTERVAL = 3600
+
+# listing page urls of each website, see get_type_page_url of the crawlers
+LISTING_PATTERNS = {
+    "vnexpress": r"^/(?P<article_type>[\w-]+)-p(?P<page_number>\d+)$",
+    "dantri": r"^/(?P<article_type>[\w-]+)/trang-(?P<page_number>\d+)\.htm$",
+    "vietnamnet": r"^/(?P<article_type>[\w-]+)-page(?P<page_number>\d+)$",
+}
+
+
+# search result pages, see get_search_page_url of the crawlers supporting search
+SEARCH_PATTERNS = {
+    "vnexpress": r"^/\?q=(?P<query>[^&]*)&.*page=(?P<page_number>\d+)$",
+}
+
+
+def make_listing(webname, base_url, article_type, page_number, per_page=20) -> bytes:
+    """
+    Listing page linking to per_page articles, DanTri links are relative like on the real website
+    Articles are published every PUBLISH_INTERVAL seconds before now, newest first (VNExpress only shows it)
+    """
+    prefix = "" if webname == "dantri" else base_url
+    now = int(time.time())
+    items = "\n".join(
+        LISTING_ITEMS[webname].format(href=f"{prefix}/{article_type}-{page_number}-{i}.html", title=f"Bài {page_number}-{i}",
+                                      published=now - ((page_number - 1) * per_page + i) * PUBLISH_INTERVAL)
+        for i in range(per_page)
+    )
+    html = f"<html><body><header>{NOISE}</header><section>{items}</section></body></html>"
+    return html.encode("utf-8")
+
+
+# images of articles, /images/<name>-<n>.jpg is the same image as /images/<name>.jpg
+IMAGE_PATTERN = r"^/images/(?P<name>[\w-]+?)(?:-\d+)?\.jpg$"
+
+
+def make_image(name, size=20 * 1024) -> bytes:
+    """ JPEG-looking bytes, the same for the same name """
+    digest = hashlib.sha256(name.encode()).digest()
+    return b"\xff\xd8\xff\xe0" + (digest * (size // len(digest) + 1))[:size - 4]
+
+
+# RSS feed, sitemap index and sitemaps of the website (one per category and listing page), in robots.txt
+FEED_PATTERN = r"^/rss/(?P<article_type>[\w-]+)\.rss$"
+SITEMAP_PATTERN = r"^/sitemaps/(?P<article_type>[\w-]+)-(?P<page_number>\d+)\.xml$"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def get_feed_articles(base_url, article_type, page_number, per_page):
+    """ (url, publish time) of the articles of a listing page, their url has the category like DanTri ones """
+    now = int(time.time())
+    for i in range(per_page):
+        yield (f"{base_url}/{article_type}/{article_type}-{page_number}-{i}.html",
+               now - ((page_number - 1) * per_page + i) * PUBLISH_INTERVAL)
+
+
+def make_rss(base_url, article_type, num_pages, per_page=20) -> bytes:
+    """ RSS 2.0 feed of the articles of num_pages listing pages """
+    items = "\n".join(
+        f"<item><title>Bài {url}</title><link>{url}</link>"
+        f"<pubDate>{email.utils.formatdate(published, usegmt=True)}</pubDate></item>"
+        for page_number in range(1, num_pages + 1)
+        for url, published in get_feed_articles(base_url, article_type, page_number, per_page)
+    )
+    xml = (f'<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel><title>{article_type}</title>'
+           f"<link>{base_url}</link>\n{items}\n</channel></rss>")
+    return xml.encode("utf-8")
+
+
+def make_sitemap_index(base_url, article_types, num_pages, per_page=20) -> bytes:
+    """ Sitemap index of one sitemap per category and listing page, last modified at its newest article """
+    sitemaps = "\n".join(
+        f"<sitemap><loc>{base_url}/sitemaps/{article_type}-{page_number}.xml</loc>"
+        f"<lastmod>{iso_date(next(get_feed_articles(base_url, article_type, page_number, per_page))[1])}</lastmod></sitemap>"
+        for article_type in article_types
+        for page_number in range(1, num_pages + 1)
+    )
+    xml = (f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n'
+           f"{sitemaps}\n</sitemapindex>")
+    return xml.encode("utf-8")
+
+
+def make_sitemap(base_url, article_type, page_number, per_page=20) -> bytes:
+    urls = "\n".join(
+        f"<url><loc>{url}</loc><lastmod>{iso_date(published)}</lastmod></url>"
+        for url, published in get_feed_articles(base_url, article_type, page_number, per_page)
+    )
+    xml = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n{urls}\n</urlset>'
+    return xml.encode("utf-8")
+
+
+def iso_date(timestamp) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def fixture_fpath(webname, kind, fixtures_dpath=FIXTURES_DPATH) -> str:
+    """ Path of the recorded page of a website, kind = "article", "listing" or "search" """
+    return os.path.join(fixtures_dpath, webname, f"{kind}.html")
+
+
+def load_page(webname, kind, base_url="https://example.com", fixtures_dpath=FIXTURES_DPATH) -> bytes:
+    """
+    Recorded page of a website if there is one, otherwise a synthetic page
+    @param kind (str): "article", "listing" or "search"
+    @return (bytes): page content
+    """
+    fpath = fixture_fpath(webname, kind, fixtures_dpath)
+    if os.path.exists(fpath):
+        with open(fpath, "rb") as file:
+            return file.read()
+    if kind == "article":
+        return make_article(webname, "bai-viet")
+    return make_listing(webname, base_url, "thoi-su", 1)
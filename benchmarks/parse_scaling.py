@@ -0,0 +1,64 @@
+"""
+Parse throughput (articles/s) of the parse stage with 0 (in-thread) to N parse_workers processes,
+for each parser backend.
+
+    python -m benchmarks.parse_scaling --webname vnexpress --num-articles 400
+"""
+import argparse
+import logging
+import os
+import time
+
+from benchmarks.pages import make_article
+from crawler.factory import WEBNAMES
+from crawler import parsing
+
+
+def measure(crawler, pages):
+    start = time.perf_counter()
+    if crawler.parse_pool is None:
+        for url, content in pages:
+            article = crawler.parse(url, content)
+            list(article.paragraphs)
+    else:
+        name = type(crawler).__name__
+        futures = [crawler.parse_pool.submit(parsing.parse_content, name, url, content) for url, content in pages]
+        for future in futures:
+            future.result()
+        crawler.parse_pool.shutdown()
+    return len(pages) / (time.perf_counter() - start)
+
+
+def warm_up(crawler, pages):
+    """ Start the worker processes before measuring """
+    if crawler.parse_pool is not None:
+        futures = [crawler.parse_pool.submit(parsing.parse_content, type(crawler).__name__, *pages[0])
+                   for _ in range(crawler.parse_workers)]
+        for future in futures:
+            future.result()
+
+
+def main(webname, num_articles, max_workers):
+    logging.basicConfig(level=logging.WARNING)
+    pages = [(f"https://example.com/{i}.html", make_article(webname, f"bai-viet-{i}")) for i in range(num_articles)]
+    crawler_cls = WEBNAMES[webname]
+
+    worker_counts = [0] + [n for n in (1, 2, 4, 8, 16, 32) if n <= max_workers]
+    print(f"{webname}: {num_articles} articles, {len(pages[0][1]) // 1024} KiB per page")
+    print(f"{'parser':<12} " + " ".join(f"{f'{n} proc':>9}" for n in worker_counts) + "  (articles/s)")
+    for parser in ("html.parser", "lxml"):
+        results = list()
+        for parse_workers in worker_counts:
+            crawler = crawler_cls(parser=parser, parse_workers=parse_workers)
+            warm_up(crawler, pages)
+            results.append(measure(crawler, pages))
+        print(f"{parser:<12} " + " ".join(f"{result:9.1f}" for result in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse stage scaling benchmark")
+    parser.add_argument("--webname", default="vnexpress", choices=list(WEBNAMES))
+    parser.add_argument("--num-articles", type=int, default=400, dest="num_articles")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), dest="max_workers")
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,52 @@
+"""
+Record a listing page, a search result page and an article page of a real website as benchmark fixtures.
+NewsServer and the benchmark suite use them instead of the synthetic pages of benchmarks.pages.
+
+    python -m benchmarks.record --webname vnexpress --article-type du-lich --search-query "bong da"
+"""
+import argparse
+import logging
+import os
+
+from benchmarks.pages import FIXTURES_DPATH, fixture_fpath
+from crawler.factory import get_crawler, WEBNAMES
+
+
+def save(fpath, content):
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    with open(fpath, "wb") as file:
+        file.write(content)
+    print(f"{fpath}: {len(content) // 1024} KiB")
+
+
+def main(webname, article_type, search_query, fixtures_dpath):
+    logging.basicConfig(level=logging.WARNING)
+    crawler = get_crawler(webname)
+
+    listing_url = crawler.get_type_page_url(article_type, 1)
+    listing = crawler.fetch(listing_url)
+    save(fixture_fpath(webname, "listing", fixtures_dpath), listing)
+
+    articles_urls = crawler.parse_type_page(listing_url, listing)
+    if not articles_urls:
+        raise SystemExit(f"No article found in {listing_url}")
+    article_url = articles_urls[0]
+    if article_url.startswith("/"):
+        article_url = crawler.base_url + article_url
+    save(fixture_fpath(webname, "article", fixtures_dpath), crawler.fetch(article_url))
+
+    try:
+        search_url = crawler.get_search_page_url(search_query, 1)
+    except NotImplementedError:
+        return
+    save(fixture_fpath(webname, "search", fixtures_dpath), crawler.fetch(search_url))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record benchmark fixtures from a real website")
+    parser.add_argument("--webname", default="vnexpress", choices=list(WEBNAMES))
+    parser.add_argument("--article-type", default="thoi-su", dest="article_type")
+    parser.add_argument("--search-query", default="viet nam", dest="search_query")
+    parser.add_argument("--fixtures-dpath", default=FIXTURES_DPATH, dest="fixtures_dpath")
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.pages import (make_article, make_listing, make_rss, make_sitemap_index, make_sitemap, make_image,
+                              load_page, fixture_fpath, LISTING_PATTERNS, SEARCH_PATTERNS, FEED_PATTERN,
+                              SITEMAP_PATTERN, IMAGE_PATTERN)
+from crawler.spec_crawler import SITES
+
+CHUNK_SIZE = 16 * 1024
+
+
+class NewsServer(ThreadingHTTPServer):
+    """
+    Local stand-in of a news website, serving listing pages (pages_per_type pages of per_page articles
+    for any category or search query), an RSS feed per category, sitemaps of the categories of webname in robots.txt,
+    images and the same article page for every other path, after latency seconds.
+    The article page is the recorded fixture of webname if there is one.
+    Responses are sent at bandwidth bytes/s (0 = unlimited), error_rate of them are 503 errors
+    and reset_rate of them close the connection without any response.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.0, webname="vnexpress", noise=True, pages_per_type=100, per_page=20,
+                 host="127.0.0.1", port=0, bandwidth=0, error_rate=0.0, reset_rate=0.0, use_fixtures=True, seed=0):
+        super().__init__((host, port), NewsRequestHandler)
+        self.latency = latency
+        self.webname = webname
+        self.pages_per_type = pages_per_type
+        self.per_page = per_page
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.listing_pattern = re.compile(LISTING_PATTERNS[webname])
+        self.search_pattern = re.compile(SEARCH_PATTERNS[webname]) if webname in SEARCH_PATTERNS else None
+        self.feed_pattern = re.compile(FEED_PATTERN)
+        self.sitemap_pattern = re.compile(SITEMAP_PATTERN)
+        self.image_pattern = re.compile(IMAGE_PATTERN)
+        self.num_not_modified = 0
+        self.num_errors = 0
+        self.num_resets = 0
+        self.is_recorded = use_fixtures and noise and os.path.exists(fixture_fpath(webname, "article"))
+        if self.is_recorded:
+            self.article = load_page(webname, "article")
+        else:
+            self.article = make_article(webname, "bai-viet", noise=noise)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def get_page(self, path) -> bytes:
+        resource = self.get_resource(path)
+        if resource is not None:
+            return resource
+
+        match = self.listing_pattern.match(path)
+        if match is None and self.search_pattern is not None:
+            match = self.search_pattern.match(path)
+        if match is None:
+            return self.article
+
+        article_type = match.groupdict().get("article_type") or f"search-{match['query']}"
+        page_number = int(match["page_number"])
+        per_page = self.per_page if page_number <= self.pages_per_type else 0
+        return make_listing(self.webname, self.base_url, article_type, page_number, per_page)
+
+    def get_content_type(self, path) -> str:
+        if self.image_pattern.match(path):
+            return "image/jpeg"
+        if path == "/robots.txt":
+            return "text/plain"
+        if path == "/sitemap.xml" or self.sitemap_pattern.match(path) or self.feed_pattern.match(path):
+            return "application/xml"
+        return "text/html; charset=utf-8"
+
+    def get_resource(self, path) -> bytes:
+        """ robots.txt, RSS feed, sitemap or image, None for other paths """
+        if path == "/robots.txt":
+            return f"User-agent: *\nSitemap: {self.base_url}/sitemap.xml\n".encode()
+        if path == "/sitemap.xml":
+            return make_sitemap_index(self.base_url, SITES[self.webname]["article_types"], self.pages_per_type,
+                                      self.per_page)
+        if match := self.sitemap_pattern.match(path):
+            return make_sitemap(self.base_url, match["article_type"], int(match["page_number"]), self.per_page)
+        if match := self.feed_pattern.match(path):
+            return make_rss(self.base_url, match["article_type"], self.pages_per_type, self.per_page)
+        if match := self.image_pattern.match(path):
+            return make_image(match["name"])
+        return None
+
+    def draw_failure(self) -> str:
+        """ "error", "reset" or None for a normal response """
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.reset_rate:
+                self.num_resets += 1
+                return "reset"
+            if draw < self.reset_rate + self.error_rate:
+                self.num_errors += 1
+                return "error"
+        return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # clients streaming articles drop the connection before the end of the page
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class NewsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        match self.server.draw_failure():
+            case "reset":
+                self.close_connection = True
+                return
+            case "error":
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        body = self.server.get_page(self.path)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag:
+            self.server.num_not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", self.server.get_content_type(self.path))
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.write_body(body)
+
+    def write_body(self, body):
+        if not self.server.bandwidth:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, format, *args):
+        pass
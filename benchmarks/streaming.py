@@ -0,0 +1,58 @@
+"""
+Bytes downloaded per article page with and without stream_articles, for every website.
+
+    python -m benchmarks.streaming --num-urls 300 --engine thread
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from benchmarks.server import NewsServer
+from crawler.factory import get_crawler
+
+WEBNAMES = ("vnexpress", "dantri", "vietnamnet")
+
+
+def run(webname, base_url, num_urls, output_dpath, **config):
+    urls_fpath = f"{output_dpath}/urls.txt"
+    with open(urls_fpath, "w") as urls_file:
+        urls_file.write("\n".join(f"{base_url}/article-{i}.html" for i in range(num_urls)))
+
+    crawler = get_crawler(webname, task="url", urls_fpath=urls_fpath, output_dpath=f"{output_dpath}/result", **config)
+    start = time.perf_counter()
+    crawler.start_crawling()
+    return time.perf_counter() - start, crawler.stream_stats
+
+
+def main(num_urls, engine, num_workers, latency):
+    logging.basicConfig(level=logging.WARNING)
+    config = dict(engine=engine, num_workers=num_workers, max_in_flight=num_workers)
+
+    print(f"{'website':<12} {'page KB':>8} {'streamed KB':>12} {'saved':>6} {'truncated':>10} {'full s':>7} {'stream s':>9}")
+    for webname in WEBNAMES:
+        server = NewsServer(latency=latency, webname=webname).start()
+        try:
+            with tempfile.TemporaryDirectory() as output_dpath:
+                full_elapsed, __ = run(webname, server.base_url, num_urls, output_dpath, **config)
+            with tempfile.TemporaryDirectory() as output_dpath:
+                stream_elapsed, stats = run(webname, server.base_url, num_urls, output_dpath,
+                                            stream_articles=True, **config)
+        finally:
+            server.stop()
+
+        page_kb = len(server.article) / 1024
+        streamed_kb = stats.bytes_read / max(stats.num_pages, 1) / 1024
+        print(f"{webname:<12} {page_kb:8.1f} {streamed_kb:12.1f} {1 - streamed_kb / page_kb:6.0%} "
+              f"{stats.num_truncated:>4} / {stats.num_pages:<3} {full_elapsed:7.2f} {stream_elapsed:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streamed article downloads benchmark")
+    parser.add_argument("--num-urls", type=int, default=300, dest="num_urls")
+    parser.add_argument("--engine", default="thread", choices=["thread", "async"])
+    parser.add_argument("--num-workers", type=int, default=8, dest="num_workers",
+                        help="num_workers of the thread engine, max_in_flight of the async one")
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency in seconds")
+    args = parser.parse_args()
+    main(**vars(args))
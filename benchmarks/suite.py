@@ -0,0 +1,178 @@
+"""
+Benchmark suite of the crawlers, written as JSON to compare runs:
+- parse: articles/s of parse_content (the parsing half of extract_content) on article pages
+- listing: pages/s of parse_type_page / parse_search_page on listing and search result pages
+- crawl: urls/s of start_crawling (task "type") against NewsServer, for each number of workers
+
+Recorded fixtures (see benchmarks.record) are used when they exist, synthetic pages otherwise.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --workers 1 4 16 --latency 0.1 --error-rate 0.05 --output results.json
+    python -m benchmarks.suite --compare baseline.json results.json --tolerance 0.15
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.pages import load_page, fixture_fpath
+from benchmarks.server import NewsServer
+from crawler.factory import get_crawler, WEBNAMES
+
+SEARCH_WEBNAMES = ("vnexpress",)
+
+
+def result(benchmark, webname, params, value, unit, **extra):
+    return {"benchmark": benchmark, "webname": webname, "params": params, "value": value, "unit": unit, **extra}
+
+
+def result_key(record) -> str:
+    params = ",".join(f"{key}={value}" for key, value in sorted(record["params"].items()))
+    return f"{record['benchmark']}/{record['webname']}/{params}"
+
+
+def bench_parse(webname, parser, num_pages, config):
+    crawler = get_crawler(webname, parser=parser, **config)
+    content = load_page(webname, "article")
+    url = f"{crawler.base_url}/bai-viet.html"
+
+    start = time.perf_counter()
+    for _ in range(num_pages):
+        article = crawler.parse_content(url, content)
+        # description and paragraphs are generators
+        str(article)
+    elapsed = time.perf_counter() - start
+    return result("parse", webname, {"parser": parser}, num_pages / elapsed, "articles/s",
+                  page_bytes=len(content), recorded=os.path.exists(fixture_fpath(webname, "article")))
+
+
+def bench_listing(webname, kind, parser, num_pages, config):
+    crawler = get_crawler(webname, parser=parser, **config)
+    content = load_page(webname, kind, crawler.base_url)
+    parse_page = crawler.parse_search_page if kind == "search" else crawler.parse_type_page
+    page_url = f"{crawler.base_url}/{kind}"
+
+    start = time.perf_counter()
+    for _ in range(num_pages):
+        num_urls = len(parse_page(page_url, content))
+    elapsed = time.perf_counter() - start
+    return result("listing", webname, {"kind": kind, "parser": parser}, num_pages / elapsed, "pages/s",
+                  urls_per_page=num_urls, recorded=os.path.exists(fixture_fpath(webname, kind)))
+
+
+def bench_crawl(webname, num_workers, total_pages, server_options, config):
+    server = NewsServer(webname=webname, **server_options).start()
+    try:
+        with tempfile.TemporaryDirectory() as output_dpath:
+            crawler = get_crawler(webname, task="type", article_type="thoi-su", total_pages=total_pages,
+                                  base_url=server.base_url, output_dpath=output_dpath,
+                                  num_workers=num_workers, max_in_flight=num_workers, **config)
+            start = time.perf_counter()
+            num_error_urls = crawler.start_crawling()
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    num_urls = total_pages * server.per_page
+    return result("crawl", webname, {"num_workers": num_workers, "engine": crawler.engine}, num_urls / elapsed, "urls/s",
+                  num_urls=num_urls, num_error_urls=num_error_urls, elapsed=elapsed,
+                  injected_errors=server.num_errors, injected_resets=server.num_resets)
+
+
+def get_metadata(args, config):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "config": config}
+
+
+def run(args):
+    logging.basicConfig(level=logging.WARNING)
+    config = dict()
+    for option in args.config:
+        key, value = option.split("=", 1)
+        config[key] = yaml.safe_load(value)
+    server_options = dict(latency=args.latency, bandwidth=args.bandwidth,
+                          error_rate=args.error_rate, reset_rate=args.reset_rate, seed=args.seed)
+
+    results = list()
+    for webname in args.webnames:
+        for parser in args.parsers:
+            if "parse" in args.benchmarks:
+                results.append(bench_parse(webname, parser, args.num_pages, config))
+            if "listing" in args.benchmarks:
+                for kind in ("listing", "search") if webname in SEARCH_WEBNAMES else ("listing",):
+                    results.append(bench_listing(webname, kind, parser, args.num_pages, config))
+        if "crawl" in args.benchmarks:
+            for num_workers in args.workers:
+                results.append(bench_crawl(webname, num_workers, args.total_pages, server_options, config))
+
+    for record in results:
+        print(f"{result_key(record):<60} {record['value']:10.1f} {record['unit']}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"metadata": get_metadata(args, config), "results": results}, file, indent=2)
+        print(f"Results written in {args.output}")
+
+
+def compare(baseline_fpath, current_fpath, tolerance) -> int:
+    """
+    Print the relative change of every benchmark of current compared to baseline
+    @return (int): number of benchmarks slower than baseline by more than tolerance
+    """
+    with open(baseline_fpath) as file:
+        baseline = {result_key(record): record for record in json.load(file)["results"]}
+    with open(current_fpath) as file:
+        current = {result_key(record): record for record in json.load(file)["results"]}
+
+    num_regressions = 0
+    for key, record in current.items():
+        if key not in baseline:
+            print(f"{key:<60} {'new':>10}")
+            continue
+        change = record["value"] / baseline[key]["value"] - 1
+        is_regression = change < -tolerance
+        num_regressions += is_regression
+        print(f"{key:<60} {change:+10.1%}{'  REGRESSION' if is_regression else ''}")
+    return num_regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawler benchmark suite")
+    parser.add_argument("--benchmarks", nargs="+", default=["parse", "listing", "crawl"],
+                        choices=["parse", "listing", "crawl"])
+    parser.add_argument("--webnames", nargs="+", default=list(WEBNAMES), choices=list(WEBNAMES))
+    parser.add_argument("--parsers", nargs="+", default=["html.parser", "lxml"])
+    parser.add_argument("--num-pages", type=int, default=200, dest="num_pages", help="pages parsed per parse benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="num_workers of the crawl benchmark")
+    parser.add_argument("--total-pages", type=int, default=5, dest="total_pages", help="listing pages per crawl")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency in seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="server bandwidth in bytes/s per response (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, dest="error_rate", help="fraction of 503 responses")
+    parser.add_argument("--reset-rate", type=float, default=0.0, dest="reset_rate", help="fraction of dropped connections")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", nargs="*", default=[], help="crawler configuration, e.g. engine=async parse_workers=2")
+    parser.add_argument("--output", help="JSON file of the results")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two JSON result files")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="slowdown reported as a regression by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+    run(args)
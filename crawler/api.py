@@ -0,0 +1,112 @@
+"""
+Library API: crawl like VNNewsCrawler.py but get the crawled Article objects instead of files.
+
+    from crawler.api import iter_articles
+
+    for article in iter_articles("vnexpress", task="type", article_type="thoi-su", total_pages=2):
+        index(article.title, article.paragraphs)
+
+    async for article in aiter_articles("dantri", task="url", urls_fpath="urls.txt"):
+        ...
+"""
+import asyncio
+import shutil
+import tempfile
+import threading
+
+from .factory import get_crawler
+from .sinks import QueueSink
+
+
+class ArticleStream:
+    """
+    Crawl of a website running in a background thread, its articles handed over through a QueueSink.
+    At most num_workers requests (max_in_flight with engine "async") are in flight, and crawling workers wait
+    while max_queued articles are waiting for the consumer. Closing the stream before the end stops claiming new urls.
+    """
+
+    def __init__(self, webname, task="type", max_queued=100, **config):
+        """
+        @param webname (str): website, see crawler.factory
+        @param task (str): "url", "type", "search", "replay", "retry-failed" or "daemon", see config.yml
+        @param max_queued (int): articles crawled ahead of the consumer
+        @param config: other settings of config.yml, output_dpath is a temporary directory by default
+        """
+        # urls files, failed_urls.jsonl and state store of the crawl
+        self.tmp_dpath = None
+        if not config.get("output_dpath"):
+            self.tmp_dpath = config["output_dpath"] = tempfile.mkdtemp(prefix="articles-")
+        self.crawler = get_crawler(webname, task=task, **config)
+        self.crawler.stop_event = threading.Event()
+        self.sink = QueueSink(self.crawler.on_article_written, max_queued)
+        self.num_error_urls = None
+        self.error = None
+        self._thread = threading.Thread(target=self._crawl, name=f"crawl-{webname}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _crawl(self):
+        try:
+            self.num_error_urls = self.crawler.start_crawling(sink=self.sink)
+        except BaseException as e:
+            self.error = e
+        finally:
+            # the end of the stream, even if the crawl failed before closing its sink
+            self.sink.close()
+
+    def get(self):
+        """
+        Next crawled article, waits for it
+        @return (Article): None once the crawl is over
+        """
+        article = self.sink.get()
+        if article is None:
+            self._thread.join()
+            if self.error is not None:
+                raise self.error
+        return article
+
+    def __iter__(self):
+        while (article := self.get()) is not None:
+            yield article
+
+    def close(self):
+        """ Stop the crawl: urls in flight are finished, articles not read yet are dropped """
+        if self._thread.is_alive():
+            self.crawler.stop_event.set()
+            self.sink.cancel()
+            self._thread.join()
+        if self.tmp_dpath is not None:
+            shutil.rmtree(self.tmp_dpath, ignore_errors=True)
+            self.tmp_dpath = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_articles(webname, task="type", max_queued=100, **config):
+    """
+    Crawl a website and yield its articles as they are crawled, see ArticleStream
+    @return (generator): Article objects, leaving the loop early stops the crawl
+    """
+    with ArticleStream(webname, task, max_queued, **config) as stream:
+        yield from stream
+
+
+async def aiter_articles(webname, task="type", max_queued=100, **config):
+    """
+    Asynchronous iterator of iter_articles, the crawl runs outside of the event loop
+    @return (async generator): Article objects, leaving the loop early stops the crawl
+    """
+    stream = ArticleStream(webname, task, max_queued, **config).start()
+    try:
+        while (article := await asyncio.to_thread(stream.get)) is not None:
+            yield article
+    finally:
+        # waits for the urls in flight
+        await asyncio.to_thread(stream.close)
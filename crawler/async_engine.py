@@ -0,0 +1,274 @@
+import asyncio
+import contextlib
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+from tqdm import tqdm
+
+from .throttle import parse_retry_after
+from .cache import ARTICLE, LISTING, CacheMiss
+from .streaming import ContainerWatcher, get_content_length, truncate_after_last_tag
+from .failures import Failure, HttpStatusError, classify, NETWORK, TIMEOUT, PARSE, NOT_AN_ARTICLE
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# idle connections of a kept alive engine are closed after this, servers rarely keep them longer anyway
+KEEPALIVE_SECONDS = 75
+DNS_CACHE_SECONDS = 300
+
+
+class AsyncEngine:
+    """
+    Fetch pages on an asyncio event loop instead of a ThreadPoolExecutor.
+    Up to max_in_flight requests are sent concurrently, parsing still uses the site crawler methods.
+    A kept alive engine runs every crawl on the same event loop and session, so connections and resolved hosts
+    are reused from one crawl to the next (daemon polls) until it is closed.
+    """
+
+    def __init__(self, crawler, keep_alive=False):
+        self.crawler = crawler
+        self.runner = asyncio.Runner() if keep_alive else None
+        self.session = None
+        self.logger = crawler.logger
+        self.max_in_flight = crawler.max_in_flight
+        self.timeout = aiohttp.ClientTimeout(sock_connect=crawler.connect_timeout,
+                                             sock_read=crawler.read_timeout)
+
+    def crawl_urls(self, url_queue, handle_result):
+        """
+        Crawling contents of urls and write them in their output files
+        @param url_queue (RetryQueue): urls to crawl, pulled by the max_in_flight workers
+        @param handle_result (callable): called with the item of the url and its Failure, None for a crawled url
+        """
+        self.run(self._crawl_urls(url_queue, handle_result))
+
+    def get_urls(self, page_urls, parse_page, progress_bar=None) -> list:
+        """
+        Download listing pages and extract urls of articles with parse_page
+        @param page_urls (list): urls of listing pages
+        @param parse_page (callable): parse_page(page_url, content) -> list of urls
+        @param progress_bar (tqdm): updated for each page, a new one by default
+        @return (list): list of urls per page
+        """
+        if progress_bar is None:
+            with tqdm(total=len(page_urls), desc="Pages") as progress_bar:
+                return self.run(self._get_urls(page_urls, parse_page, progress_bar))
+        return self.run(self._get_urls(page_urls, parse_page, progress_bar))
+
+    def run(self, coroutine):
+        """ Run coroutine on a new event loop, or on the loop of a kept alive engine """
+        if self.runner is None:
+            return asyncio.run(coroutine)
+        return self.runner.run(coroutine)
+
+    @contextlib.asynccontextmanager
+    async def open_session(self):
+        """ Session of a crawl, closed at its end unless the engine is kept alive """
+        if self.runner is None:
+            async with self.client_session() as session:
+                yield session
+            return
+        if self.session is None:
+            self.session = self.client_session()
+        yield self.session
+
+    def close(self):
+        """ Close the session and event loop of a kept alive engine """
+        if self.runner is None:
+            return
+        if self.session is not None:
+            self.runner.run(self.session.close())
+            self.session = None
+        self.runner.close()
+
+    async def _crawl_urls(self, url_queue, handle_result):
+        async with self.open_session() as session:
+            # every worker pulls the next url when it is done, only max_in_flight urls are in memory
+            workers = [self._crawl_urls_worker(session, url_queue, handle_result)
+                       for _ in range(self.max_in_flight)]
+            await asyncio.gather(*workers)
+
+    async def _crawl_urls_worker(self, session, url_queue, handle_result):
+        while True:
+            item, delay = url_queue.get()
+            if item is None:
+                if delay is None:
+                    return
+                # waiting for a retry to be due
+                await asyncio.sleep(delay)
+                continue
+            output_fpath, url, __ = item
+            handle_result(item, await self.crawl_url(session, url, output_fpath))
+
+    async def crawl_url(self, session, url, output_fpath) -> Failure:
+        """
+        Crawl the article of url into output_fpath
+        @return (Failure): why it failed, None if the article is written
+        """
+        try:
+            content, is_truncated = await self.fetch_article(session, url)
+            # parsing is CPU bound, keep it out of the event loop
+            is_success = await asyncio.to_thread(self._write_content, url, content, is_truncated, output_fpath)
+        except asyncio.TimeoutError as e:
+            failure = Failure(url, TIMEOUT, repr(e))
+        except aiohttp.ClientError as e:
+            failure = Failure(url, NETWORK, repr(e))
+        except Exception as e:
+            failure = classify(url, e)
+        else:
+            failure = None if is_success else Failure(url, PARSE, NOT_AN_ARTICLE)
+
+        if failure is not None:
+            self.logger.debug(f"Crawling unsuccessfully: {url} ({failure.describe()})")
+        return failure
+
+    def _write_content(self, url, content, is_truncated, output_fpath):
+        article = self.crawler.parse_article(url, content, is_truncated)
+        return self.crawler.write_article(article, output_fpath)
+
+    async def _get_urls(self, page_urls, parse_page, progress_bar):
+        async with self.open_session() as session:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            tasks = [self._get_page_urls(session, semaphore, progress_bar, page_url, parse_page)
+                     for page_url in page_urls]
+            return await asyncio.gather(*tasks)
+
+    async def _get_page_urls(self, session, semaphore, progress_bar, page_url, parse_page):
+        try:
+            try:
+                async with semaphore:
+                    content = await self.fetch(session, page_url, kind=LISTING)
+            except (aiohttp.ClientError, OSError, CacheMiss) as e:
+                # like an empty page, past the last page some sites answer 404
+                self.logger.info(f"Couldn't get urls of {page_url}: {e!r}")
+                content = b""
+            articles_urls = await asyncio.to_thread(parse_page, page_url, content)
+            if not articles_urls:
+                self.crawler.throttle.backoff(page_url)
+            return articles_urls
+        finally:
+            progress_bar.update()
+
+    def client_session(self):
+        if self.runner is None:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        else:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=KEEPALIVE_SECONDS,
+                                             ttl_dns_cache=DNS_CACHE_SECONDS)
+        headers = {"User-Agent": self.crawler.user_agent} if self.crawler.user_agent else None
+        trace_configs = [self.trace_config()] if self.crawler.metrics.enabled else None
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=headers,
+                                     trace_configs=trace_configs)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """ Report DNS resolution and connection times to the crawler metrics """
+        metrics = self.crawler.metrics
+
+        async def on_start(session, context, params):
+            context.started_at = time.perf_counter()
+
+        def on_end(stage):
+            async def observe(session, context, params):
+                metrics.observe(stage, time.perf_counter() - context.started_at)
+            return observe
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_start.append(on_start)
+        trace_config.on_dns_resolvehost_end.append(on_end("dns"))
+        trace_config.on_connection_create_start.append(on_start)
+        trace_config.on_connection_create_end.append(on_end("connect"))
+        return trace_config
+
+    async def fetch(self, session, url, kind=ARTICLE) -> bytes:
+        """
+        Download url, throttled per host and retrying on connection errors, 429 and 5xx responses with exponential backoff
+        With the response cache, cached bodies are revalidated with ETag/Last-Modified (or directly used offline)
+        @return (bytes): response body
+        @raise HttpStatusError: for 4xx and 5xx responses, once the retries are exhausted
+        """
+        body, __ = await self._fetch(session, url, kind)
+        return body
+
+    async def fetch_article(self, session, url) -> tuple:
+        """
+        Download an article page, stopping as soon as its article_container is closed when streaming
+        @return (bytes): page content
+        @return (bool): True if the end of the page wasn't downloaded
+        """
+        container = self.crawler.article_container if self.crawler.should_stream() else None
+        return await self._fetch(session, url, ARTICLE, container)
+
+    async def _fetch(self, session, url, kind, container=None):
+        cache = self.crawler.cache
+        cached = None
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, url)
+            if self.crawler.offline:
+                if cached is None:
+                    raise CacheMiss(url)
+                return cached.body, False
+        headers = cached.conditional_headers() if cached is not None else None
+
+        metrics = self.crawler.metrics
+        throttle = self.crawler.throttle
+        host_throttle = throttle.get_host(url)
+        for attempt in range(self.crawler.max_retries + 1):
+            is_last = attempt == self.crawler.max_retries
+            requested_at = time.monotonic()
+            await host_throttle.acquire_async()
+            await throttle.acquire_budget_async()
+            started_at = time.monotonic()
+            metrics.observe("throttle", started_at - requested_at)
+            status = retry_after = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if status not in RETRY_STATUSES or is_last:
+                        body, is_truncated = await self._read(response, container)
+                        # bytes before decompression, with aiohttp versions counting them
+                        metrics.record_response(urlsplit(url).netloc, status,
+                                                getattr(response.content, "total_raw_bytes", len(body)))
+                        break
+                    metrics.record_response(urlsplit(url).netloc, status, 0)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if is_last:
+                    raise
+            finally:
+                latency = time.monotonic() - started_at
+                metrics.observe("fetch", latency)
+                throttle.release_budget()
+                host_throttle.release(status, latency, retry_after)
+            await asyncio.sleep(self.crawler.backoff_factor * (2 ** attempt))
+
+        if status >= 400:
+            raise HttpStatusError(url, status)
+        if cache is not None:
+            if status == 304 and cached is not None:
+                await asyncio.to_thread(cache.touch, url)
+                return cached.body, False
+            if status == 200:
+                await asyncio.to_thread(cache.put, url, urlsplit(url).netloc, kind, body,
+                                        response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return body, is_truncated
+
+    async def _read(self, response, container):
+        if container is None or response.status != 200:
+            return await response.read(), False
+
+        watcher = ContainerWatcher(container)
+        content = bytearray()
+        is_truncated = False
+        async for chunk in response.content.iter_chunked(self.crawler.stream_chunk_kb * 1024):
+            content += chunk
+            if watcher.feed(chunk):
+                is_truncated = True
+                # drop the connection instead of reading the rest of the page
+                response.close()
+                break
+
+        # chunks are decompressed, their size is only comparable to Content-Length for identity encoding
+        content_length = None if response.headers.get("Content-Encoding") else get_content_length(response.headers)
+        self.crawler.stream_stats.add(len(content), content_length, is_truncated)
+        return truncate_after_last_tag(content) if is_truncated else bytes(content), is_truncated
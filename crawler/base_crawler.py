@@ -1,18 +1,261 @@
 from abc import ABC, abstractmethod
 import concurrent.futures
+import cProfile
+import dataclasses
+import io
+import os
+import pstats
+import threading
+import time
+from urllib.parse import urlsplit
 
 from tqdm import tqdm
 
-from utils import init_output_dirs, create_dir, read_file
+from utils import init_output_dirs, create_dir, read_file, write_lines
 from models import Article
+from .session import SessionPool, get_reported_status, get_received_bytes
+from .throttle import Throttle
+from . import parsing
+from .pipeline import Category, DiscoveryPipeline
+from .pagination import Paginator, get_date_cutoff
+from .frontier import UrlFrontier, canonicalize_url, FRONTIER_ORDERS
+from .feeds import FeedDiscovery, DISCOVERY_SOURCES, parse_robots_sitemaps
+from .media import ImageStore, MediaPipeline, IMAGE_MODES
+from .dedup import DedupIndex, SimHash, MinHash, get_text, DEDUP_METHODS, DEDUP_POLICIES, DEDUP_FNAME
+from .failures import (Failure, HttpStatusError, RetryQueue, DeadLetterFile, classify, read_dead_letters,
+                       find_dead_letter_files, PARSE, WRITE, NOT_AN_ARTICLE, DEAD_LETTER_FNAME)
+from .state import StateStore
+from . import cache
+from .sinks import TextSink, get_sink
+from .streaming import StreamStats, read_until_closed, get_content_length
+from .metrics import Metrics, MetricsExporter, SamplingProfiler
+from .work_queue import open_work_queue
+from .distributed import Coordinator, Worker
+from .daemon import CrawlDaemon
 
 class BaseCrawler(ABC):
+    # default configuration, overridden by config.yml
+    base_url = ""
+    num_workers = 1
+    engine = "thread"
+    max_in_flight = 100
+    queue_size = 1000
+    pipeline = False
+    # digits of url_<index>.txt, the same in every mode so that merged outputs sort in crawl order
+    index_len = 6
+    state_store = False
+    state_fpath = None
+    resume = False
+    http_cache = False
+    cache_dpath = None
+    cache_max_mb = 1024
+    offline = False
+    output_format = "txt"
+    compression = "none"
+    rotate_mb = 256
+    sink_writers = 1
+    sink_batch_size = 100
+    connect_timeout = 5
+    read_timeout = 20
+    max_retries = 3
+    backoff_factor = 0.5
+    user_agent = None
+    adaptive_throttle = True
+    rate_limit = 0
+    rate_burst = 10
+    parser = "html.parser"
+    parse_workers = 0
+    # (tag, class) of the element closing the extracted fields of an article page, see stream_articles
+    article_container = None
+    stream_articles = False
+    stream_chunk_kb = 16
+    collect_metrics = False
+    metrics_interval = 10
+    metrics_fpath = None
+    prometheus_fpath = None
+    metrics_port = 0
+    profile = "none"
+    distributed = "none"
+    queue_url = None
+    queue_host = "127.0.0.1"
+    queue_port = 0
+    lease_batch = 20
+    lease_seconds = 300
+    max_attempts = 3
+    retry_backoff = 2
+    retry_max_delay = 60
+    poll_seconds = 2
+    coordinator_wait = True
+    pagination = "fixed"
+    page_window = 4
+    date_cutoff = None
+    discovery = "listing"
+    frontier_order = "discovery"
+    frontier_capacity = 100000
+    frontier_error_rate = 0.001
+    # query parameters removed from the urls of articles, besides tracking ones (see frontier.canonicalize_url)
+    drop_params = ()
+    download_images = "none"
+    image_workers = 4
+    image_max_kb = 5120
+    images_max_mb = 0
+    images_dpath = None
+    daemon_interval = 600
+    daemon_min_interval = 60
+    daemon_max_interval = 3600
+    daemon_target_articles = 5
+    daemon_status_fpath = None
+    dedup = "none"
+    dedup_policy = "tag"
+    dedup_threshold = 0.6
+    dedup_max_distance = 3
+    dedup_shingle_size = 3
+    dedup_fpath = None
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.metrics = Metrics(enabled=self.collect_metrics)
+        # name -> callable returning the number of items waiting in a queue, exported as metrics
+        self.queues = dict()
+        self.http = SessionPool(pool_size=self.num_workers,
+                                connect_timeout=self.connect_timeout,
+                                read_timeout=self.read_timeout,
+                                max_retries=self.max_retries,
+                                backoff_factor=self.backoff_factor,
+                                user_agent=self.user_agent,
+                                on_connect=self.on_connect if self.collect_metrics else None)
+        max_concurrency = self.max_in_flight if self.engine == "async" else self.num_workers
+        self.throttle = Throttle(max_concurrency=max_concurrency,
+                                 rate=self.rate_limit,
+                                 burst=self.rate_burst,
+                                 enabled=self.adaptive_throttle)
+        self.parse_pool = parsing.create_parse_pool(self) if self.parse_workers else None
+        self.state = None
+        self.cache = None
+        self.sink = TextSink(self.on_article_written)
+        # (output_fpath, failure) of the articles the sink couldn't write
+        self.write_failures = list()
+        self.write_failures_lock = threading.Lock()
+        self.stream_stats = StreamStats()
+        self.metrics_exporter = None
+        self.media = None
+        # async engine kept alive across the polls of a daemon
+        self.async_engine = None
+        # near-duplicate index, opened by start_crawling or shared by a multi-site run
+        self.dedup_index = None
+        # once set, no new url is claimed and task "daemon" stops (set by signals, the multi-site runner or crawler.api)
+        self.stop_event = None
+
+    def fetch(self, url, kind=cache.ARTICLE) -> bytes:
+        """
+        Download url through the shared session pool, throttled per host
+        With the response cache, cached bodies are revalidated with ETag/Last-Modified (or directly used offline)
+        @param url (str): url to download
+        @param kind (str): "article" or "listing" page, recorded in the cache
+        @return (bytes): response body
+        @raise HttpStatusError: for 4xx and 5xx responses, once the retries of the session are exhausted
+        """
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if self.offline:
+                if cached is None:
+                    raise cache.CacheMiss(url)
+                return cached.body
+
+        headers = cached.conditional_headers() if cached is not None else None
+        with self.throttle.request(url) as slot:
+            self.metrics.observe("throttle", slot.waited)
+            with self.metrics.timer("fetch"):
+                response = self.http.get(url, headers=headers)
+            slot.set_response(get_reported_status(response), response.headers)
+        self.metrics.record_response(urlsplit(url).netloc, response.status_code, get_received_bytes(response))
+        if response.status_code >= 400:
+            raise HttpStatusError(url, response.status_code)
+
+        if self.cache is not None:
+            if response.status_code == 304 and cached is not None:
+                self.cache.touch(url)
+                return cached.body
+            if response.status_code == 200:
+                self.cache.put(url, urlsplit(url).netloc, kind, response.content,
+                               response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.content
+
+    def should_stream(self) -> bool:
+        """ Article pages are streamed when the container is known, the cache needs whole pages """
+        return self.stream_articles and self.article_container is not None and self.cache is None
+
+    def fetch_article(self, url) -> tuple:
+        """
+        Download an article page, stopping as soon as its article_container is closed when streaming
+        @param url (str): url to download
+        @return (bytes): page content
+        @return (bool): True if the end of the page wasn't downloaded
+        """
+        if not self.should_stream():
+            return self.fetch(url), False
+
+        with self.throttle.request(url) as slot:
+            self.metrics.observe("throttle", slot.waited)
+            started_at = time.perf_counter()
+            response = self.http.get(url, stream=True)
+            slot.set_response(get_reported_status(response), response.headers)
+            try:
+                if response.status_code >= 400:
+                    raise HttpStatusError(url, response.status_code)
+                if response.status_code != 200:
+                    content, is_truncated = response.content, False
+                else:
+                    chunks = response.iter_content(chunk_size=self.stream_chunk_kb * 1024)
+                    content, is_truncated = read_until_closed(chunks, self.article_container)
+                    # raw.tell() counts received bytes, before decompression like Content-Length
+                    self.stream_stats.add(response.raw.tell(), get_content_length(response.headers), is_truncated)
+            finally:
+                # the rest of a truncated page is dropped with the connection
+                response.close()
+            self.metrics.observe("fetch", time.perf_counter() - started_at)
+        self.metrics.record_response(urlsplit(url).netloc, response.status_code, get_received_bytes(response))
+        return content, is_truncated
+
+    def parse_article(self, url, content, is_truncated=False) -> Article:
+        """
+        Parse an article page downloaded by fetch_article
+        Truncated pages with an unexpected structure are downloaded again in full
+        @return (Article): None if the page is not an article
+        """
+        article = self.parse(url, content)
+        if article is None and is_truncated:
+            self.logger.debug(f"Article not found before the end of {self.article_container}, downloading all of {url}")
+            article = self.parse(url, self.fetch(url))
+        return article
 
-    @abstractmethod
     def extract_content(self, url) -> Article:
         """
-        Extract title, description and paragraphs from url
+        Download url then extract title, description and paragraphs from it
         @param url (str): url to crawl
+        @return (Article): None if the page is not an article
+        """
+        return self.parse_article(url, *self.fetch_article(url))
+
+    def parse(self, url, content) -> Article:
+        """
+        Run parse_content in the parse pool if there is one, otherwise in the current thread
+        @param url (str): url of the page
+        @param content (bytes): page content
+        @return (Article): None if the page is not an article
+        """
+        with self.metrics.timer("parse"):
+            if self.parse_pool is None:
+                return self.parse_content(url, content)
+            return self.parse_pool.submit(parsing.parse_content, type(self).__name__, url, content).result()
+
+    @abstractmethod
+    def parse_content(self, url, content) -> Article:
+        """
+        Extract title, description and paragraphs from downloaded page
+        @param url (str): url of the page
+        @param content (bytes): page content
         @return title (str)
         @return description (generator)
         @return paragraphs (generator)
@@ -28,155 +271,694 @@ class BaseCrawler(ABC):
         """
 
         article = self.extract_content(url)
+        return self.write_article(article, output_fpath)
 
+    def write_article(self, article, output_fpath) -> bool:
+        """
+        Write an extracted article in output_fpath
+        @param article (Article): extracted article, may be None
+        @param output_fpath (str): file path to save crawled result
+        @return (bool): True if article is written and otherwise
+        """
         if article is None:
             return False
-
-        with open(output_fpath, "w", encoding="utf-8") as file:
-            file.write(str(article))
-
+        if self.dedup_index is not None:
+            article = self.apply_dedup_policy(article)
+            if article is None:
+                # dropped near-duplicate, its url is done all the same
+                return True
+
+        with self.metrics.timer("write"):
+            self.sink.write(article, output_fpath)
+        if self.media is not None:
+            self.media.submit(article)
         return True
 
+    def apply_dedup_policy(self, article) -> Article:
+        """
+        Look up article in the near-duplicate index and apply dedup_policy to a near-duplicate:
+        "tag" writes it with duplicate_of, "link" only writes its title and duplicate_of, "drop" doesn't write it
+        @return (Article): article to write, None if dropped
+        """
+        with self.metrics.timer("dedup"):
+            duplicate_of = self.dedup_index.find_original(article.src, get_text(article))
+        if duplicate_of is None:
+            return article
+
+        self.metrics.inc("duplicate_articles_total", policy=self.dedup_policy)
+        self.logger.debug(f"{article.src} is a near-duplicate of {duplicate_of}")
+        match self.dedup_policy:
+            case "drop":
+                if self.state is not None:
+                    self.state.mark_done(article.src, None, None)
+                return None
+            case "link":
+                return Article(article.title, (), (), article.src, article.img, duplicate_of=duplicate_of)
+        return dataclasses.replace(article, duplicate_of=duplicate_of)
+
+    def on_article_written(self, url, output_fpath, content_hash):
+        """ Called by the sink once the article of url is stored in output_fpath """
+        self.metrics.inc("articles_written_total")
+        if self.state is not None:
+            self.state.mark_done(url, output_fpath, content_hash)
+
+    def on_article_failed(self, url, output_fpath, error):
+        """ Called by a sink writing in the background once it couldn't write the article of url """
+        failure = Failure(url, WRITE, repr(error))
+        self.on_failed_url(url, failure)
+        with self.write_failures_lock:
+            self.write_failures.append((output_fpath, failure))
+
+    def save_write_failures(self) -> int:
+        """
+        Append the articles the sink couldn't write to the dead-letter files of their directories,
+        once the sink is closed, for task "retry-failed" to crawl them again
+        @return (int): number of such articles
+        """
+        with self.write_failures_lock:
+            write_failures, self.write_failures = self.write_failures, list()
+        failures_by_dpath = dict()
+        for output_fpath, failure in write_failures:
+            failures_by_dpath.setdefault(os.path.dirname(output_fpath), list()).append((output_fpath, failure))
+        for dpath, failures in failures_by_dpath.items():
+            with DeadLetterFile("/".join([dpath, DEAD_LETTER_FNAME]), append=True) as dead_letters:
+                for output_fpath, failure in failures:
+                    dead_letters.write(failure, output_fpath, 1)
+        if write_failures:
+            self.logger.error(f"Couldn't write {len(write_failures)} articles, see {DEAD_LETTER_FNAME}")
+        return len(write_failures)
+
+    def on_connect(self, host, seconds):
+        """ Called by the session pool after opening a new connection to host """
+        self.metrics.observe("connect", seconds)
+
+    def on_failed_url(self, url, failure):
+        """ Called once url couldn't be crawled, after its retries """
+        self.metrics.inc("failed_urls_total", kind=failure.kind)
+        if self.state is not None:
+            self.state.mark_failed(url)
+
+    def get_page_urls_thread(self, page_url, parse_page) -> list:
+        """" Get urls of articles in a listing page """
+        try:
+            content = self.fetch(page_url, kind=cache.LISTING)
+        except (OSError, cache.CacheMiss) as e:
+            # like an empty page, past the last page some sites answer 404
+            self.logger.info(f"Couldn't get urls of {page_url}: {e!r}")
+            content = b""
+        articles_urls = parse_page(page_url, content)
+        if not articles_urls:
+            # an empty listing page is often the way sites answer to too many requests
+            self.throttle.backoff(page_url)
+        return articles_urls
+
     @abstractmethod
-    def get_urls_of_type_thread(self, article_type, page_number) -> list:
-        """" Get urls of articles in a specific type in a page"""
+    def get_type_page_url(self, article_type, page_number) -> str:
+        """ Url of the page_number-th listing page of article_type """
         pass
 
     @abstractmethod
-    def get_urls_of_search_thread(self, search_query, page_number) -> list:
+    def parse_type_page(self, page_url, content) -> list:
+        """ Extract urls of articles from a downloaded listing page """
         pass
 
-    def start_crawling(self):
-        error_urls = list()
+    def get_rss_url(self, article_type) -> str:
+        """ Url of the RSS (or Atom) feed of a category, for discovery: "rss" """
+        raise NotImplementedError(f"{type(self).__name__} doesn't know its RSS feeds")
+
+    def get_sitemap_urls(self, article_type) -> list:
+        """ Sitemaps (or sitemap indexes) listing the articles of a category: those of robots.txt by default """
+        robots_url = self.base_url + "/robots.txt"
+        try:
+            sitemaps = parse_robots_sitemaps(self.fetch(robots_url, kind=cache.LISTING))
+        except (OSError, cache.CacheMiss) as e:
+            self.logger.error(f"Failed to read {robots_url}: {e!r}")
+            sitemaps = list()
+        return sitemaps or [self.base_url + "/sitemap.xml"]
+
+    def is_url_of_type(self, url, article_type) -> bool:
+        """ Whether an url of the sitemaps is an article of article_type, all urls are by default """
+        return True
+
+    def get_search_page_url(self, search_query, page_number) -> str:
+        """ Url of the page_number-th search result page of search_query """
+        raise NotImplementedError(f"{type(self).__name__} does not support searching")
 
-        match self.task:
-            case "url":
-                error_urls = self.crawl_urls(self.urls_fpath, self.output_dpath)
-            case "type":
-                error_urls = self.crawl_types()
-            case "search":
-                error_urls = self.crawl_search(self.search_query)
+    def parse_search_page(self, page_url, content) -> list:
+        """ Extract urls of articles from a downloaded search result page """
+        raise NotImplementedError(f"{type(self).__name__} does not support searching")
 
-        self.logger.info(f"The number of failed URL: {len(error_urls)}")
+    def start_crawling(self, sink=None):
+        """
+        Run the task of the crawler
+        @param sink (Sink): destination of the crawled articles, by default the files of output_format
+        @return (int): number of failed urls
+        """
+        num_error_urls = 0
+        if self.state_store or self.resume:
+            self.open_state_store()
+        if self.http_cache or self.offline or self.task == "replay":
+            self.open_cache()
+        self.sink = sink or get_sink(self.output_format,
+                                     on_written=self.on_article_written,
+                                     on_failed=self.on_article_failed,
+                                     compression=self.compression,
+                                     rotate_mb=self.rotate_mb,
+                                     num_writers=self.sink_writers,
+                                     batch_size=self.sink_batch_size)
+        self.queues["sink"] = self.sink.depth
+        if self.download_images != "none":
+            self.open_media()
+        # a near-duplicate index shared by a multi-site run is closed by its owner
+        owns_dedup_index = self.dedup != "none" and self.dedup_index is None
+        if owns_dedup_index:
+            self.open_dedup_index()
+        if self.collect_metrics:
+            self.start_metrics()
+        profiler = self.start_profiler()
+
+        if self.distributed != "none":
+            num_error_urls = self.crawl_distributed()
+        else:
+            match self.task:
+                case "url":
+                    num_error_urls = self.crawl_urls(self.urls_fpath, self.output_dpath)
+                case "type":
+                    num_error_urls = self.crawl_types()
+                case "search":
+                    num_error_urls = self.crawl_search(self.search_query)
+                case "replay":
+                    num_error_urls = self.crawl_replay()
+                case "retry-failed":
+                    num_error_urls = self.crawl_failed()
+                case "daemon":
+                    num_error_urls = CrawlDaemon(self, self.stop_event).run()
+
+        self.stop_profiler(profiler)
+        self.sink.close()
+        num_error_urls += self.save_write_failures()
+        if self.media is not None:
+            self.media.close()
+            self.media.store.close()
+        self.http.close()
+        # a pool shared by a multi-site run (parse_workers = 0) is shut down by its owner
+        if self.parse_pool is not None and self.parse_workers:
+            self.parse_pool.shutdown()
+        if self.state is not None:
+            self.state.close()
+        if self.cache is not None:
+            self.cache.close()
+        if owns_dedup_index:
+            self.logger.info(f"Near-duplicate articles: {self.dedup_index.report()}")
+            self.dedup_index.close()
+        if self.stream_stats.num_pages:
+            self.logger.info(f"Streamed article pages: {self.stream_stats.report()}")
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+        self.logger.info(f"The number of failed URL: {num_error_urls}")
+        return num_error_urls
+
+    def start_metrics(self):
+        """ Export metrics every metrics_interval seconds, in output_dpath by default """
+        create_dir(self.output_dpath)
+        self.metrics.set_gauge("in_flight", lambda: {(("host", host),): in_flight
+                                                     for host, in_flight in self.throttle.in_flight().items()})
+        self.metrics.set_gauge("concurrency_limit", lambda: {(("host", host),): limit
+                                                             for host, limit in self.throttle.limits().items()})
+        self.metrics.set_gauge("queue_depth", lambda: {(("queue", name),): depth()
+                                                       for name, depth in list(self.queues.items())})
+        self.metrics_exporter = MetricsExporter(
+            self.metrics,
+            interval=self.metrics_interval,
+            json_fpath=self.metrics_fpath or "/".join([self.output_dpath, "metrics.jsonl"]),
+            prometheus_fpath=self.prometheus_fpath or "/".join([self.output_dpath, "metrics.prom"]),
+            port=self.metrics_port).start()
+        self.logger.info(f"Exporting metrics every {self.metrics_interval}s"
+                         + (f", served on port {self.metrics_port}" if self.metrics_port else ""))
+
+    def start_profiler(self):
+        """ Start the profiler selected by profile: "none", "cprofile" or "sampling" """
+        match self.profile:
+            case "cprofile":
+                # only sees the main thread: the event loop with the async engine, not the worker threads
+                profiler = cProfile.Profile()
+                profiler.enable()
+                return profiler
+            case "sampling":
+                return SamplingProfiler().start()
+        return None
+
+    def stop_profiler(self, profiler):
+        """ Write the profile in output_dpath """
+        if profiler is None:
+            return
+        create_dir(self.output_dpath)
+        if isinstance(profiler, SamplingProfiler):
+            profile_fpath = "/".join([self.output_dpath, "profile.folded"])
+            profiler.stop(profile_fpath)
+        else:
+            profiler.disable()
+            profile_fpath = "/".join([self.output_dpath, "profile.pstats"])
+            profiler.dump_stats(profile_fpath)
+            # logged, stdout may be the output of the crawl
+            stats = io.StringIO()
+            pstats.Stats(profiler, stream=stats).sort_stats("cumulative").print_stats(20)
+            self.logger.info(f"Top functions by cumulative time:\n{stats.getvalue()}")
+        self.logger.info(f"Profile written in {profile_fpath}")
+
+    def open_state_store(self):
+        """ Open the state store of crawled urls, in output_dpath by default """
+        create_dir(self.output_dpath)
+        state_fpath = self.state_fpath or "/".join([self.output_dpath, "crawl_state.sqlite3"])
+        self.state = StateStore(state_fpath)
+        self.logger.info(f"Using crawl state {state_fpath} ({self.state.count('done')} urls already crawled)")
+
+    def open_cache(self):
+        """ Open the response cache, in output_dpath/http_cache by default """
+        cache_dpath = self.cache_dpath or "/".join([self.output_dpath, "http_cache"])
+        self.cache = cache.ResponseCache(cache_dpath, self.cache_max_mb * 1024 * 1024)
+        self.logger.info(f"Using response cache {cache_dpath} ({self.cache.total_bytes / 1024 / 1024:.1f} MB)")
+
+    def open_media(self):
+        """ Download the images of written articles in output_dpath/images (or images_dpath) """
+        if self.download_images not in IMAGE_MODES:
+            raise ValueError(f"Unknown download_images {self.download_images}, use one of {list(IMAGE_MODES)}")
+        images_dpath = self.images_dpath or "/".join([self.output_dpath, "images"])
+        store = ImageStore(images_dpath, self.images_max_mb * 1024 * 1024)
+        self.media = MediaPipeline(self, store)
+        self.queues["images"] = self.media.depth
+        self.logger.info(f"Downloading {self.download_images} images in {images_dpath} "
+                         f"({store.total_bytes / 1024 / 1024:.1f} MB already stored)")
+
+    def create_dedup_index(self, db_fpath) -> DedupIndex:
+        """ Near-duplicate index of the articles fingerprinted by the dedup method, stored in db_fpath """
+        if self.dedup == "none" or self.dedup not in DEDUP_METHODS:
+            raise ValueError(f"Unknown dedup {self.dedup}, use one of {list(DEDUP_METHODS)}")
+        if self.dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(f"Unknown dedup_policy {self.dedup_policy}, use one of {list(DEDUP_POLICIES)}")
+        if self.dedup == "simhash":
+            fingerprint = SimHash(self.dedup_max_distance, self.dedup_shingle_size)
+        else:
+            fingerprint = MinHash(self.dedup_threshold, self.dedup_shingle_size)
+        return DedupIndex(db_fpath, fingerprint)
+
+    def open_dedup_index(self):
+        """ Open the near-duplicate index, in output_dpath by default """
+        create_dir(self.output_dpath)
+        dedup_fpath = self.dedup_fpath or "/".join([self.output_dpath, DEDUP_FNAME])
+        self.dedup_index = self.create_dedup_index(dedup_fpath)
+        self.logger.info(f"Using near-duplicate index {dedup_fpath} ({self.dedup_index.count()} articles indexed, "
+                         f"{self.dedup_policy} near-duplicates)")
+
+    def crawl_distributed(self):
+        """
+        Run as the coordinator (enqueueing the urls of the task) or a worker (crawling urls of the work queue)
+        The queue is output_dpath/work_queue.sqlite3 by default, queue_url can point to another database
+        or to http://host:queue_port of a coordinator on another host
+        Returns:
+            number of failed urls
+        """
+        create_dir(self.output_dpath)
+        queue_url = self.queue_url or "/".join([self.output_dpath, "work_queue.sqlite3"])
+        queue = open_work_queue(queue_url, max_attempts=self.max_attempts)
+        self.logger.info(f"Running as distributed {self.distributed} on work queue {queue_url}")
+        try:
+            match self.distributed:
+                case "coordinator":
+                    return Coordinator(self, queue).run()
+                case "worker":
+                    return Worker(self, queue).run()
+                case role:
+                    raise ValueError(f"Unknown distributed role {role}, expected coordinator or worker")
+        finally:
+            queue.close()
+
+    def is_stopping(self) -> bool:
+        """ True once stop_event is set: the urls in flight are finished but no new one is crawled """
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def claim_url(self, url, output_dpath, index, crawl_done=False):
+        """
+        Output index of url in output_dpath
+        @param index (int): index of url in its list, used when there is no state store
+        @param crawl_done (bool): claim urls crawled by a previous run too, to extract them again
+        @return (int): None if url has already been crawled by a previous run
+        """
+        if self.state is None:
+            return index
+        if not crawl_done and self.state.is_done(url):
+            return None
+        return self.state.claim(url, output_dpath)
 
-    def crawl_urls(self, urls_fpath, output_dpath):
+    def crawl_urls(self, urls_fpath, output_dpath, crawl_done=False, append_failures=False):
         """
-        Crawling contents from a list of urls
+        Crawling contents from a list of urls, streamed from urls_fpath ("-" for stdin)
+        Urls are read lazily and at most queue_size of them are waiting for a worker,
+        urls failed by a transient error are crawled again later, the others are written
+        in output_dpath/failed_urls.jsonl as soon as they fail
+        @param crawl_done (bool): don't skip the urls the state store has as done (replay)
+        @param append_failures (bool): keep the failed urls of previous crawls in failed_urls.jsonl (daemon polls)
         Returns:
-            list of failed urls
+            number of failed urls
         """
         self.logger.info(f"Start crawling urls from {urls_fpath} file...")
         create_dir(output_dpath)
-        urls = list(read_file(urls_fpath))
-        num_urls = len(urls)
-        # number of digits in an integer
-        self.index_len = len(str(num_urls))
-
-        args = ([output_dpath]*num_urls, urls, range(num_urls))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            results = list(tqdm(executor.map(self.crawl_url_thread, *args), total=num_urls, desc="URLs"))
-    
+        urls = (url for url in read_file(urls_fpath) if url)
+
+        num_skipped_urls = 0
+        num_duplicate_urls = 0
+        num_claimed_urls = 0
+        frontier = self.create_frontier()
+
+        def claim_urls():
+            nonlocal num_skipped_urls, num_duplicate_urls, num_claimed_urls
+            for index, url in enumerate(urls):
+                if self.is_stopping():
+                    return
+                # variants of an url listed before (tracking parameters, fragment...) are crawled once
+                canonical_urls = frontier.add([url])
+                if not canonical_urls:
+                    num_duplicate_urls += 1
+                    progress_bar.update()
+                    continue
+                url = canonical_urls[0]
+                output_index = self.claim_url(url, output_dpath, index, crawl_done)
+                if output_index is None:
+                    num_skipped_urls += 1
+                    progress_bar.update()
+                else:
+                    num_claimed_urls += 1
+                    yield self.get_output_fpath(output_dpath, output_index), url
+
+        with DeadLetterFile("/".join([output_dpath, DEAD_LETTER_FNAME]), append=append_failures) as dead_letters, \
+             tqdm(total=None, desc="URLs") as progress_bar:
+            # open-ended: the urls file isn't read ahead of the crawl to count its urls
+            # registered once progress_bar exists, the metrics exporter may read it at any time
+            self.queues["urls"] = lambda: num_claimed_urls - progress_bar.n + num_skipped_urls + num_duplicate_urls
+            num_error_urls = self.crawl_queue(self.create_retry_queue(claim_urls()), dead_letters, progress_bar)
+
+        self.queues.pop("urls", None)
+        frontier.close()
+        if num_duplicate_urls:
+            self.logger.info(f"Skipped {num_duplicate_urls} duplicate urls")
+        if num_skipped_urls:
+            self.logger.info(f"Skipped {num_skipped_urls} urls crawled by previous runs")
         self.logger.info(f"Saving crawling result into {output_dpath} directory...")
-        return [result for result in results if result is not None]
+        return num_error_urls
+
+    def create_retry_queue(self, urls) -> RetryQueue:
+        """ @param urls (iterable): (output_fpath, url) pairs """
+        return RetryQueue(urls, self.max_attempts, self.retry_backoff, self.retry_max_delay)
 
-    def crawl_url_thread(self, output_dpath, url, index):
-        """ Crawling content of the specific url """
+    def crawl_queue(self, url_queue, dead_letters, progress_bar):
+        """
+        Crawl the urls of url_queue with the crawler engine
+        Urls failed by a network error, a timeout, a 429 or a 5xx response are crawled again after a backoff
+        until they failed max_attempts times, the other failures are written in dead_letters
+        Returns:
+            number of failed urls
+        """
+        num_error_urls = 0
+        self.queues["retries"] = url_queue.depth
+
+        def handle_result(item, failure):
+            nonlocal num_error_urls
+            if url_queue.done(item, failure):
+                self.logger.debug(f"Crawling {item[1]} again later ({failure.describe()})")
+                self.metrics.inc("retries_total", kind=failure.kind)
+                return
+            progress_bar.update()
+            if failure is not None:
+                num_error_urls += 1
+                output_fpath, url, attempt = item
+                dead_letters.write(failure, output_fpath, attempt)
+                self.on_failed_url(url, failure)
+
+        if self.engine == "async":
+            self.get_async_engine().crawl_urls(url_queue, handle_result)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                pending = dict()
+                while True:
+                    delay = None
+                    while len(pending) < self.queue_size:
+                        item, delay = url_queue.get()
+                        if item is None:
+                            break
+                        output_fpath, url, __ = item
+                        pending[executor.submit(self.crawl_url, url, output_fpath)] = item
+                    if not pending:
+                        if delay is None:
+                            break
+                        time.sleep(delay)
+                        continue
+                    done, __ = concurrent.futures.wait(pending, timeout=delay,
+                                                       return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(pending.pop(future), future.result())
+
+        self.queues.pop("retries", None)
+        return num_error_urls
+
+    def crawl_url(self, url, output_fpath) -> Failure:
+        """
+        Crawl the article of url into output_fpath
+        @return (Failure): why it failed, None if the article is written
+        """
+        try:
+            is_success = self.write_content(url, output_fpath)
+        except Exception as e:
+            failure = classify(url, e)
+        else:
+            failure = None if is_success else Failure(url, PARSE, NOT_AN_ARTICLE)
+
+        if failure is not None:
+            self.logger.debug(f"Crawling unsuccessfully: {url} ({failure.describe()})")
+        return failure
+
+    def get_output_fpath(self, output_dpath, index):
+        """ File path of the index-th crawled url """
         file_index = str(index + 1).zfill(self.index_len)
-        output_fpath = "".join([output_dpath, "/url_", file_index, ".txt"])
-        is_success = self.write_content(url, output_fpath)
+        return "".join([output_dpath, "/url_", file_index, ".txt"])
+
+    def get_async_engine(self, keep_alive=False):
+        """ Engine of engine: async, the kept alive one of a daemon while it runs """
+        if self.async_engine is not None:
+            return self.async_engine
+        # aiohttp is only needed with engine: async
+        from .async_engine import AsyncEngine
+        return AsyncEngine(self, keep_alive)
+
+    def crawl_failed(self):
+        """
+        Crawl again the urls of the dead-letter files (failed_urls.jsonl) found in output_dpath,
+        into the files they were meant for. Dead-letter files are replaced by the urls failing again.
+        Returns:
+            number of failed urls
+        """
+        dead_letter_fpaths = find_dead_letter_files(self.output_dpath)
+        records = dict()
+        for fpath in dead_letter_fpaths:
+            # the polls of a daemon append to the same file: an url is retried once, and not if a later poll crawled it
+            last_records = {record["url"]: record for record in read_dead_letters(fpath)}
+            records[fpath] = [record for url, record in last_records.items()
+                              if self.state is None or not self.state.is_done(url)]
+        num_urls = sum(len(fpath_records) for fpath_records in records.values())
+        self.logger.info(f"Crawl again {num_urls} failed urls of {len(records)} dead-letter files in {self.output_dpath}")
+
+        num_error_urls = 0
+        with tqdm(total=num_urls, desc="URLs") as progress_bar:
+            for fpath, fpath_records in records.items():
+                if not fpath_records:
+                    continue
+                urls = ((record["output_fpath"], record["url"]) for record in fpath_records)
+                # written aside, the urls not retried yet stay in the dead-letter file if the run is interrupted
+                tmp_fpath = fpath + ".tmp"
+                with DeadLetterFile(tmp_fpath) as dead_letters:
+                    num_error_urls += self.crawl_queue(self.create_retry_queue(urls), dead_letters, progress_bar)
+                os.replace(tmp_fpath, fpath)
+        return num_error_urls
+
+    def crawl_replay(self):
+        """
+        Extract again every article of the website stored in the response cache, without network
+        Returns:
+            number of failed urls
+        """
+        self.offline = True
+        urls_dpath, results_dpath = init_output_dirs(self.output_dpath)
+        articles_urls = self.cache.urls(urlsplit(self.base_url).netloc)
+        self.logger.info(f"Replaying {len(articles_urls)} cached articles...")
 
-        if not is_success:
-            self.logger.debug(f"Crawling unsuccessfully: {url}")
-            return url
+        articles_urls_fpath = "/".join([urls_dpath, "replay.txt"])
+        with open(articles_urls_fpath, "w") as urls_file:
+            urls_file.write("\n".join(articles_urls))
+
+        # cached articles are usually done in the state store, replaying is extracting them again
+        return self.crawl_urls(articles_urls_fpath, "/".join([results_dpath, "replay"]), crawl_done=True)
 
     def crawl_types(self):
         """ Crawling contents of a specific type or all types """
         urls_dpath, results_dpath = init_output_dirs(self.output_dpath)
 
-        if self.article_type == "all":
-            error_urls = self.crawl_all_types(urls_dpath, results_dpath)
+        if self.pipeline and self.discovery == "listing":
+            article_types = list(self.article_type_dict.values()) if self.article_type == "all" else [self.article_type]
+            num_error_urls = self.crawl_types_pipelined(article_types, urls_dpath, results_dpath)
+        elif self.article_type == "all":
+            num_error_urls = self.crawl_all_types(urls_dpath, results_dpath)
         else:
-            error_urls = self.crawl_type(self.article_type, urls_dpath, results_dpath)
-        return error_urls
+            num_error_urls = self.crawl_type(self.article_type, urls_dpath, results_dpath)
+        return num_error_urls
 
     def crawl_type(self, article_type, urls_dpath, results_dpath):
         """" Crawl total_pages of articles in specific type """
 
         self.logger.info(f"Crawl articles type {article_type}")
-        error_urls: list
+        num_error_urls: int
 
         # getting urls
-        self.logger.info(f"Getting urls of {article_type}...")
-        articles_urls = self.get_urls_of_type(article_type)
         articles_urls_fpath = "/".join([urls_dpath, f"{article_type}.txt"])
-        with open(articles_urls_fpath, "w") as urls_file:
-            urls_file.write("\n".join(articles_urls)) 
+        if self.resume and os.path.exists(articles_urls_fpath):
+            self.logger.info(f"Resuming from urls of {article_type} found by the interrupted run...")
+        else:
+            self.logger.info(f"Getting urls of {article_type}...")
+            write_lines(articles_urls_fpath, self.get_urls_of_type(article_type))
 
         # crawling urls
         self.logger.info(f"Crawling from urls of {article_type}...")
         results_type_dpath = "/".join([results_dpath, article_type])
-        error_urls = self.crawl_urls(articles_urls_fpath, results_type_dpath)
+        num_error_urls = self.crawl_urls(articles_urls_fpath, results_type_dpath)
 
-        return error_urls
+        return num_error_urls
 
     def crawl_all_types(self, urls_dpath, results_dpath):
         """" Crawl articles from all categories with total_pages per category """
-        total_error_urls = list()
+        total_error_urls = 0
 
-        num_types = len(self.article_type_dict) 
+        num_types = len(self.article_type_dict)
         for i in range(num_types):
             article_type = self.article_type_dict[i]
-            error_urls = self.crawl_type(article_type, urls_dpath, results_dpath)
-            self.logger.info(f"The number of failed {article_type} URL: {len(error_urls)}")
+            num_error_urls = self.crawl_type(article_type, urls_dpath, results_dpath)
+            self.logger.info(f"The number of failed {article_type} URL: {num_error_urls}")
             self.logger.info("-" * 79)
-            total_error_urls.extend(error_urls)
+            total_error_urls += num_error_urls
 
         return total_error_urls
 
+    def crawl_types_pipelined(self, article_types, urls_dpath, results_dpath):
+        """
+        Crawl total_pages of articles of all article_types at once, urls found in listing pages are crawled right away
+        Returns:
+            number of failed urls
+        """
+        self.logger.info(f"Crawl articles types {', '.join(article_types)} (pipelined)")
+        categories = [Category(article_type,
+                               "/".join([urls_dpath, f"{article_type}.txt"]),
+                               "/".join([results_dpath, article_type]),
+                               self.get_type_page_url,
+                               self.parse_type_page,
+                               resume=self.resume)
+                      for article_type in article_types]
+        return DiscoveryPipeline(self, categories).run()
+
     def crawl_search(self, search_query):
         """
         Crawls pages of search results for a given query, extracting article URLs from each page.
         """
         urls_dpath, results_dpath = init_output_dirs(self.output_dpath)
 
+        if self.pipeline:
+            self.logger.info(f"Crawl search results for query '{search_query}' (pipelined)")
+            category = Category(search_query,
+                                "/".join([urls_dpath, f"{search_query}.txt"]),
+                                "/".join([results_dpath, search_query]),
+                                self.get_search_page_url,
+                                self.parse_search_page,
+                                resume=self.resume)
+            return DiscoveryPipeline(self, [category]).run()
+
         self.logger.info(f"Crawl search results for query '{search_query}'...")
-        error_urls: list
+        num_error_urls: int
 
         # getting url
-        self.logger.info(f"Getting urls of query '{search_query}'...")
-        articles_urls = self.get_urls_of_search(search_query)
         articles_urls_fpath = "/".join([urls_dpath, f"{search_query}.txt"])
-        with open(articles_urls_fpath, "w") as urls_file:
-            urls_file.write("\n".join(articles_urls))
+        if self.resume and os.path.exists(articles_urls_fpath):
+            self.logger.info(f"Resuming from urls of query '{search_query}' found by the interrupted run...")
+        else:
+            self.logger.info(f"Getting urls of query '{search_query}'...")
+            articles_urls = self.get_urls_of_search(search_query)
+            with open(articles_urls_fpath, "w") as urls_file:
+                urls_file.write("\n".join(articles_urls))
 
         # crawling url
         self.logger.info(f"Crawling from urls of query '{search_query}'...")
         results_type_dpath = "/".join([results_dpath, search_query])
-        error_urls = self.crawl_urls(articles_urls_fpath, results_type_dpath)
+        num_error_urls = self.crawl_urls(articles_urls_fpath, results_type_dpath)
 
-        return error_urls
+        return num_error_urls
 
     def get_urls_of_type(self, article_type):
-        """" Get urls of articles in a specific type """
-
-        articles_urls: list
-        args = ([article_type]*self.total_pages, range(1, self.total_pages+1))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            results = list(tqdm(executor.map(self.get_urls_of_type_thread, *args), total=self.total_pages, desc="Pages"))
-
-        articles_urls = sum(results, [])
-        articles_urls = list(set(articles_urls))
-
-        return articles_urls
+        """"
+        Get urls of articles in a specific type, from its listing pages, RSS feed or the sitemaps
+        @return (iterable): urls, a list for listing pages, a generator reading them from disk for feeds
+        """
+        if self.discovery not in DISCOVERY_SOURCES:
+            raise ValueError(f"Unknown discovery {self.discovery}, use one of {list(DISCOVERY_SOURCES)}")
+        if self.discovery != "listing":
+            discovery = FeedDiscovery(self, date_cutoff=get_date_cutoff(self.date_cutoff))
+            return discovery.get_urls(self.discovery, article_type)
+        return self.get_urls_of_pages(article_type, self.get_type_page_url, self.parse_type_page)
 
     def get_urls_of_search(self, search_query):
-        articles_urls: list
-        args = ([search_query]*self.total_pages, range(1, self.total_pages+1))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            results = list(tqdm(executor.map(self.get_urls_of_search_thread, *args), total=self.total_pages, desc="Pages"))
-
-        articles_urls = sum(results, [])
-        articles_urls = list(set(articles_urls))
-
+        return self.get_urls_of_pages(search_query, self.get_search_page_url, self.parse_search_page)
+
+    def canonicalize_url(self, url) -> str:
+        """ Canonical form of the url of an article of this website, see frontier.canonicalize_url """
+        return canonicalize_url(url, drop_params=self.drop_params)
+
+    def create_frontier(self) -> UrlFrontier:
+        """ Deduplicated urls found by a discovery, in discovery order or newest first (frontier_order) """
+        if self.frontier_order not in FRONTIER_ORDERS:
+            raise ValueError(f"Unknown frontier_order {self.frontier_order}, use one of {list(FRONTIER_ORDERS)}")
+        return UrlFrontier(self.canonicalize_url,
+                           capacity=self.frontier_capacity,
+                           error_rate=self.frontier_error_rate,
+                           newest_first=self.frontier_order == "newest")
+
+    def create_paginator(self, name) -> Paginator:
+        """ Paginator of the listing pages of a category or search query, see pagination """
+        is_adaptive = self.pagination == "adaptive"
+        return Paginator(name,
+                         self.total_pages,
+                         adaptive=is_adaptive,
+                         is_known=self.state.is_done if is_adaptive and self.state is not None else None,
+                         date_cutoff=get_date_cutoff(self.date_cutoff) if is_adaptive else None,
+                         frontier=self.create_frontier())
+
+    def get_urls_of_pages(self, name, get_page_url, parse_page) -> list:
+        """
+        Get urls of articles from the listing pages of name (category or search query)
+        The total_pages pages are fetched at once, or page_window pages at a time until caught up with adaptive pagination
+        """
+        paginator = self.create_paginator(name)
+        window = self.page_window if paginator.adaptive else self.total_pages
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor, \
+             tqdm(total=None if paginator.adaptive else self.total_pages, desc="Pages") as progress_bar:
+            while page_numbers := paginator.take_pages(window):
+                page_urls = [get_page_url(name, page_number) for page_number in page_numbers]
+                if self.engine == "async":
+                    results = self.get_async_engine().get_urls(page_urls, parse_page, progress_bar)
+                else:
+                    results = list()
+                    for articles_urls in executor.map(self.get_page_urls_thread, page_urls, [parse_page] * len(page_urls)):
+                        results.append(articles_urls)
+                        progress_bar.update()
+                for page_number, articles_urls in zip(page_numbers, results):
+                    paginator.add_page(page_number, articles_urls)
+
+        if paginator.adaptive:
+            self.logger.info(paginator.report())
+        articles_urls = paginator.urls()
+        paginator.close()
         return articles_urls
-
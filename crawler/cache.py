@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils import create_dir
+
+ARTICLE = "article"
+LISTING = "listing"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE INDEX IF NOT EXISTS responses_host ON responses (host, kind);
+CREATE TABLE IF NOT EXISTS bodies (
+    body_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+"""
+
+
+class CacheMiss(Exception):
+    """ Url is not in the cache while crawling offline """
+
+
+class CachedResponse:
+
+    def __init__(self, body, etag, last_modified):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def conditional_headers(self) -> dict:
+        """ Headers asking the server to answer 304 Not Modified if the cached body is still valid """
+        headers = dict()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies.
+    Bodies are gzip compressed and stored by content hash (identical pages are stored once),
+    urls are indexed in SQLite and the least recently used ones are evicted above max_bytes.
+    """
+
+    def __init__(self, cache_dpath, max_bytes):
+        self.cache_dpath = cache_dpath
+        self.bodies_dpath = "/".join([cache_dpath, "bodies"])
+        self.max_bytes = max_bytes
+        create_dir(self.bodies_dpath)
+
+        self._connection = sqlite3.connect("/".join([cache_dpath, "index.sqlite3"]), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+    def _body_fpath(self, body_hash):
+        return "/".join([self.bodies_dpath, body_hash[:2], body_hash + ".gz"])
+
+    def get(self, url) -> CachedResponse:
+        """ Cached response of url, None if it isn't cached """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT body_hash, etag, last_modified FROM responses WHERE url = ?",
+                                           (url,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+
+        body_hash, etag, last_modified = row
+        try:
+            with open(self._body_fpath(body_hash), "rb") as file:
+                body = gzip.decompress(file.read())
+        except (FileNotFoundError, gzip.BadGzipFile, EOFError):
+            return None
+        return CachedResponse(body, etag, last_modified)
+
+    def put(self, url, host, kind, body, etag=None, last_modified=None):
+        """ Store body as the response of url """
+        body_hash = hashlib.sha256(body).hexdigest()
+        body_fpath = self._body_fpath(body_hash)
+        if not os.path.exists(body_fpath):
+            compressed = gzip.compress(body, compresslevel=6)
+            create_dir(os.path.dirname(body_fpath))
+            # write then rename, a reader never sees a partial body
+            tmp_fpath = f"{body_fpath}.{threading.get_ident()}.tmp"
+            with open(tmp_fpath, "wb") as file:
+                file.write(compressed)
+            os.replace(tmp_fpath, body_fpath)
+        else:
+            compressed = None
+
+        now = time.time()
+        with self._lock, self._connection:
+            old_row = self._connection.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (url, host, kind, body_hash, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, host, kind, body_hash, etag, last_modified, now, now))
+            if self._connection.execute("SELECT 1 FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone() is None:
+                size = len(compressed) if compressed is not None else os.path.getsize(body_fpath)
+                self._connection.execute("INSERT INTO bodies (body_hash, size) VALUES (?, ?)", (body_hash, size))
+                self.total_bytes += size
+            if old_row is not None and old_row[0] != body_hash:
+                self._delete_body_if_unused(old_row[0])
+            self._evict()
+
+    def touch(self, url):
+        """ Mark url as revalidated by the server (304 Not Modified) """
+        with self._lock, self._connection:
+            now = time.time()
+            self._connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def urls(self, host, kind=ARTICLE) -> list:
+        """ Cached urls of host, oldest first """
+        with self._lock:
+            rows = self._connection.execute("SELECT url FROM responses WHERE host = ? AND kind = ? ORDER BY stored_at",
+                                            (host, kind)).fetchall()
+        return [row[0] for row in rows]
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            row = self._connection.execute("SELECT url, body_hash FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self._delete_body_if_unused(row[1])
+
+    def _delete_body_if_unused(self, body_hash):
+        if self._connection.execute("SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+            return
+        row = self._connection.execute("SELECT size FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone()
+        self._connection.execute("DELETE FROM bodies WHERE body_hash = ?", (body_hash,))
+        if row is not None:
+            self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_fpath(body_hash))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,213 @@
+"""
+Long-running crawl of every category, instead of a cron job starting a new process for each run: connections,
+the parse pool and the state store stay open, and each category is polled on its own interval,
+following how often it publishes articles.
+"""
+import json
+import os
+import signal
+import threading
+import time
+
+from utils import init_output_dirs
+
+# weight of the last poll in the publishing rate of a category
+RATE_WEIGHT = 0.5
+DAEMON_STATUS_FNAME = "daemon_status.json"
+
+
+def install_signal_handlers(stop_event, logger):
+    """ The first SIGTERM or SIGINT sets stop_event, daemons finish their urls in flight, a second one stops them now """
+    if threading.current_thread() is not threading.main_thread():
+        logger.warning("Daemon not running in the main thread, only its stop_event stops it")
+        return
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping after the urls in flight...")
+        stop_event.set()
+        signal.signal(signum, signal.default_int_handler if signum == signal.SIGINT else signal.SIG_DFL)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle_signal)
+
+
+class CategorySchedule:
+    """
+    Polling interval of a category, adjusted after each poll to find about target_articles new articles per poll:
+    a category publishing every few minutes is polled every min_interval seconds, a quiet one up to max_interval
+    """
+
+    def __init__(self, name, interval, min_interval, max_interval, target_articles):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_articles = target_articles
+        self.interval = min(max(interval, min_interval), max_interval)
+        # new articles per second, None before the second poll
+        self.rate = None
+        self.next_poll_at = time.time()
+        self.last_poll_at = None
+        self.num_polls = 0
+        self.last_new = 0
+        self.total_new = 0
+        self.total_failed = 0
+        self.last_error = None
+
+    def is_due(self, now) -> bool:
+        return self.next_poll_at <= now
+
+    def add_poll(self, polled_at, num_new, num_failed):
+        """ Record the result of a poll started at polled_at, then schedule the next one """
+        # the first poll finds the backlog of the category, not what it published since the previous poll
+        if self.last_poll_at is not None:
+            rate = num_new / max(polled_at - self.last_poll_at, 1.0)
+            self.rate = rate if self.rate is None else RATE_WEIGHT * rate + (1 - RATE_WEIGHT) * self.rate
+            if self.rate > 0:
+                self.interval = self.target_articles / self.rate
+            else:
+                self.interval *= 2
+            self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+
+        self.num_polls += 1
+        self.last_poll_at = polled_at
+        self.last_new = num_new
+        self.total_new += num_new
+        self.total_failed += num_failed
+        self.last_error = None
+        self.next_poll_at = polled_at + self.interval
+
+    def add_error(self, polled_at, error):
+        """ Poll failed as a whole (listing pages unreachable...), try again later """
+        self.num_polls += 1
+        self.last_error = repr(error)
+        self.interval = min(self.interval * 2, self.max_interval)
+        self.next_poll_at = polled_at + self.interval
+
+    def to_status(self) -> dict:
+        return {"interval": round(self.interval, 1),
+                "articles_per_hour": None if self.rate is None else round(self.rate * 3600, 2),
+                "next_poll_at": self.next_poll_at,
+                "last_poll_at": self.last_poll_at,
+                "polls": self.num_polls,
+                "last_new": self.last_new,
+                "total_new": self.total_new,
+                "total_failed": self.total_failed,
+                "last_error": self.last_error}
+
+
+class CrawlDaemon:
+    """
+    Poll the categories of a crawler until it is stopped (SIGTERM, SIGINT or stop_event), crawling only the articles
+    never crawled before: listing pages are read with adaptive pagination, which stops at the first page of known urls,
+    and urls done (or failed max_attempts times) in the state store are skipped.
+    The schedule of every category is written in a status file after each poll.
+    """
+
+    def __init__(self, crawler, stop_event=None):
+        """
+        @param stop_event (threading.Event): stops the daemon once set, by default set by SIGTERM and SIGINT
+        """
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.stop_event = stop_event
+        self.status_fpath = crawler.daemon_status_fpath or "/".join([crawler.output_dpath, DAEMON_STATUS_FNAME])
+        self.started_at = time.time()
+        self.state = "starting"
+        article_types = list(crawler.article_type_dict.values()) if crawler.article_type == "all" \
+            else [crawler.article_type]
+        self.schedules = [CategorySchedule(article_type,
+                                           crawler.daemon_interval,
+                                           crawler.daemon_min_interval,
+                                           crawler.daemon_max_interval,
+                                           crawler.daemon_target_articles)
+                          for article_type in article_types]
+
+    def run(self) -> int:
+        """
+        Poll every category when it is due until the daemon is stopped
+        @return (int): number of failed urls
+        """
+        crawler = self.crawler
+        if crawler.state is None:
+            crawler.open_state_store()
+        if crawler.pagination != "adaptive":
+            self.logger.info("Daemon polls use adaptive pagination, total_pages bounds the listing pages of a poll")
+            crawler.pagination = "adaptive"
+        if self.stop_event is None:
+            self.stop_event = crawler.stop_event = threading.Event()
+            install_signal_handlers(self.stop_event, self.logger)
+
+        if crawler.engine == "async":
+            # one event loop and session for every poll, connections stay warm like the session pool of threads
+            crawler.async_engine = crawler.get_async_engine(keep_alive=True)
+
+        self.urls_dpath, self.results_dpath = init_output_dirs(crawler.output_dpath)
+        self.logger.info(f"Daemon polling {len(self.schedules)} categories, status in {self.status_fpath}")
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                due = [schedule for schedule in self.schedules if schedule.is_due(now)]
+                if not due:
+                    self.set_state("sleeping")
+                    next_poll_at = min(schedule.next_poll_at for schedule in self.schedules)
+                    self.stop_event.wait(next_poll_at - now)
+                    continue
+                self.set_state("polling")
+                # the most overdue first, a shutdown only waits for the urls in flight
+                for schedule in sorted(due, key=lambda schedule: schedule.next_poll_at):
+                    if self.stop_event.is_set():
+                        break
+                    self.poll(schedule)
+                    self.write_status()
+        finally:
+            if crawler.async_engine is not None:
+                crawler.async_engine.close()
+                crawler.async_engine = None
+            self.set_state("stopped")
+        self.logger.info("Daemon stopped: " + ", ".join(f"{schedule.name} {schedule.total_new} new"
+                                                        for schedule in self.schedules))
+        return sum(schedule.total_failed for schedule in self.schedules)
+
+    def poll(self, schedule):
+        """ Find the new articles of a category and crawl them """
+        crawler = self.crawler
+        polled_at = time.time()
+        try:
+            articles_urls = crawler.get_urls_of_type(schedule.name)
+            new_urls = [url for url in articles_urls if not crawler.state.is_settled(url, crawler.max_attempts)]
+            num_error_urls = 0
+            if new_urls:
+                articles_urls_fpath = "/".join([self.urls_dpath, f"{schedule.name}.txt"])
+                with open(articles_urls_fpath, "w") as urls_file:
+                    urls_file.write("\n".join(new_urls))
+                # every poll of the category writes in the same directory, its failed urls are added to the previous ones
+                num_error_urls = crawler.crawl_urls(articles_urls_fpath, "/".join([self.results_dpath, schedule.name]),
+                                                    append_failures=True)
+        except Exception as e:
+            self.logger.error(f"Polling {schedule.name} failed: {e!r}")
+            schedule.add_error(polled_at, e)
+            crawler.metrics.inc("daemon_polls_total", category=schedule.name, outcome="error")
+            return
+
+        schedule.add_poll(polled_at, len(new_urls), num_error_urls)
+        crawler.metrics.inc("daemon_polls_total", category=schedule.name, outcome="ok")
+        crawler.metrics.inc("daemon_new_articles_total", len(new_urls), category=schedule.name)
+        self.logger.info(f"Polled {schedule.name}: {len(new_urls)} new articles, next poll in {schedule.interval:.0f}s")
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.write_status()
+
+    def write_status(self):
+        status = {"pid": os.getpid(),
+                  "output_dpath": self.crawler.output_dpath,
+                  "state": self.state,
+                  "started_at": self.started_at,
+                  "updated_at": time.time(),
+                  "categories": {schedule.name: schedule.to_status() for schedule in self.schedules}}
+        # written aside then renamed, readers never see a partial file
+        tmp_fpath = self.status_fpath + ".tmp"
+        with open(tmp_fpath, "w", encoding="utf-8") as status_file:
+            json.dump(status, status_file, indent=2)
+        os.replace(tmp_fpath, self.status_fpath)
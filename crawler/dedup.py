@@ -0,0 +1,285 @@
+"""
+Near-duplicate articles: the same wire story published by several websites with small edits.
+Articles are fingerprinted from their word shingles with SimHash or MinHash, and looked up in a persistent
+LSH index (SQLite): only the articles sharing a band of their fingerprint are compared, not the whole index.
+"""
+import functools
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+import time
+
+DEDUP_POLICIES = ("tag", "link", "drop")
+DEDUP_FNAME = "dedup.sqlite3"
+WORD_PATTERN = re.compile(r"\w+")
+# articles with fewer shingles (captions of videos, photo galleries...) have no meaningful fingerprint
+MIN_SHINGLES = 5
+# bytes of the hash of a shingle
+HASH_SIZE = 8
+UINT64 = (1 << 64) - 1
+# odd 64 bits constants combining and mixing hashes of words
+MULTIPLIER = 0x9E3779B97F4A7C15
+MIXER = 0xBF58476D1CE4E5B9
+
+# BIT_TABLES[b] maps a byte to 1 if its bit b is set, 0 otherwise, for bytes.translate
+BIT_TABLES = [bytes((value >> b) & 1 for value in range(256)) for b in range(8)]
+
+
+def get_text(article) -> str:
+    return "\n".join((article.title, *article.description, *article.paragraphs))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def hash_word(word) -> int:
+    # Vietnamese words are made of a few thousand syllables, nearly all of them are hashed once
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=HASH_SIZE).digest(), "little")
+
+
+def hash_shingles(text, shingle_size) -> bytes:
+    """
+    Hashes of the distinct shingles (shingle_size consecutive words) of text, HASH_SIZE bytes each.
+    The hashes of the words of shingles are combined a whole list at a time, not shingle by shingle.
+    @return (bytes): concatenated hashes, empty if text has fewer than MIN_SHINGLES shingles
+    """
+    sequence = [hash_word(word) for word in WORD_PATTERN.findall(text.lower())]
+    hashes = sequence[:len(sequence) - shingle_size + 1]
+    for offset in range(1, shingle_size):
+        hashes = [(value * MULTIPLIER + word_hash) & UINT64 for value, word_hash in zip(hashes, sequence[offset:])]
+    hashes = set(hashes)
+    if len(hashes) < MIN_SHINGLES:
+        return b""
+    # the combination is linear, mixed so that every bit depends on every word of the shingle
+    hashes = [((value ^ (value >> 32)) * MIXER) & UINT64 for value in hashes]
+    return struct.pack(f"<{len(hashes)}Q", *[value ^ (value >> 29) for value in hashes])
+
+
+def to_key(value) -> int:
+    """ Band value as a signed 64 bits SQLite integer """
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class SimHash:
+    """
+    64 bits fingerprint, each bit set if most shingle hashes have it set: near-duplicates differ by a few bits.
+    The fingerprint is cut in max_distance + 1 bands, two fingerprints within max_distance bits share at least one.
+    """
+
+    def __init__(self, max_distance=3, shingle_size=3):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        num_bands = max_distance + 1
+        widths = [64 // num_bands + (band < 64 % num_bands) for band in range(num_bands)]
+        self.bands = [(sum(widths[:band]), (1 << width) - 1) for band, width in enumerate(widths)]
+
+    @property
+    def name(self) -> str:
+        return f"simhash/{self.max_distance}/{self.shingle_size}"
+
+    def fingerprint(self, text) -> bytes:
+        """ @return (bytes): None for a text too short """
+        hashes = hash_shingles(text, self.shingle_size)
+        if not hashes:
+            return None
+        # bits are counted a column of bytes at a time by bytes.translate, not hash by hash
+        num_hashes = len(hashes) // HASH_SIZE
+        fingerprint = 0
+        for byte_index in range(HASH_SIZE):
+            column = hashes[byte_index::HASH_SIZE]
+            for b in range(8):
+                if 2 * column.translate(BIT_TABLES[b]).count(1) > num_hashes:
+                    fingerprint |= 1 << (8 * byte_index + b)
+        return fingerprint.to_bytes(8, "little")
+
+    def band_keys(self, signature) -> list:
+        value = int.from_bytes(signature, "little")
+        return [to_key((value >> offset) & mask) for offset, mask in self.bands]
+
+    def is_near(self, signature, other) -> bool:
+        distance = (int.from_bytes(signature, "little") ^ int.from_bytes(other, "little")).bit_count()
+        return distance <= self.max_distance
+
+    def similarity(self, signature, other) -> float:
+        return 1 - (int.from_bytes(signature, "little") ^ int.from_bytes(other, "little")).bit_count() / 64
+
+
+class MinHash:
+    """
+    One permutation MinHash: each shingle hash goes to one of num_perm bins, which keep their minimum,
+    so a signature costs one hash per shingle instead of num_perm. Equal bins estimate the Jaccard similarity
+    of the shingles. Signatures are cut in bands of rows bins, chosen so that articles above threshold
+    likely share a band.
+    """
+
+    def __init__(self, threshold=0.6, shingle_size=3, num_perm=128):
+        """
+        @param threshold (float): Jaccard similarity of the shingles of near-duplicates
+        @param num_perm (int): number of bins, a power of 2
+        """
+        if num_perm & (num_perm - 1):
+            raise ValueError(f"num_perm must be a power of 2, got {num_perm}")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.shift = num_perm.bit_length() - 1
+        # the most rows per band whose S-curve (1 / bands) ** (1 / rows) stays below threshold
+        self.rows = max((rows for rows in range(1, num_perm + 1) if (1 / (num_perm // rows)) ** (1 / rows) <= threshold),
+                        default=1)
+        self.num_bands = num_perm // self.rows
+        self.format = f"<{num_perm}Q"
+
+    @property
+    def name(self) -> str:
+        return f"minhash/{self.threshold}/{self.shingle_size}/{self.num_perm}"
+
+    def fingerprint(self, text) -> bytes:
+        """ @return (bytes): None for a text too short """
+        hashes = hash_shingles(text, self.shingle_size)
+        if not hashes:
+            return None
+        mask = self.num_perm - 1
+        # in decreasing order, the last value written in a bin is its minimum
+        minimums = {value & mask: value >> self.shift
+                    for value in sorted(struct.unpack(f"<{len(hashes) // HASH_SIZE}Q", hashes), reverse=True)}
+        # empty bins borrow the next non empty one, rotated so that they don't all hold the same value:
+        # bins are walked backwards twice around, the last ones borrowing from the first ones
+        bins = [0] * self.num_perm
+        value = distance = 0
+        for b in range(2 * self.num_perm - 1, -1, -1):
+            if b & mask in minimums:
+                value, distance = minimums[b & mask], 0
+            else:
+                distance += 1
+            if b < self.num_perm:
+                bins[b] = (value + distance * MULTIPLIER) & UINT64
+        return struct.pack(self.format, *bins)
+
+    def band_keys(self, signature) -> list:
+        size = self.rows * 8
+        return [to_key(int.from_bytes(hashlib.blake2b(signature[band * size:(band + 1) * size], digest_size=8).digest(),
+                                      "little"))
+                for band in range(self.num_bands)]
+
+    def similarity(self, signature, other) -> float:
+        return sum(a == b for a, b in zip(struct.unpack(self.format, signature), struct.unpack(self.format, other))) \
+            / self.num_perm
+
+    def is_near(self, signature, other) -> bool:
+        return self.similarity(signature, other) >= self.threshold
+
+
+DEDUP_METHODS = ("none", "minhash", "simhash")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE NOT NULL,
+    signature BLOB NOT NULL,
+    duplicate_of TEXT,
+    similarity REAL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    key INTEGER NOT NULL,
+    article_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_key ON bands (band, key);
+"""
+
+
+class DedupIndex:
+    """
+    Persistent LSH index of the fingerprints of crawled articles, shared by the workers (and the websites
+    of a multi-site run) so that a story is kept once whichever website published it first.
+    Only the first copy of a story is indexed in the bands, every later copy is linked to it.
+    """
+
+    def __init__(self, db_fpath, fingerprint):
+        """
+        @param fingerprint (SimHash or MinHash): an index is only read with the fingerprint it was built with
+        """
+        self.db_fpath = db_fpath
+        self.fingerprint = fingerprint
+        self._connection = sqlite3.connect(db_fpath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        with self._connection:
+            self._connection.execute("INSERT OR IGNORE INTO settings (name, value) VALUES ('fingerprint', ?)",
+                                     (fingerprint.name,))
+        name = self._connection.execute("SELECT value FROM settings WHERE name = 'fingerprint'").fetchone()[0]
+        if name != fingerprint.name:
+            self._connection.close()
+            raise ValueError(f"{db_fpath} indexes {name} fingerprints, not {fingerprint.name}: "
+                             f"use the same dedup settings or another dedup_fpath")
+        self.num_checked = 0
+        self.num_duplicates = 0
+        self.num_skipped = 0
+
+    def find_original(self, url, text) -> str:
+        """
+        Index the article of url, unless it is a near-duplicate of an indexed one
+        @return (str): url of the first copy of the article, None if it is the first one (or too short to tell)
+        """
+        signature = self.fingerprint.fingerprint(text)
+        if signature is None:
+            self.num_skipped += 1
+            return None
+        keys = self.fingerprint.band_keys(signature)
+
+        with self._lock, self._connection:
+            self.num_checked += 1
+            row = self._connection.execute("SELECT duplicate_of FROM articles WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                # crawled again, it keeps its original
+                if row[0] is not None:
+                    self.num_duplicates += 1
+                return row[0]
+
+            candidates = set()
+            for band, key in enumerate(keys):
+                candidates.update(article_id for article_id, in self._connection.execute(
+                    "SELECT article_id FROM bands WHERE band = ? AND key = ?", (band, key)))
+            original, best = None, None
+            for article_id in candidates:
+                other_url, other = self._connection.execute("SELECT url, signature FROM articles WHERE id = ?",
+                                                            (article_id,)).fetchone()
+                if self.fingerprint.is_near(signature, other):
+                    similarity = self.fingerprint.similarity(signature, other)
+                    if best is None or similarity > best:
+                        original, best = other_url, similarity
+
+            article_id = self._connection.execute(
+                "INSERT INTO articles (url, signature, duplicate_of, similarity, added_at) VALUES (?, ?, ?, ?, ?)",
+                (url, signature, original, best, time.time())).lastrowid
+            if original is None:
+                self._connection.executemany("INSERT INTO bands (band, key, article_id) VALUES (?, ?, ?)",
+                                             [(band, key, article_id) for band, key in enumerate(keys)])
+            else:
+                self.num_duplicates += 1
+        return original
+
+    def duplicates(self) -> list:
+        """ (url, url of its first copy, similarity) of every near-duplicate indexed """
+        with self._lock:
+            return self._connection.execute("SELECT url, duplicate_of, similarity FROM articles "
+                                            "WHERE duplicate_of IS NOT NULL ORDER BY id").fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def report(self) -> str:
+        return (f"{self.num_duplicates} near-duplicates in {self.num_checked} articles "
+                f"({self.num_skipped} too short to fingerprint)")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
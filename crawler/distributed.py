@@ -0,0 +1,210 @@
+import concurrent.futures
+import os
+import socket
+import time
+
+from tqdm import tqdm
+
+from utils import init_output_dirs, create_dir, read_file, write_lines
+from .work_queue import QueueServer, QUEUED, LEASED, DONE, FAILED
+from .failures import Failure, DeadLetterFile, DEAD_LETTER_FNAME
+
+# urls of a urls file enqueued per transaction
+PUT_BATCH_SIZE = 1000
+
+
+class Coordinator:
+    """
+    Find the urls of the crawler task and enqueue them in the work queue, for workers of any host to crawl.
+    Each category (or search query) is enqueued as soon as its listing pages are fetched, so workers start early.
+    """
+
+    def __init__(self, crawler, queue):
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.queue = queue
+
+    def enqueue(self) -> int:
+        """
+        Enqueue every url of the task then seal the queue
+        @return (int): number of enqueued urls
+        """
+        crawler = self.crawler
+        urls_dpath, _ = init_output_dirs(crawler.output_dpath)
+        num_urls = 0
+        match crawler.task:
+            case "url":
+                batch = list()
+                frontier = crawler.create_frontier()
+                for url in read_file(crawler.urls_fpath):
+                    # canonical urls, variants of the same url are enqueued once
+                    batch += frontier.add([url]) if url else []
+                    if len(batch) >= PUT_BATCH_SIZE:
+                        num_urls += self.queue.put(batch)
+                        batch = list()
+                num_urls += self.queue.put(batch)
+                frontier.close()
+            case "type":
+                article_types = list(crawler.article_type_dict.values()) if crawler.article_type == "all" \
+                    else [crawler.article_type]
+                for article_type in article_types:
+                    self.logger.info(f"Getting urls of {article_type}...")
+                    urls_fpath = self.save_urls(urls_dpath, article_type, crawler.get_urls_of_type(article_type))
+                    num_urls += self.put_urls(urls_fpath, article_type)
+            case "search":
+                self.logger.info(f"Getting urls of query '{crawler.search_query}'...")
+                urls_fpath = self.save_urls(urls_dpath, crawler.search_query,
+                                            crawler.get_urls_of_search(crawler.search_query))
+                num_urls += self.put_urls(urls_fpath, crawler.search_query)
+            case task:
+                raise ValueError(f"Task {task} can't be distributed")
+        self.queue.seal()
+        return num_urls
+
+    @staticmethod
+    def save_urls(urls_dpath, name, articles_urls) -> str:
+        """ @return (str): urls file of name """
+        urls_fpath = "/".join([urls_dpath, f"{name}.txt"])
+        write_lines(urls_fpath, articles_urls)
+        return urls_fpath
+
+    def put_urls(self, urls_fpath, subdir="") -> int:
+        """ Enqueue the urls of urls_fpath PUT_BATCH_SIZE at a time """
+        num_urls = 0
+        batch = list()
+        for url in read_file(urls_fpath):
+            if url:
+                batch.append(url)
+            if len(batch) >= PUT_BATCH_SIZE:
+                num_urls += self.queue.put(batch, subdir)
+                batch = list()
+        return num_urls + self.queue.put(batch, subdir)
+
+    def run(self) -> int:
+        """
+        Enqueue the urls, then wait until workers crawled all of them if coordinator_wait
+        (always when the queue is served on queue_port, remote workers need the coordinator)
+        @return (int): number of urls which failed max_attempts times
+        """
+        server = None
+        if self.crawler.queue_port:
+            server = QueueServer(self.queue, self.crawler.queue_host, self.crawler.queue_port).start()
+            self.logger.info(f"Serving the work queue on {self.crawler.queue_host}:{self.crawler.queue_port}")
+        try:
+            num_urls = self.enqueue()
+            self.logger.info(f"Enqueued {num_urls} urls")
+            if not self.crawler.coordinator_wait and server is None:
+                return 0
+            return self.wait()
+        finally:
+            if server is not None:
+                server.stop()
+
+    def wait(self) -> int:
+        self.logger.info("Waiting for workers...")
+        stats = self.queue.stats()
+        with tqdm(total=sum(stats[status] for status in (QUEUED, LEASED, DONE, FAILED)), desc="URLs") as progress_bar:
+            while True:
+                stats = self.queue.stats()
+                progress_bar.n = stats[DONE] + stats[FAILED]
+                progress_bar.set_postfix(leased=stats[LEASED], failed=stats[FAILED])
+                if not stats[QUEUED] and not stats[LEASED]:
+                    break
+                time.sleep(self.crawler.poll_seconds)
+
+        failed_urls = self.queue.failed_urls()
+        with DeadLetterFile("/".join([self.crawler.output_dpath, DEAD_LETTER_FNAME])) as dead_letters:
+            for failed_url in failed_urls:
+                output_dpath = "/".join(filter(None, [self.crawler.output_dpath, failed_url["subdir"]]))
+                dead_letters.write(Failure.from_description(failed_url["url"], failed_url["error"]),
+                                   self.crawler.get_output_fpath(output_dpath, failed_url["index"]),
+                                   failed_url["attempts"])
+        self.logger.info(f"Workers crawled {stats[DONE]} urls")
+        return len(failed_urls)
+
+
+class Worker:
+    """
+    Lease batches of urls from the work queue, crawl them with num_workers threads (whatever the engine) and
+    acknowledge the results, until the coordinator sealed the queue and every url is crawled (or failed max_attempts
+    times).
+    Leases of the urls not crawled yet are renewed every third of lease_seconds, so slow urls (throttled host,
+    retries) aren't given to another worker while this one is still on them.
+    Articles are written in <output_dpath>/<category>/url_<index>.txt like a local crawl.
+    """
+
+    def __init__(self, crawler, queue):
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.queue = queue
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.created_dpaths = set()
+
+    def crawl_task(self, task) -> dict:
+        """ Crawl the url of a leased task, returns its result for WorkQueue.complete """
+        output_dpath = self.crawler.output_dpath
+        if task["subdir"]:
+            output_dpath = "/".join([output_dpath, task["subdir"]])
+        if output_dpath not in self.created_dpaths:
+            create_dir(output_dpath)
+            self.created_dpaths.add(output_dpath)
+        failure = self.crawler.crawl_url(task["url"], self.crawler.get_output_fpath(output_dpath, task["index"]))
+        if failure is None:
+            return {"id": task["id"], "error": None}
+        # permanent failures aren't leased again
+        return {"id": task["id"], "error": failure.describe(), "permanent": not failure.is_transient}
+
+    def run(self) -> int:
+        """
+        @return (int): number of urls this worker failed to crawl on their last attempt
+        """
+        crawler = self.crawler
+        pending = dict()
+        crawler.queues["leased"] = lambda: len(pending)
+        num_urls = 0
+        num_error_urls = 0
+        renewed_at = time.monotonic()
+        if crawler.engine == "async":
+            self.logger.warning("engine: async isn't supported by distributed workers, crawling with "
+                                f"{crawler.num_workers} threads (num_workers)")
+        self.logger.info(f"Worker {self.worker_id} started")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=crawler.num_workers) as executor, \
+             tqdm(desc="URLs") as progress_bar:
+            while True:
+                # lease the next batch while the threads still have urls to crawl
+                if len(pending) <= crawler.num_workers:
+                    for task in self.queue.lease(self.worker_id, crawler.lease_batch, crawler.lease_seconds):
+                        pending[executor.submit(self.crawl_task, task)] = task
+                    if not pending:
+                        if self.queue.is_finished():
+                            break
+                        time.sleep(crawler.poll_seconds)
+                        continue
+
+                done, _ = concurrent.futures.wait(pending, timeout=crawler.poll_seconds,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                results = list()
+                for future in done:
+                    task = pending.pop(future)
+                    result = future.result()
+                    results.append(result)
+                    num_urls += 1
+                    if result["error"] is not None and (task["attempts"] >= crawler.max_attempts or result["permanent"]):
+                        num_error_urls += 1
+                        crawler.on_failed_url(task["url"], Failure.from_description(task["url"], result["error"]))
+                if results:
+                    self.queue.complete(self.worker_id, results)
+                    progress_bar.update(len(results))
+
+                if pending and time.monotonic() - renewed_at >= crawler.lease_seconds / 3:
+                    task_ids = [task["id"] for task in pending.values()]
+                    renewed = self.queue.renew(self.worker_id, task_ids, crawler.lease_seconds)
+                    if len(renewed) < len(task_ids):
+                        self.logger.warning(f"{len(task_ids) - len(renewed)} leases expired before being renewed, "
+                                            f"their urls may be crawled by another worker too")
+                    renewed_at = time.monotonic()
+
+        crawler.queues.pop("leased", None)
+        self.logger.info(f"Worker {self.worker_id} crawled {num_urls} urls")
+        return num_error_urls
@@ -0,0 +1,340 @@
+"""
+Declarative extraction of page fields with CSS selectors.
+An ExtractionSpec is compiled once, then every field of a page is collected in a single pass of the HTML parser,
+from its start/end/data events: no tree is built and the page isn't scanned again for each field.
+"""
+import re
+from html.parser import HTMLParser
+
+from lxml import etree
+
+# elements without end tag, html.parser doesn't close them
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                       "param", "source", "track", "wbr"))
+# elements closing an open <p>, html.parser doesn't close it
+CLOSES_P = frozenset(("address", "article", "aside", "blockquote", "div", "dl", "fieldset", "figure", "footer", "form",
+                      "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre", "section",
+                      "table", "ul"))
+# their text isn't part of the text of an element, like Tag.text of BeautifulSoup
+IGNORED_TAGS = frozenset(("script", "style", "template"))
+EMPTY = frozenset()
+# container of a first_container rule once it is closed
+CLOSED = -1
+
+SIMPLE_SELECTOR = re.compile(r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)?
+    (?P<rest>(?:\.[\w-]+|\#[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|'[^']*'|[^\]]*))?\])*)$
+""", re.VERBOSE)
+SELECTOR_PART = re.compile(r"""\.(?P<cls>[\w-]+)|\#(?P<id>[\w-]+)|\[(?P<attr>[\w-]+)(?:=(?P<value>"[^"]*"|'[^']*'|[^\]]*))?\]""")
+
+
+class SimpleSelector:
+    """ tag, .class, #id, [attr] and [attr=value] conditions on a single element """
+    __slots__ = ("tag", "classes", "attrs")
+
+    def __init__(self, text):
+        match = SIMPLE_SELECTOR.match(text)
+        if match is None or not text:
+            raise ValueError(f"Unsupported selector {text!r}")
+        tag = match.group("tag")
+        self.tag = None if tag in (None, "*") else tag.lower()
+        classes = set()
+        self.attrs = list()
+        for part in SELECTOR_PART.finditer(match.group("rest")):
+            if part.group("cls"):
+                classes.add(part.group("cls"))
+            elif part.group("id"):
+                self.attrs.append(("id", part.group("id")))
+            else:
+                value = part.group("value")
+                self.attrs.append((part.group("attr"), value.strip("\"'") if value is not None else None))
+        self.classes = frozenset(classes)
+
+    def matches(self, tag, classes, attrib) -> bool:
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.classes and not self.classes <= classes:
+            return False
+        for name, value in self.attrs:
+            if name not in attrib or (value is not None and attrib[name] != value):
+                return False
+        return True
+
+    def index_key(self):
+        """ Key of the elements which can match, to only try the rules which can match an element """
+        if self.tag is not None:
+            return self.tag
+        if self.classes:
+            return "." + min(self.classes)
+        return "*"
+
+
+class Selector:
+    """ Descendant selector ("div.content p"), matched right to left on the open elements """
+    __slots__ = ("steps",)
+
+    def __init__(self, text):
+        self.steps = [SimpleSelector(step) for step in text.split()]
+        if not self.steps:
+            raise ValueError("Empty selector")
+
+    def matches(self, stack) -> bool:
+        return self.match(stack) >= 0
+
+    def match(self, stack) -> int:
+        """
+        @param stack (list): (tag, classes, attrib) of the open elements, the element to match last
+        @return (int): index in stack of the element matched by the first step, -1 if the element doesn't match
+        """
+        *ancestors, last = self.steps
+        if not last.matches(*stack[-1]):
+            return -1
+        i = len(stack) - 1
+        for step in reversed(ancestors):
+            i -= 1
+            while i >= 0 and not step.matches(*stack[i]):
+                i -= 1
+            if i < 0:
+                return -1
+        return i
+
+
+class FieldRule:
+    """
+    How a field is extracted from the elements matching select (comma separated selectors):
+    its text (default), the text of each of its children (children: true) or an attribute (attr: name, or the first
+    present of comma separated names like "data-src, src" for lazy loaded images),
+    of the first matching element or of all of them (many: true), or of the first one inside each element matched
+    by the first step of the selector (first: true, like the first link of each title with ".title a").
+    With first_container: true, elements are only matched inside the first element matched by the first step
+    of any of the selectors, like the paragraphs of the first of two alternative content containers.
+    A page without any element matching a required field isn't extracted at all.
+    """
+
+    def __init__(self, name, select, many=False, first=False, first_container=False, children=False, attr=None,
+                 required=False):
+        self.name = name
+        self.selectors = [Selector(text.strip()) for text in select.split(",")]
+        self.many = many
+        self.first = first
+        self.first_container = first_container
+        self.children = children
+        self.attr = attr
+        self.attr_names = [name.strip() for name in attr.split(",")] if attr is not None else []
+        self.required = required
+
+    def matches(self, stack) -> bool:
+        return any(selector.matches(stack) for selector in self.selectors)
+
+    def is_container(self, tag, classes, attrib) -> bool:
+        """ Whether an element is matched by the first step of one of the selectors """
+        return any(selector.steps[0].matches(tag, classes, attrib) for selector in self.selectors)
+
+    def match(self, stack) -> int:
+        """ Index in stack of the element matched by the first step of the first matching selector, -1 if none """
+        for selector in self.selectors:
+            i = selector.match(stack)
+            if i >= 0:
+                return i
+        return -1
+
+
+class ExtractionSpec:
+    """ Fields of a page, compiled from {name: rule} where rule is the keyword arguments of FieldRule """
+
+    def __init__(self, fields, encoding="utf-8"):
+        self.rules = [FieldRule(name, **rule) for name, rule in fields.items()]
+        self.encoding = encoding
+        self.rules_by_key = dict()
+        # (tag, classes) -> rules which can match such elements
+        self._candidates = dict()
+        for rule in self.rules:
+            for key in {selector.steps[-1].index_key() for selector in rule.selectors}:
+                self.rules_by_key.setdefault(key, list()).append(rule)
+
+    def candidate_rules(self, tag, classes) -> list:
+        key = (tag, classes)
+        rules = self._candidates.get(key)
+        if rules is None:
+            rules = self.rules_by_key.get(tag, []) + self.rules_by_key.get("*", [])
+            for cls in classes:
+                rules += self.rules_by_key.get("." + cls, [])
+            # a rule is indexed by each of its selectors
+            rules = self._candidates[key] = list(dict.fromkeys(rules))
+        return rules
+
+    def extract(self, content, parser="lxml") -> dict:
+        """
+        Extract every field of a page in one pass
+        @param content (bytes): page content
+        @param parser (str): "lxml" (libxml2) or "html.parser" (standard library)
+        @return (dict): field name -> str (or None), list with many / children, None if a required field is missing
+        """
+        collector = FieldCollector(self)
+        if parser == "lxml":
+            html_parser = etree.HTMLParser(target=collector, encoding=self.encoding)
+            html_parser.feed(content)
+            html_parser.close()
+        else:
+            html_parser = TargetHTMLParser(collector)
+            html_parser.feed(content.decode(self.encoding, errors="replace") if isinstance(content, bytes) else content)
+            html_parser.close()
+        return collector.result()
+
+
+class _Capture:
+    """ Text being collected for a field from an open element """
+    __slots__ = ("rule", "depth", "parts", "is_text_last")
+
+    def __init__(self, rule, depth):
+        self.rule = rule
+        self.depth = depth
+        self.parts = list()
+        # children: True when the last item is a text node of the element, merged with the next text
+        self.is_text_last = False
+
+
+class FieldCollector:
+    """ Parser target (start/end/data events) collecting the fields of an ExtractionSpec """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.stack = list()
+        self.captures = list()
+        self.values = {rule.name: list() if rule.many else None for rule in spec.rules}
+        # depth of the open script / style element, its text is skipped
+        self.ignored_depth = None
+        # first rule -> indexes in stack of the open elements which already gave their first match
+        self.scopes = {rule.name: set() for rule in spec.rules if rule.first}
+        # first_container rule -> index in stack of its open container, None before it, CLOSED after it
+        self.container_rules = [rule for rule in spec.rules if rule.first_container]
+        self.containers = {rule.name: None for rule in self.container_rules}
+
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        classes = frozenset(attrib["class"].split()) if "class" in attrib else EMPTY
+        self.stack.append((tag, classes, attrib))
+        depth = len(self.stack)
+        if self.ignored_depth is None and tag in IGNORED_TAGS:
+            self.ignored_depth = depth
+
+        for capture in self.captures:
+            if capture.rule.children and depth == capture.depth + 1:
+                capture.parts.append("")
+                capture.is_text_last = False
+
+        for rule in self.container_rules:
+            if self.containers[rule.name] is None and rule.is_container(tag, classes, attrib):
+                self.containers[rule.name] = depth - 1
+
+        rules = self.spec.candidate_rules(tag, classes)
+        if not rules:
+            return
+        for rule in rules:
+            if not rule.many and self.values[rule.name] is not None:
+                continue
+            if rule.first_container and self.containers[rule.name] in (None, CLOSED):
+                continue
+            if rule.first:
+                scope = rule.match(self.stack)
+                if scope < 0 or scope in self.scopes[rule.name]:
+                    continue
+                self.scopes[rule.name].add(scope)
+            elif not rule.matches(self.stack):
+                continue
+            if rule.attr is not None:
+                for name in rule.attr_names:
+                    if name in attrib:
+                        self.add_value(rule, attrib[name])
+                        break
+            elif not any(capture.rule is rule for capture in self.captures):
+                self.captures.append(_Capture(rule, depth))
+
+    def end(self, tag):
+        depth = len(self.stack)
+        if not depth:
+            return
+        if self.ignored_depth == depth:
+            self.ignored_depth = None
+        if self.captures and self.captures[-1].depth == depth:
+            for capture in [capture for capture in self.captures if capture.depth == depth]:
+                self.captures.remove(capture)
+                self.add_value(capture.rule, capture.parts if capture.rule.children else "".join(capture.parts))
+        for scopes in self.scopes.values():
+            scopes.discard(depth - 1)
+        for name, container in self.containers.items():
+            if container == depth - 1:
+                self.containers[name] = CLOSED
+        self.stack.pop()
+
+    def data(self, text):
+        if self.ignored_depth is not None:
+            return
+        depth = len(self.stack)
+        for capture in self.captures:
+            if not capture.rule.children:
+                capture.parts.append(text)
+            elif depth == capture.depth:
+                if capture.is_text_last:
+                    capture.parts[-1] += text
+                else:
+                    capture.parts.append(text)
+                    capture.is_text_last = True
+            else:
+                capture.parts[-1] += text
+
+    def add_value(self, rule, value):
+        if rule.many:
+            self.values[rule.name].append(value)
+        elif self.values[rule.name] is None:
+            self.values[rule.name] = value
+
+    def close(self):
+        # elements left open at the end of a (truncated) page
+        while self.stack:
+            self.end(self.stack[-1][0])
+
+    def result(self) -> dict:
+        for rule in self.spec.rules:
+            # a matched element with an empty text is there
+            if rule.required and (not self.values[rule.name] if rule.many else self.values[rule.name] is None):
+                return None
+        return self.values
+
+
+class TargetHTMLParser(HTMLParser):
+    """ html.parser sending the events of lxml parser targets, with the end tags html.parser doesn't send """
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        if tag in CLOSES_P:
+            self.handle_endtag("p")
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+        if tag in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in CLOSES_P:
+            self.handle_endtag("p")
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        tags = [element[0] for element in self.target.stack]
+        if tag not in tags:
+            return
+        # close the elements left open inside tag too, like <p> without </p>
+        for _ in range(tags[::-1].index(tag) + 1):
+            self.target.end(self.target.stack[-1][0])
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def close(self):
+        super().close()
+        self.target.close()
@@ -1,11 +1,20 @@
+import re
+
 from .dantri import DanTriCrawler
 from .vietnamnet import VietNamNetCrawler
 from .vnexpress import VNExpressCrawler
+from .spec_crawler import SpecCrawler, SITES
 
 WEBNAMES = {"vnexpress": VNExpressCrawler,
             "dantri": DanTriCrawler,
             "vietnamnet": VietNamNetCrawler}
 
+# other websites of sites.yml only need a spec, their classes are module attributes so parse pools can pickle them
+for site in SITES:
+    if site not in WEBNAMES:
+        class_name = "".join(part.capitalize() for part in re.split(r"[^a-zA-Z0-9]+", site)) + "Crawler"
+        globals()[class_name] = WEBNAMES[site] = type(class_name, (SpecCrawler,), {"site": site, "__module__": __name__})
+
 def get_crawler(webname, **kwargs):
     crawler = WEBNAMES[webname](**kwargs)
     return crawler
@@ -0,0 +1,219 @@
+"""
+Classification of the failures of article urls: transient ones (network errors, timeouts, rate limiting and server
+errors) are crawled again later in the same run, the others are written with their cause in a dead-letter file,
+failed_urls.jsonl, which task "retry-failed" crawls again.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+import requests
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+from .cache import CacheMiss
+
+# kinds of failures
+NETWORK = "network"
+TIMEOUT = "timeout"
+HTTP = "http"
+PARSE = "parse"
+CACHE = "cache"
+# the article was crawled but the sink couldn't write it
+WRITE = "write"
+
+# statuses worth trying again later: request timeout, too early, rate limiting and server errors
+TRANSIENT_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+DEAD_LETTER_FNAME = "failed_urls.jsonl"
+NOT_AN_ARTICLE = "not an article"
+# seconds a worker waits for a retry to be due or for the urls in flight to be done
+POLL_SECONDS = 0.1
+
+
+class HttpStatusError(OSError):
+    """ Error status of the response of an url, after the retries of the HTTP transport """
+
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class Failure:
+    """ Why an url couldn't be crawled """
+    __slots__ = ("url", "kind", "error", "status")
+
+    def __init__(self, url, kind, error, status=None):
+        self.url = url
+        self.kind = kind
+        self.error = error
+        self.status = status
+
+    @property
+    def is_transient(self) -> bool:
+        if self.kind == HTTP:
+            return self.status in TRANSIENT_STATUSES
+        return self.kind in (NETWORK, TIMEOUT)
+
+    def describe(self) -> str:
+        """ "<kind>[ <status>]: <error>", see from_description """
+        kind = self.kind if self.status is None else f"{self.kind} {self.status}"
+        return f"{kind}: {self.error}"
+
+    @classmethod
+    def from_description(cls, url, description):
+        kind, __, error = (description or "").partition(": ")
+        kind, __, status = kind.partition(" ")
+        return cls(url, kind or PARSE, error, int(status) if status.isdigit() else None)
+
+    def to_record(self, output_fpath, attempts) -> dict:
+        """ Line of the dead-letter file """
+        return {"url": self.url,
+                "kind": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "transient": self.is_transient,
+                "attempts": attempts,
+                "output_fpath": output_fpath,
+                "failed_at": time.time()}
+
+
+def classify(url, exception) -> Failure:
+    """ Failure of url raised by exception while downloading or parsing it """
+    if isinstance(exception, HttpStatusError):
+        return Failure(url, HTTP, str(exception), exception.status)
+    if isinstance(exception, CacheMiss):
+        return Failure(url, CACHE, "not in the response cache")
+    if is_timeout(exception):
+        return Failure(url, TIMEOUT, repr(exception))
+    if isinstance(exception, (requests.RequestException, OSError)):
+        return Failure(url, NETWORK, repr(exception))
+    # the page was downloaded but its markup isn't the expected one
+    return Failure(url, PARSE, repr(exception))
+
+
+def is_timeout(exception) -> bool:
+    if isinstance(exception, (requests.Timeout, TimeoutError)):
+        return True
+    # requests raises ConnectionError for read timeouts of streamed bodies
+    reason = exception.args[0] if exception.args else None
+    return isinstance(reason, Urllib3TimeoutError)
+
+
+def get_retry_delay(attempt, backoff, max_delay) -> float:
+    """ Seconds before crawling again an url which failed attempt times """
+    return min(backoff * 2 ** (attempt - 1), max_delay)
+
+
+class RetryQueue:
+    """
+    Urls of a crawl: new (output_fpath, url) pairs, pulled lazily, and urls which failed with a transient error,
+    crawled again after an exponential backoff (backoff * 2 ** (attempt - 1) seconds, at most max_delay) until they
+    failed max_attempts times. Items are (output_fpath, url, attempt).
+    """
+
+    def __init__(self, urls, max_attempts, backoff, max_delay):
+        self._urls = iter(urls)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        # (due_at, counter, item)
+        self._delayed = list()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._is_exhausted = False
+        self.num_in_flight = 0
+        self.num_retries = 0
+
+    def get(self) -> tuple:
+        """
+        @return (tuple): next item to crawl, None if there is none right now
+        @return (float): when there is no item, seconds to wait before asking again, None once every url is crawled
+        """
+        with self._lock:
+            if self._delayed and self._delayed[0][0] <= time.monotonic():
+                item = heapq.heappop(self._delayed)[2]
+            elif not self._is_exhausted:
+                item = next(self._urls, None)
+                if item is None:
+                    self._is_exhausted = True
+                    return self._get_delay()
+                item = (*item, 1)
+            else:
+                return self._get_delay()
+            self.num_in_flight += 1
+            return item, None
+
+    def _get_delay(self):
+        if self._delayed:
+            return None, max(0.0, min(self._delayed[0][0] - time.monotonic(), POLL_SECONDS))
+        if self.num_in_flight:
+            # urls in flight may fail and be retried
+            return None, POLL_SECONDS
+        return None, None
+
+    def done(self, item, failure) -> bool:
+        """
+        Record the result of an item
+        @param failure (Failure): None if its url was crawled
+        @return (bool): True if its url will be crawled again
+        """
+        output_fpath, url, attempt = item
+        with self._lock:
+            self.num_in_flight -= 1
+            if failure is None or not failure.is_transient or attempt >= self.max_attempts:
+                return False
+            due_at = time.monotonic() + get_retry_delay(attempt, self.backoff, self.max_delay)
+            heapq.heappush(self._delayed, (due_at, next(self._counter), (output_fpath, url, attempt + 1)))
+            self.num_retries += 1
+            return True
+
+    def depth(self) -> int:
+        return len(self._delayed)
+
+
+class DeadLetterFile:
+    """ JSON lines of the urls which couldn't be crawled, with the cause of their last failure """
+
+    def __init__(self, fpath, append=False):
+        """
+        @param append (bool): keep the failures already in fpath, for crawls writing in the same directory repeatedly
+        """
+        self.fpath = fpath
+        self._file = open(fpath, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.num_failures = 0
+
+    def write(self, failure, output_fpath, attempts):
+        line = json.dumps(failure.to_record(output_fpath, attempts), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            # readable while the crawl goes on
+            self._file.flush()
+            self.num_failures += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_dead_letters(fpath) -> list:
+    """ Records of a dead-letter file """
+    with open(fpath, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def find_dead_letter_files(dpath) -> list:
+    """ Dead-letter files of the crawls written in dpath and its subdirectories """
+    fpaths = list()
+    for root, __, fnames in os.walk(dpath):
+        if DEAD_LETTER_FNAME in fnames:
+            fpaths.append("/".join([root, DEAD_LETTER_FNAME]))
+    return sorted(fpaths)
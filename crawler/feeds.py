@@ -0,0 +1,258 @@
+"""
+Discovery of article urls from RSS / Atom feeds and XML sitemaps, a cheap alternative to listing pages:
+feeds are a fraction of the size of HTML listing pages and give the publish date of every article.
+Feeds are parsed while they are downloaded, and each entry is freed as soon as it is read,
+so a sitemap index of millions of urls is never loaded in memory.
+"""
+import collections
+import concurrent.futures
+import threading
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+from lxml import etree
+
+from . import cache
+from .pagination import parse_date
+from .session import get_reported_status, get_received_bytes
+
+# kinds of feed entries
+ARTICLE = "article"
+SITEMAP = "sitemap"
+
+DISCOVERY_SOURCES = ("listing", "rss", "sitemap")
+# RSS item, Atom entry, sitemap url and sitemap index entry, in any namespace
+ENTRY_TAGS = ("{*}item", "{*}entry", "{*}url", "{*}sitemap")
+CHUNK_SIZE = 64 * 1024
+# urls of a feed added to the frontier at once
+FRONTIER_BATCH_SIZE = 1000
+
+
+def local_name(element) -> str:
+    return etree.QName(element).localname
+
+
+def get_text(element) -> str:
+    return element.text.strip() if element is not None and element.text else None
+
+
+def read_entry(element) -> tuple:
+    """
+    @param element: RSS <item>, Atom <entry>, sitemap <url> or sitemap index <sitemap>
+    @return (tuple): (kind, url, date), date is None when the entry has none, None if the entry has no url
+    """
+    children = dict()
+    for child in element:
+        # skip comments and processing instructions
+        if isinstance(child.tag, str):
+            children.setdefault(local_name(child), child)
+
+    match local_name(element):
+        case "item":
+            url = get_text(children.get("link")) or get_text(children.get("guid"))
+            date = get_text(children.get("pubDate")) or get_text(children.get("date"))
+        case "entry":
+            links = [child for child in element if isinstance(child.tag, str) and local_name(child) == "link"
+                     and child.get("rel", "alternate") == "alternate"]
+            url = links[0].get("href") if links else None
+            date = get_text(children.get("published")) or get_text(children.get("updated"))
+        case "url":
+            url = get_text(children.get("loc"))
+            # Google News sitemaps have the publish date, lastmod is the last modification
+            publication_date = next(element.iterfind(".//{*}publication_date"), None)
+            date = get_text(publication_date) or get_text(children.get("lastmod"))
+        case _:
+            url = get_text(children.get("loc"))
+            date = get_text(children.get("lastmod"))
+
+    if not url:
+        return None
+    return (SITEMAP if local_name(element) == "sitemap" else ARTICLE), url, parse_date(date) if date else None
+
+
+class FeedParser:
+    """
+    Incremental parser of RSS 2.0, Atom, sitemap and sitemap index documents, fed with chunks of bytes
+    gzip compressed sitemaps (sitemap.xml.gz) are decompressed on the fly
+    """
+
+    def __init__(self, is_gzip=False):
+        self._parser = etree.XMLPullParser(events=("end",), tag=ENTRY_TAGS,
+                                           resolve_entities=False, no_network=True, huge_tree=True)
+        self._decompressor = zlib.decompressobj(wbits=31) if is_gzip else None
+
+    def feed(self, chunk) -> list:
+        """
+        @param chunk (bytes): next bytes of the document
+        @return (list): (kind, url, date) of the entries ended in chunk
+        """
+        if self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk)
+        self._parser.feed(chunk)
+        return self.read_entries()
+
+    def close(self) -> list:
+        if self._decompressor is not None:
+            self._parser.feed(self._decompressor.flush())
+        self._parser.close()
+        return self.read_entries()
+
+    def read_entries(self) -> list:
+        entries = list()
+        for __, element in self._parser.read_events():
+            entry = read_entry(element)
+            if entry is not None:
+                entries.append(entry)
+            # free the entry, and the references of its parent to the previous entries
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        return entries
+
+
+class FeedDiscovery:
+    """
+    Urls of the articles of a category from its RSS feed or from the sitemaps of the website,
+    filtered by category (crawler.is_url_of_type) and published after date_cutoff.
+    Sitemap indexes are followed, skipping the sitemaps last modified before date_cutoff.
+    """
+
+    def __init__(self, crawler, date_cutoff=None):
+        self.crawler = crawler
+        self.date_cutoff = date_cutoff
+        self.logger = crawler.logger
+        self.num_feeds = 0
+        self.num_entries = 0
+        self.num_old = 0
+        self._lock = threading.Lock()
+
+    def get_urls(self, source, article_type):
+        """
+        @param source (str): "rss" or "sitemap"
+        @param article_type (str): category of the articles
+        @return (generator): canonical urls of articles in the order of the feeds (or newest first), without
+                             duplicates, read from the frontier database once every feed is read
+        """
+        if source == "rss":
+            feed_urls = [self.crawler.get_rss_url(article_type)]
+        else:
+            feed_urls = self.crawler.get_sitemap_urls(article_type)
+
+        frontier = self.crawler.create_frontier()
+        try:
+            self.read_feeds(feed_urls, article_type, frontier)
+        except BaseException:
+            frontier.close()
+            raise
+        self.logger.info(self.report(article_type, len(frontier)) + f", {frontier.report()}")
+        return self.iter_frontier(frontier)
+
+    @staticmethod
+    def iter_frontier(frontier):
+        try:
+            yield from frontier.iter_urls()
+        finally:
+            frontier.close()
+
+    def read_feeds(self, feed_urls, article_type, frontier):
+        """
+        Read feed_urls and the sitemaps they list, num_workers feeds at a time,
+        each one adding its articles to frontier while it is read
+        """
+        num_workers = self.crawler.num_workers
+        feed_urls = collections.deque(feed_urls)
+        visited = set()
+        running = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            while feed_urls or running:
+                while feed_urls and len(running) < num_workers:
+                    feed_url = feed_urls.popleft()
+                    if feed_url not in visited:
+                        visited.add(feed_url)
+                        running.add(executor.submit(self.read_feed, feed_url, article_type, frontier))
+                done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    feed_urls.extend(future.result())
+
+    def read_feed(self, feed_url, article_type, frontier) -> list:
+        """
+        Add the urls of articles of article_type published after date_cutoff to frontier, FRONTIER_BATCH_SIZE at a time
+        @return (list): sitemaps listed by the feed, last modified after date_cutoff
+        """
+        sitemaps = list()
+        articles_urls = list()
+        dates = list()
+        num_entries = num_old = 0
+        for kind, url, date in self.iter_entries(feed_url):
+            num_entries += 1
+            if self.date_cutoff is not None and date is not None and date < self.date_cutoff:
+                num_old += 1
+                continue
+            url = urljoin(feed_url, url)
+            if kind == SITEMAP:
+                sitemaps.append(url)
+            elif self.crawler.is_url_of_type(url, article_type):
+                articles_urls.append(url)
+                dates.append(date)
+                if len(articles_urls) >= FRONTIER_BATCH_SIZE:
+                    frontier.add(articles_urls, dates)
+                    articles_urls = list()
+                    dates = list()
+        frontier.add(articles_urls, dates)
+
+        with self._lock:
+            self.num_feeds += 1
+            self.num_entries += num_entries
+            self.num_old += num_old
+        return sitemaps
+
+    def iter_entries(self, feed_url):
+        """
+        Stream the entries of a feed, failed feeds are logged and skipped
+        With the response cache, feeds are read from it like listing pages (offline crawls need them)
+        @return (generator): (kind, url, date) of the entries
+        """
+        parser = FeedParser(is_gzip=urlsplit(feed_url).path.endswith(".gz"))
+        try:
+            if self.crawler.cache is not None:
+                yield from parser.feed(self.crawler.fetch(feed_url, kind=cache.LISTING))
+            else:
+                yield from self.stream_feed(feed_url, parser)
+            yield from parser.close()
+        except (OSError, etree.XMLSyntaxError, zlib.error, cache.CacheMiss) as e:
+            self.logger.error(f"Failed to read feed {feed_url}: {e!r}")
+
+    def stream_feed(self, feed_url, parser):
+        crawler = self.crawler
+        with crawler.throttle.request(feed_url) as slot:
+            crawler.metrics.observe("throttle", slot.waited)
+            started_at = time.perf_counter()
+            response = crawler.http.get(feed_url, stream=True)
+            slot.set_response(get_reported_status(response), response.headers)
+            try:
+                if response.status_code != 200:
+                    raise OSError(f"HTTP {response.status_code}")
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    yield from parser.feed(chunk)
+            finally:
+                response.close()
+            crawler.metrics.observe("fetch", time.perf_counter() - started_at)
+        crawler.metrics.record_response(urlsplit(feed_url).netloc, response.status_code,
+                                        get_received_bytes(response))
+
+    def report(self, article_type, num_urls) -> str:
+        report = f"{num_urls} urls of {article_type} found in {self.num_feeds} feeds ({self.num_entries} entries"
+        if self.date_cutoff is not None:
+            report += f", {self.num_old} published before {self.date_cutoff:%Y-%m-%d %H:%M}"
+        return report + ")"
+
+
+def parse_robots_sitemaps(content) -> list:
+    """ Sitemap urls listed in robots.txt """
+    sitemaps = list()
+    for line in content.decode("utf-8", errors="replace").splitlines():
+        name, __, value = line.partition(":")
+        if name.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(value.strip())
+    return sitemaps
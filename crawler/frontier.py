@@ -0,0 +1,193 @@
+"""
+Url frontier of a discovery: canonical urls of articles, each one once, in discovery order or newest first.
+Duplicates are detected by a Bloom filter, a few bytes per url, and only the urls it may have seen are checked
+against the exact set of urls, kept in a temporary SQLite database on disk instead of in memory.
+"""
+import hashlib
+import itertools
+import math
+import sqlite3
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+FRONTIER_ORDERS = ("discovery", "newest")
+# query parameters of analytics and share links, never part of the identity of an article
+TRACKING_PARAMS = frozenset(("fbclid", "gclid", "gclsrc", "dclid", "msclkid", "igshid", "zarsrc", "mc_cid", "mc_eid",
+                             "_ga", "_gl"))
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# characters left as they are in paths, existing percent escapes included
+PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+
+
+def canonicalize_url(url, base_url=None, drop_params=()) -> str:
+    """
+    Canonical form of an article url: joined to base_url, lower case scheme and host without default port,
+    non ASCII characters of the path percent-encoded, tracking and drop_params query parameters removed,
+    the other ones sorted, and no fragment
+    @param drop_params (iterable): other query parameters to remove, names or prefixes ending with "*"
+    """
+    url = url.strip()
+    if base_url:
+        url = urljoin(base_url, url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or "").rstrip(".")
+    if parts.port is not None and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+    path = parts.path if parts.path.isascii() else quote(parts.path, safe=PATH_SAFE)
+    query = parts.query
+    if query:
+        drop_names = {name for name in drop_params if not name.endswith("*")}
+        drop_prefixes = TRACKING_PREFIXES + tuple(name[:-1] for name in drop_params if name.endswith("*"))
+        params = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+                  if name not in TRACKING_PARAMS and name not in drop_names and not name.startswith(drop_prefixes)]
+        query = urlencode(sorted(params))
+    return urlunsplit((scheme, host, path or "/", query, ""))
+
+
+class BloomFilter:
+    """ Set of 16 bytes digests answering "maybe" or "no", with error_rate false positives up to capacity items """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        # double hashing, the odd step makes every position reachable
+        start = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:16], "little") | 1
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            yield (start + i * step) % num_bits
+
+    def add(self, digest):
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest) -> bool:
+        bits = self.bits
+        for position in self._positions(digest):
+            # most urls never seen stop at the first probes
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class UrlFrontier:
+    """
+    Canonical urls, each one once, in discovery order or newest first.
+    The Bloom filter grows by filters of double capacity (and half error rate), so its error rate stays bounded
+    whatever the number of urls. Urls are stored in a private temporary SQLite database, removed once closed.
+    """
+
+    def __init__(self, canonicalize=canonicalize_url, capacity=100_000, error_rate=0.001, newest_first=False):
+        """
+        @param canonicalize (callable): canonical form of an url
+        @param capacity (int): number of urls of the first Bloom filter
+        @param error_rate (float): false positive rate of the Bloom filter, only costs an exact lookup
+        @param newest_first (bool): order urls by publish date, newest first, instead of discovery order
+        """
+        self.canonicalize = canonicalize
+        self.newest_first = newest_first
+        self.filters = [BloomFilter(capacity, error_rate)]
+        self.num_duplicates = 0
+        self.num_false_positives = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # "": a temporary database on disk, only its cache is in memory
+        self._connection = sqlite3.connect("", check_same_thread=False)
+        self._connection.execute("CREATE TABLE urls (url TEXT PRIMARY KEY, priority REAL NOT NULL, seq INTEGER NOT NULL)")
+
+    @staticmethod
+    def _digest(url) -> bytes:
+        return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+    def _may_contain(self, digest) -> bool:
+        return any(digest in bloom_filter for bloom_filter in self.filters)
+
+    def _is_stored(self, url) -> bool:
+        return self._connection.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone() is not None
+
+    def __contains__(self, url) -> bool:
+        url = self.canonicalize(url)
+        with self._lock:
+            return self._may_contain(self._digest(url)) and self._is_stored(url)
+
+    def add(self, urls, dates=None) -> list:
+        """
+        Add the urls found on a page or a feed
+        @param dates (list): publish dates of the urls (None when unknown), used to order them newest first
+        @return (list): canonical urls never added before, in the order of urls
+        """
+        new_urls = dict()
+        rows = list()
+        with self._lock:
+            for url, date in zip(urls, dates if dates is not None else itertools.repeat(None)):
+                url = self.canonicalize(url)
+                digest = self._digest(url)
+                if self._may_contain(digest):
+                    if url in new_urls or self._is_stored(url):
+                        self.num_duplicates += 1
+                        continue
+                    self.num_false_positives += 1
+
+                bloom_filter = self.filters[-1]
+                if bloom_filter.count >= bloom_filter.capacity:
+                    bloom_filter = BloomFilter(bloom_filter.capacity * 2, bloom_filter.error_rate / 2)
+                    self.filters.append(bloom_filter)
+                bloom_filter.add(digest)
+                new_urls[url] = None
+                rows.append((url, self._get_priority(date), next(self._counter)))
+
+            with self._connection:
+                self._connection.executemany("INSERT INTO urls (url, priority, seq) VALUES (?, ?, ?)", rows)
+        return list(new_urls)
+
+    def _get_priority(self, date) -> float:
+        if not self.newest_first:
+            return 0
+        # urls without a date after the dated ones
+        return -date.timestamp() if date is not None else math.inf
+
+    def urls(self) -> list:
+        """ Every url added, in discovery order or newest first """
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT url FROM urls ORDER BY priority, seq")]
+
+    def iter_urls(self, batch_size=1000):
+        """ Every url added like urls(), read from the database batch_size at a time """
+        with self._lock:
+            cursor = self._connection.execute("SELECT url FROM urls ORDER BY priority, seq")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def memory_bytes(self) -> int:
+        """ Size of the Bloom filters """
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+    def report(self) -> str:
+        return (f"{self.num_duplicates} duplicates, {self.num_false_positives} Bloom filter false positives "
+                f"in {self.memory_bytes() / 1024:.0f} KB")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,287 @@
+"""
+Download of the images of crawled articles, on a bounded pool of threads and HTTP connections of its own
+so that slow image CDNs never hold the workers crawling articles.
+"""
+import concurrent.futures
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urljoin, urlsplit
+
+from utils import create_dir
+from .session import SessionPool, get_reported_status, get_received_bytes
+from .streaming import get_content_length
+from .throttle import Throttle
+
+IMAGE_MODES = ("none", "lead", "all")
+CHUNK_SIZE = 64 * 1024
+# mimetypes guesses uncommon extensions for some of them (.jpe)
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp",
+              "image/avif": ".avif", "image/svg+xml": ".svg"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY,
+    image_hash TEXT NOT NULL,
+    path TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    image_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS article_images (
+    article_url TEXT NOT NULL,
+    image_url TEXT NOT NULL,
+    PRIMARY KEY (article_url, image_url)
+);
+"""
+
+
+class ImageSkipped(Exception):
+    """ Image not stored: not an image, too large, or no room left in the store """
+
+
+class ImageStore:
+    """
+    Images stored by content hash in <images_dpath>/<2 first hex digits>/<sha256><extension>:
+    the same thumbnail used by many articles, even under different urls, is stored once.
+    Urls of images and of the articles using them are indexed in SQLite, already stored urls aren't downloaded again.
+    """
+
+    def __init__(self, images_dpath, max_bytes=0):
+        """
+        @param max_bytes (int): total size of the stored images, new images are skipped once reached (0 = no limit)
+        """
+        self.images_dpath = images_dpath
+        self.max_bytes = max_bytes
+        create_dir(images_dpath)
+
+        self._connection = sqlite3.connect("/".join([images_dpath, "index.sqlite3"]), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+
+    def get(self, url) -> str:
+        """ Path of the stored image of url, relative to images_dpath, None if it isn't stored """
+        with self._lock:
+            row = self._connection.execute("SELECT path FROM images WHERE url = ?", (url,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, url, content, content_type) -> tuple:
+        """
+        Store the image of url
+        @return (str): path of the image relative to images_dpath
+        @return (bool): True if the same image was already stored
+        """
+        image_hash = hashlib.sha256(content).hexdigest()
+        extension = EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ""
+        path = "/".join([image_hash[:2], image_hash + extension])
+        image_fpath = "/".join([self.images_dpath, path])
+
+        with self._lock:
+            is_duplicate = self._connection.execute("SELECT 1 FROM files WHERE image_hash = ?",
+                                                    (image_hash,)).fetchone() is not None
+            if not is_duplicate:
+                if self.max_bytes and self.total_bytes + len(content) > self.max_bytes:
+                    raise ImageSkipped("store full")
+                # reserved now, another thread downloading the same image sees it as a duplicate
+                self.total_bytes += len(content)
+                with self._connection:
+                    self._connection.execute("INSERT INTO files (image_hash, size) VALUES (?, ?)",
+                                             (image_hash, len(content)))
+
+        if not is_duplicate:
+            create_dir(os.path.dirname(image_fpath))
+            # write then rename, a reader never sees a partial image
+            tmp_fpath = f"{image_fpath}.{threading.get_ident()}.tmp"
+            with open(tmp_fpath, "wb") as file:
+                file.write(content)
+            os.replace(tmp_fpath, image_fpath)
+
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO images (url, image_hash, path, stored_at) VALUES (?, ?, ?, ?)",
+                                     (url, image_hash, path, time.time()))
+        return path, is_duplicate
+
+    def link(self, article_url, image_url):
+        """ Record that the article of article_url shows the image of image_url """
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR IGNORE INTO article_images (article_url, image_url) VALUES (?, ?)",
+                                     (article_url, image_url))
+
+    def images_of(self, article_url) -> list:
+        """ Paths of the stored images of an article, relative to images_dpath """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT images.path FROM article_images JOIN images ON images.url = article_images.image_url "
+                "WHERE article_images.article_url = ?", (article_url,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class MediaPipeline:
+    """
+    Downloads the images of written articles: their lead image (mode "lead") or all of them ("all"),
+    with image_workers threads. At most queue_size images wait for a thread, writing articles waits beyond that.
+    Images larger than max_image_bytes or which aren't images are skipped.
+    """
+
+    def __init__(self, crawler, store):
+        self.crawler = crawler
+        self.store = store
+        self.mode = crawler.download_images
+        self.max_image_bytes = crawler.image_max_kb * 1024
+        self.logger = crawler.logger
+        self.metrics = crawler.metrics
+        self.http = SessionPool(pool_size=crawler.image_workers,
+                                connect_timeout=crawler.connect_timeout,
+                                read_timeout=crawler.read_timeout,
+                                max_retries=crawler.max_retries,
+                                backoff_factor=crawler.backoff_factor,
+                                user_agent=crawler.user_agent)
+        self.throttle = Throttle(max_concurrency=crawler.image_workers, enabled=crawler.adaptive_throttle)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=crawler.image_workers,
+                                                               thread_name_prefix="images")
+        self._slots = threading.BoundedSemaphore(crawler.queue_size)
+        self._lock = threading.Lock()
+        # url -> Event set once its download is over, the same thumbnail is often queued by several articles at once
+        self._in_flight = dict()
+        self.num_pending = 0
+        self.num_downloaded = 0
+        self.num_duplicates = 0
+        self.num_reused = 0
+        self.downloaded_bytes = 0
+        self.skipped = Counter()
+
+    def get_image_urls(self, article) -> list:
+        """ Absolute urls of the images of article to download, without duplicates """
+        urls = [article.img] + (list(article.images) if self.mode == "all" else [])
+        urls = (urljoin(article.src, url.strip()) for url in urls if url and url.strip())
+        return [url for url in dict.fromkeys(urls) if urlsplit(url).scheme in ("http", "https")]
+
+    def submit(self, article):
+        """ Queue the downloads of the images of a written article, blocks while queue_size images are waiting """
+        for image_url in self.get_image_urls(article):
+            self._slots.acquire()
+            with self._lock:
+                self.num_pending += 1
+            future = self._executor.submit(self.download, article.src, image_url)
+            future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        with self._lock:
+            self.num_pending -= 1
+        self._slots.release()
+
+    def depth(self) -> int:
+        return self.num_pending
+
+    def download(self, article_url, image_url):
+        """
+        Link an image to its article, then download and store it unless it is already stored.
+        Articles are linked whatever the outcome, even those waiting on a concurrent download of the same url:
+        a skipped image is listed by images_of once a later run stores it.
+        """
+        with self._lock:
+            download = self._in_flight.get(image_url)
+            is_downloading = download is None
+            if is_downloading:
+                download = self._in_flight[image_url] = threading.Event()
+        if not is_downloading:
+            download.wait()
+
+        try:
+            self.store.link(article_url, image_url)
+            if self.store.get(image_url) is not None:
+                self._count("reused")
+            elif is_downloading:
+                content, content_type = self.fetch(image_url)
+                path, is_duplicate = self.store.put(image_url, content, content_type)
+                self._count("duplicates" if is_duplicate else "downloaded", len(content))
+            else:
+                # the concurrent download of this url was skipped
+                self._skip("same url skipped")
+        except ImageSkipped as e:
+            self._skip(str(e))
+        except OSError as e:
+            self.logger.warning(f"Failed to download image {image_url}: {e!r}")
+            self._skip("error")
+        except Exception as e:
+            self.logger.error(f"Failed to store image {image_url}: {e!r}")
+            self._skip("error")
+        finally:
+            if is_downloading:
+                with self._lock:
+                    del self._in_flight[image_url]
+                download.set()
+
+    def fetch(self, url) -> tuple:
+        """
+        Download an image, stopping as soon as it is larger than max_image_bytes
+        @return (bytes): image
+        @return (str): its content type
+        """
+        with self.throttle.request(url) as slot:
+            with self.metrics.timer("image_fetch"):
+                response = self.http.get(url, stream=True)
+                slot.set_response(get_reported_status(response), response.headers)
+                try:
+                    if response.status_code != 200:
+                        raise ImageSkipped(f"HTTP {response.status_code}")
+                    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                    if not content_type.startswith("image/"):
+                        raise ImageSkipped("not an image")
+                    content_length = get_content_length(response.headers)
+                    if content_length is not None and content_length > self.max_image_bytes:
+                        raise ImageSkipped("too large")
+                    content = bytearray()
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        content += chunk
+                        if len(content) > self.max_image_bytes:
+                            raise ImageSkipped("too large")
+                finally:
+                    response.close()
+                    self.metrics.record_response(urlsplit(url).netloc, response.status_code,
+                                                 get_received_bytes(response))
+        return bytes(content), content_type
+
+    def _count(self, outcome, num_bytes=0):
+        with self._lock:
+            match outcome:
+                case "downloaded":
+                    self.num_downloaded += 1
+                    self.downloaded_bytes += num_bytes
+                case "duplicates":
+                    self.num_duplicates += 1
+                    self.downloaded_bytes += num_bytes
+                case "reused":
+                    self.num_reused += 1
+        self.metrics.inc("images_total", outcome=outcome)
+
+    def _skip(self, reason):
+        with self._lock:
+            self.skipped[reason] += 1
+        self.metrics.inc("images_total", outcome="skipped", reason=reason)
+
+    def close(self):
+        """ Wait for the queued downloads """
+        self._executor.shutdown(wait=True)
+        self.http.close()
+        self.logger.info(f"Images: {self.report()}")
+
+    def report(self) -> str:
+        report = (f"{self.num_downloaded} stored ({self.downloaded_bytes / 1024 / 1024:.1f} MB downloaded), "
+                  f"{self.num_duplicates} duplicates of stored images, {self.num_reused} already stored urls")
+        if self.skipped:
+            report += ", skipped: " + ", ".join(f"{count} {reason}" for reason, count in self.skipped.most_common())
+        return report
@@ -0,0 +1,280 @@
+import bisect
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+PREFIX = "vnnews"
+
+
+class Histogram:
+    """ Latency histogram with fixed buckets, like a Prometheus histogram """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q) -> float:
+        """ Upper bound of the bucket holding the q-quantile """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {"count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99)}
+
+
+class Metrics:
+    """
+    Counters, gauges and per-stage latency histograms of a crawler.
+    Stages are "throttle" (waiting for a request slot), "connect" (new connection: DNS, TCP and TLS),
+    "dns" (async engine only), "fetch" (whole request), "parse", "dedup" (near-duplicate lookup) and "write".
+    Every method does nothing when metrics are disabled, so the hot path only pays for a method call.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._histograms = collections.defaultdict(Histogram)
+        # name -> {labels (tuple of pairs): value}
+        self._counters = collections.defaultdict(lambda: collections.defaultdict(int))
+        self._gauges = dict()
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histograms[stage].observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """ Observe the time spent in the with block as a stage latency """
+        if not self.enabled:
+            yield
+            return
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started_at)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name][tuple(sorted(labels.items()))] += amount
+
+    def record_response(self, host, status, num_bytes):
+        """ Count a response of host and its bytes received from the network """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters["responses_total"][(("host", host), ("status", str(status)))] += 1
+            self._counters["bytes_downloaded_total"][(("host", host),)] += num_bytes
+
+    def set_gauge(self, name, read):
+        """
+        Register a gauge read at snapshot time
+        @param read (callable): returns {labels (tuple of (name, value) pairs): value} or a single value
+        """
+        with self._lock:
+            self._gauges[name] = read
+
+    def remove_gauge(self, name):
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def _read_gauges(self):
+        with self._lock:
+            reads = list(self._gauges.items())
+        gauges = dict()
+        for name, read in reads:
+            try:
+                values = read()
+            except Exception:
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            gauges[name] = {tuple(sorted(dict(labels).items())): value for labels, value in values.items()}
+        return gauges
+
+    def snapshot(self) -> dict:
+        """ JSON-serializable state of every metric """
+        with self._lock:
+            stages = {stage: histogram.to_dict() for stage, histogram in self._histograms.items()}
+            counters = {name: [{"labels": dict(labels), "value": value} for labels, value in values.items()]
+                        for name, values in self._counters.items()}
+        gauges = {name: [{"labels": dict(labels), "value": value} for labels, value in values.items()]
+                  for name, values in self._read_gauges().items()}
+        return {"time": time.time(),
+                "uptime": time.time() - self.started_at,
+                "stages": stages,
+                "counters": counters,
+                "gauges": gauges}
+
+    def to_prometheus(self) -> str:
+        """ Every metric in the Prometheus text exposition format """
+        lines = list()
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.count, h.sum) for stage, h in self._histograms.items()}
+            counters = {name: dict(values) for name, values in self._counters.items()}
+
+        name = f"{PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Latency of each crawling stage")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, (counts, count, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for counter, values in sorted(counters.items()):
+            lines.append(f"# TYPE {PREFIX}_{counter} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{PREFIX}_{counter}{format_labels(labels)} {value}")
+
+        for gauge, values in sorted(self._read_gauges().items()):
+            lines.append(f"# TYPE {PREFIX}_{gauge} gauge")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{PREFIX}_{gauge}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"')) for key, value in labels)
+    return "{" + pairs + "}"
+
+
+class MetricsExporter:
+    """
+    Export metrics every interval seconds, until stopped:
+    JSON snapshots appended to json_fpath (one per line), the Prometheus text format written in prometheus_fpath
+    (e.g. for the node_exporter textfile collector) and served on http://host:port/metrics if port is set
+    """
+
+    def __init__(self, metrics, interval=10, json_fpath=None, prometheus_fpath=None, port=0, host="127.0.0.1"):
+        self.metrics = metrics
+        self.interval = interval
+        self.json_fpath = json_fpath
+        self.prometheus_fpath = prometheus_fpath
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._server = None
+        if port:
+            self._server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+            self._server.daemon_threads = True
+            self._server.metrics = metrics
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        if self.json_fpath:
+            with open(self.json_fpath, "a", encoding="utf-8") as file:
+                file.write(json.dumps(self.metrics.snapshot()) + "\n")
+        if self.prometheus_fpath:
+            # write then rename, a collector never reads a partial file
+            tmp_fpath = self.prometheus_fpath + ".tmp"
+            with open(tmp_fpath, "w", encoding="utf-8") as file:
+                file.write(self.metrics.to_prometheus())
+            os.replace(tmp_fpath, self.prometheus_fpath)
+
+    def stop(self):
+        """ Stop exporting, after a last export of the final values """
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.export()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of every thread each interval seconds (cProfile only sees the thread it runs in).
+    Samples are written as collapsed stacks ("frame;frame;frame count"), the input of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = list()
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self, fpath):
+        self._stopped.set()
+        self._thread.join()
+        with open(fpath, "w", encoding="utf-8") as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
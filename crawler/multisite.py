@@ -0,0 +1,132 @@
+import os
+import threading
+
+from logger import log
+from utils import create_dir
+from . import parsing
+from .factory import get_crawler
+from .daemon import install_signal_handlers
+from .dedup import DEDUP_FNAME
+from .throttle import Throttle, WorkerBudget
+
+# job keys describing what is crawled, used to name the output directory of a job
+JOB_TARGETS = {"type": "article_type", "search": "search_query"}
+
+
+class MultiSiteRunner:
+    """
+    Run several crawling jobs (site, task, category) concurrently in one process.
+    Requests of every job share a global budget of global_workers slots, with at most site_workers[webname]
+    of them per site handed out fairly; jobs of the same site share its throttle, and all jobs share one parse pool
+    and one near-duplicate index, so a story published by several sites is kept once.
+    """
+
+    def __init__(self, config):
+        """
+        @param config (dict): configuration of every job, overridden by the items of config["jobs"]
+        """
+        self.logger = log.get_logger(name=__name__)
+        self.config = {key: value for key, value in config.items() if key != "jobs"}
+        self.budget = WorkerBudget(config.get("global_workers", 16), config.get("site_workers"))
+        self.parse_workers = config.get("parse_workers", 0)
+        self.jobs = self.get_jobs(config["jobs"])
+        self.crawlers = list()
+        self.parse_pool = None
+        self.dedup_index = None
+        # stops the daemon jobs
+        self.stop_event = threading.Event()
+
+    def get_jobs(self, jobs) -> list:
+        """ Configuration of each job, written in a subdirectory of output_dpath named after the job """
+        job_configs = list()
+        names = set()
+        for index, job in enumerate(jobs):
+            job_config = {**self.config, **job}
+            webname, task = job_config["webname"], job_config.get("task", "type")
+            target = job_config.get(JOB_TARGETS.get(task))
+            if task == "url":
+                target = os.path.splitext(os.path.basename(job_config.get("urls_fpath", "")))[0]
+            name = job.get("name") or "-".join(str(part) for part in (webname, task, target) if part)
+            if name in names:
+                name = f"{name}-{index}"
+            names.add(name)
+
+            cap = self.budget.get_cap(webname)
+            job_config.update(name=name,
+                              task=task,
+                              output_dpath=job.get("output_dpath") or "/".join([self.config["output_dpath"], name]),
+                              # the budget bounds the requests, a job needs at most a thread per slot of its site
+                              num_workers=job.get("num_workers", cap),
+                              max_in_flight=job.get("max_in_flight", cap),
+                              # the parse pool is shared by all the jobs, and they can't all listen on metrics_port
+                              parse_workers=0,
+                              metrics_port=job.get("metrics_port", 0))
+            job_configs.append(job_config)
+        return job_configs
+
+    def create_crawlers(self):
+        throttles = dict()
+        for job_config in self.jobs:
+            crawler = get_crawler(**job_config)
+            webname = job_config["webname"]
+            if webname not in throttles:
+                throttles[webname] = Throttle(max_concurrency=self.budget.get_cap(webname),
+                                              rate=crawler.rate_limit,
+                                              burst=crawler.rate_burst,
+                                              enabled=crawler.adaptive_throttle,
+                                              budget=self.budget,
+                                              site=webname)
+            crawler.throttle = throttles[webname]
+            crawler.stop_event = self.stop_event
+            self.crawlers.append(crawler)
+
+        if self.parse_workers:
+            crawler_classes = {type(crawler) for crawler in self.crawlers}
+            self.parse_pool = parsing.create_parse_pool(self.crawlers[0], crawler_classes, self.parse_workers)
+            for crawler in self.crawlers:
+                crawler.parse_pool = self.parse_pool
+
+        if self.config.get("dedup", "none") != "none":
+            dedup_fpath = self.config.get("dedup_fpath") or "/".join([self.config["output_dpath"], DEDUP_FNAME])
+            create_dir(self.config["output_dpath"])
+            self.dedup_index = self.crawlers[0].create_dedup_index(dedup_fpath)
+            for crawler in self.crawlers:
+                crawler.dedup_index = self.dedup_index
+
+    def run(self) -> int:
+        """
+        Crawl every job until all of them are done
+        @return (int): number of failed urls of all jobs
+        """
+        self.create_crawlers()
+        results = dict()
+        if any(job_config["task"] == "daemon" for job_config in self.jobs):
+            install_signal_handlers(self.stop_event, self.logger)
+
+        def run_job(job_config, crawler):
+            try:
+                results[job_config["name"]] = crawler.start_crawling()
+            except Exception as e:
+                self.logger.error(f"Job {job_config['name']} failed: {e!r}")
+                results[job_config["name"]] = None
+
+        self.logger.info(f"Running {len(self.jobs)} jobs with {self.budget.total} workers: "
+                         + ", ".join(job_config["name"] for job_config in self.jobs))
+        threads = [threading.Thread(target=run_job, args=(job_config, crawler), name=job_config["name"])
+                   for job_config, crawler in zip(self.jobs, self.crawlers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        if self.dedup_index is not None:
+            self.logger.info(f"Near-duplicate articles: {self.dedup_index.report()}")
+            self.dedup_index.close()
+
+        for job_config in self.jobs:
+            num_error_urls = results.get(job_config["name"])
+            status = "crashed" if num_error_urls is None else f"{num_error_urls} failed URL"
+            self.logger.info(f"Job {job_config['name']}: {status}")
+        return sum(num_error_urls or 0 for num_error_urls in results.values())
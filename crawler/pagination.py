@@ -0,0 +1,142 @@
+import datetime
+import email.utils
+
+from .frontier import UrlFrontier
+
+# listing pages show the local time of Vietnamese websites
+VIETNAM_TZ = datetime.timezone(datetime.timedelta(hours=7))
+
+
+class ListingUrls(list):
+    """
+    Urls of articles found on a listing page, with the publish dates shown on the page when they are known,
+    one per url when the page shows the date of every article
+    """
+
+    def __init__(self, urls=(), dates=()):
+        super().__init__(urls)
+        self.dates = list(dates)
+
+
+def parse_date(value) -> datetime.datetime:
+    """
+    Publish date of a listing page or feed: epoch seconds (or milliseconds), ISO 8601, RFC 822 (RSS) or a date
+    Dates without a timezone are in Vietnamese time
+    @return (datetime): None if value isn't a date
+    """
+    if isinstance(value, datetime.datetime):
+        date = value
+    elif isinstance(value, datetime.date):
+        date = datetime.datetime(value.year, value.month, value.day)
+    elif isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().isdigit()):
+        timestamp = float(value)
+        if timestamp > 1e11:
+            timestamp /= 1000
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    else:
+        try:
+            date = datetime.datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(str(value).strip())
+            except (TypeError, ValueError):
+                return None
+    return date if date.tzinfo is not None else date.replace(tzinfo=VIETNAM_TZ)
+
+
+def get_date_cutoff(value) -> datetime.datetime:
+    """
+    @param value: a date, or a number of days before now
+    @return (datetime): None without cutoff
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=value)
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(f"Invalid date_cutoff {value!r}, expected a date or a number of days")
+    return date
+
+
+class Paginator:
+    """
+    Listing pages of a category to fetch, and urls found on them.
+    With adaptive pagination, pages are fetched by windows until a page has no url, only urls found on previous pages,
+    only urls crawled by previous runs (is_known) or only articles published before date_cutoff.
+    max_pages bounds the number of pages (0 = no bound), it is the exact number of pages without adaptive pagination.
+    Urls found are canonicalized and deduplicated by frontier.
+    """
+
+    def __init__(self, name, max_pages, adaptive=False, is_known=None, date_cutoff=None, frontier=None):
+        self.name = name
+        self.max_pages = max_pages
+        self.adaptive = adaptive
+        self.is_known = is_known
+        self.date_cutoff = date_cutoff
+        self.frontier = frontier if frontier is not None else UrlFrontier()
+        self.next_page = 1
+        self.num_pages = 0
+        self.stop_page = None
+        self.stop_reason = None
+
+    def has_next(self) -> bool:
+        if self.stop_page is not None:
+            return False
+        return not self.max_pages or self.next_page <= self.max_pages
+
+    def take_pages(self, count) -> list:
+        """ Numbers of the next count pages to fetch, fewer once the last page is reached """
+        page_numbers = list()
+        while len(page_numbers) < count and self.has_next():
+            page_numbers.append(self.next_page)
+            self.next_page += 1
+        return page_numbers
+
+    def add_page(self, page_number, articles_urls) -> list:
+        """
+        Record the urls found on a listing page, pages may be added in any order
+        @return (list): urls never found before, none for pages after the page where pagination stopped
+        """
+        self.num_pages += 1
+        if self.stop_page is not None and page_number > self.stop_page:
+            return []
+
+        if self.adaptive:
+            reason = self.get_stop_reason(articles_urls)
+            if reason is not None:
+                self.stop(page_number, reason)
+                return []
+
+        dates = getattr(articles_urls, "dates", None)
+        return self.frontier.add(articles_urls, dates if dates and len(dates) == len(articles_urls) else None)
+
+    def get_stop_reason(self, articles_urls) -> str:
+        if not articles_urls:
+            return "empty page"
+        new_urls = [self.frontier.canonicalize(url) for url in articles_urls if url not in self.frontier]
+        if not new_urls:
+            return "only urls of previous pages"
+        if self.is_known is not None and all(self.is_known(url) for url in new_urls):
+            return "only urls crawled by previous runs"
+        dates = [date for date in getattr(articles_urls, "dates", ()) if date is not None]
+        if self.date_cutoff is not None and dates and max(dates) < self.date_cutoff:
+            return f"only articles published before {self.date_cutoff:%Y-%m-%d %H:%M}"
+        return None
+
+    def stop(self, page_number, reason):
+        if self.stop_page is None or page_number < self.stop_page:
+            self.stop_page = page_number
+            self.stop_reason = reason
+
+    def urls(self) -> list:
+        return self.frontier.urls()
+
+    def report(self) -> str:
+        report = f"{len(self.frontier)} urls of {self.name} found on {self.num_pages} listing pages ({self.frontier.report()})"
+        if self.stop_page is not None:
+            report += f", stopped at page {self.stop_page} ({self.stop_reason})"
+        return report
+
+    def close(self):
+        self.frontier.close()
@@ -0,0 +1,47 @@
+"""
+Parse stage running in the worker processes of BaseCrawler.parse_pool.
+Each process owns a parse-only crawler per website, downloaded pages are sent to it and compact articles come back.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from models import Article
+
+# crawler class name -> parse-only crawler
+_crawlers = dict()
+
+
+def create_parse_pool(crawler, crawler_classes=None, max_workers=None) -> ProcessPoolExecutor:
+    """
+    Pool of crawler.parse_workers processes parsing pages with crawler's parsing settings
+    @param crawler_classes (iterable): classes of the crawlers sharing the pool, type(crawler) by default
+    @param max_workers (int): number of processes, crawler.parse_workers by default
+    """
+    # spawn: forking a process which already runs fetching threads is unsafe
+    return ProcessPoolExecutor(max_workers=max_workers or crawler.parse_workers,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker,
+                               initargs=(tuple(crawler_classes or [type(crawler)]),
+                                         {"parser": crawler.parser}))
+
+
+def init_worker(crawler_classes, config):
+    for crawler_cls in crawler_classes:
+        _crawlers[crawler_cls.__name__] = crawler_cls(**config)
+
+
+def parse_content(crawler_name, url, content) -> Article:
+    """
+    Parse a downloaded article page, description and paragraphs are materialized as plain strings
+    (a NavigableString would drag its whole tree along when pickled)
+    @param crawler_name (str): class name of the crawler of the page
+    """
+    article = _crawlers[crawler_name].parse_content(url, content)
+    if article is None:
+        return None
+    return Article(str(article.title),
+                   (str(p) for p in article.description),
+                   (str(p) for p in article.paragraphs),
+                   article.src,
+                   article.img and str(article.img),
+                   (str(url) for url in article.images))
@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import os
+import queue
+import threading
+import time
+
+from tqdm import tqdm
+
+from utils import create_dir, read_file
+from .cache import LISTING
+from .failures import DeadLetterFile, get_retry_delay, DEAD_LETTER_FNAME
+
+PAGE = "page"
+ARTICLE = "article"
+
+
+class Category:
+    """ Output files and deduplication state of a category (or search query) being crawled """
+
+    def __init__(self, name, urls_fpath, results_dpath, get_page_url, parse_page, resume=False):
+        """ @param resume (bool): crawl the urls found by an interrupted run instead of fetching the listing pages """
+        self.name = name
+        self.urls_fpath = urls_fpath
+        self.results_dpath = results_dpath
+        self.get_page_url = get_page_url
+        self.parse_page = parse_page
+        self.is_resumed = resume and os.path.exists(urls_fpath)
+
+        create_dir(results_dpath)
+        self.urls_file = open(urls_fpath, "a", encoding="utf-8")
+        self.dead_letters = DeadLetterFile("/".join([results_dpath, DEAD_LETTER_FNAME]))
+        # listing pages to fetch and urls already found, set by the pipeline
+        self.paginator = None
+        self.num_urls = 0
+        self.num_error_urls = 0
+
+    def close(self):
+        self.urls_file.close()
+        self.dead_letters.close()
+        if self.paginator is not None:
+            self.paginator.close()
+
+
+class DiscoveryPipeline:
+    """
+    Crawl listing pages of several categories and their articles at the same time.
+    Urls found on a listing page are deduplicated then crawled right away by the same workers,
+    jobs are prioritized by page number so every category moves forward together.
+    Urls failed by a transient error are crawled again after every other job, once their backoff is over.
+    """
+
+    def __init__(self, crawler, categories):
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.categories = categories
+        for category in categories:
+            category.paginator = crawler.create_paginator(category.name)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.progress_bar = None
+
+    def page_jobs(self):
+        """
+        First listing page jobs of all categories, interleaved: every page with fixed pagination,
+        page_window pages per category with adaptive pagination, the next ones are added as pages are done
+        """
+        windows = [self.resumed_jobs(category) if category.is_resumed else self.next_page_jobs(category, self.window)
+                   for category in self.categories]
+        return sorted(job for jobs in windows for job in jobs)
+
+    def resumed_jobs(self, category) -> list:
+        """ Article jobs of the urls found by the interrupted run, like the non-pipelined crawl does on resume """
+        self.logger.info(f"Resuming from urls of {category.name} found by the interrupted run...")
+        with self._lock:
+            return self.claim_urls(category, 0, (url for url in read_file(category.urls_fpath) if url))
+
+    @property
+    def window(self):
+        return self.crawler.page_window if self.crawler.pagination == "adaptive" else self.crawler.total_pages
+
+    def next_page_jobs(self, category, count=1) -> list:
+        with self._lock:
+            return [(page_number, next(self._counter), (PAGE, category, page_number))
+                    for page_number in category.paginator.take_pages(count)]
+
+    def add_urls(self, category, page_number, articles_urls):
+        """
+        Record urls found in a listing page
+        @return (list): article jobs of the urls never seen in this category, and the next listing page job
+        """
+        if self.crawler.is_stopping():
+            return []
+        with self._lock:
+            new_urls = category.paginator.add_page(page_number, articles_urls)
+            for url in new_urls:
+                category.urls_file.write(url + "\n")
+            jobs = self.claim_urls(category, page_number, new_urls)
+        return jobs + self.next_page_jobs(category)
+
+    def claim_urls(self, category, page_number, urls) -> list:
+        """ Article jobs of urls not crawled by a previous run, called with the lock """
+        jobs = list()
+        for url in urls:
+            index = self.crawler.claim_url(url, category.results_dpath, category.num_urls)
+            category.num_urls += 1
+            if index is None:
+                # crawled by a previous run
+                continue
+            # articles of a page come before the next listing pages
+            jobs.append((page_number, next(self._counter), (ARTICLE, category, url, index, 1, 0)))
+        self.progress_bar.total += len(jobs)
+        self.progress_bar.refresh()
+        return jobs
+
+    def add_result(self, job, failure):
+        """
+        Record the result of an article job
+        @param failure (Failure): None if its url was crawled
+        @return (list): the job crawling its url again if it failed with a transient error and has attempts left
+        """
+        __, category, url, index, attempt, __ = job
+        crawler = self.crawler
+        if failure is not None and failure.is_transient and attempt < crawler.max_attempts:
+            crawler.metrics.inc("retries_total", kind=failure.kind)
+            due_at = time.monotonic() + get_retry_delay(attempt, crawler.retry_backoff, crawler.retry_max_delay)
+            return [(float("inf"), next(self._counter), (ARTICLE, category, url, index, attempt + 1, due_at))]
+
+        with self._lock:
+            self.progress_bar.update()
+            if failure is not None:
+                category.num_error_urls += 1
+                category.dead_letters.write(failure, crawler.get_output_fpath(category.results_dpath, index), attempt)
+                crawler.on_failed_url(url, failure)
+        return []
+
+    def run(self):
+        """
+        Crawl every category with the crawler engine
+        @return (int): number of failed urls
+        """
+        with tqdm(total=0, desc="URLs") as self.progress_bar:
+            try:
+                if self.crawler.engine == "async":
+                    asyncio.run(self._run_async())
+                else:
+                    self._run_threads()
+            finally:
+                self.crawler.queues.pop("pipeline", None)
+                for category in self.categories:
+                    category.close()
+
+        for category in self.categories:
+            if category.paginator.adaptive:
+                self.logger.info(category.paginator.report())
+            self.logger.info(f"The number of failed {category.name} URL: {category.num_error_urls} / {category.num_urls}")
+        return sum(category.num_error_urls for category in self.categories)
+
+    def _run_threads(self):
+        jobs = queue.PriorityQueue()
+        for job in self.page_jobs():
+            jobs.put(job)
+        self.crawler.queues["pipeline"] = jobs.qsize
+
+        workers = [threading.Thread(target=self._thread_worker, args=(jobs,), daemon=True)
+                   for _ in range(self.crawler.num_workers)]
+        for worker in workers:
+            worker.start()
+        jobs.join()
+
+        for _ in workers:
+            jobs.put((float("inf"), next(self._counter), None))
+        for worker in workers:
+            worker.join()
+
+    def _thread_worker(self, jobs):
+        while True:
+            __, __, job = jobs.get()
+            try:
+                if job is None:
+                    return
+                for new_job in self._run_job(job):
+                    jobs.put(new_job)
+            finally:
+                jobs.task_done()
+
+    def _run_job(self, job):
+        if job[0] == PAGE:
+            __, category, page_number = job
+            page_url = category.get_page_url(category.name, page_number)
+            try:
+                articles_urls = category.parse_page(page_url, self.crawler.fetch(page_url, kind=LISTING))
+            except Exception as e:
+                self.logger.info(f"Couldn't get urls of {page_url}: {e!r}")
+                return self.next_page_jobs(category)
+            if not articles_urls:
+                self.crawler.throttle.backoff(page_url)
+            return self.add_urls(category, page_number, articles_urls)
+
+        __, category, url, index, __, due_at = job
+        # retries are taken last, the worker waits for the end of their backoff
+        delay = due_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        failure = self.crawler.crawl_url(url, self.crawler.get_output_fpath(category.results_dpath, index))
+        return self.add_result(job, failure)
+
+    async def _run_async(self):
+        engine = self.crawler.get_async_engine()
+        jobs = asyncio.PriorityQueue()
+        for job in self.page_jobs():
+            jobs.put_nowait(job)
+        self.crawler.queues["pipeline"] = jobs.qsize
+
+        async with engine.client_session() as session:
+            workers = [asyncio.create_task(self._async_worker(engine, session, jobs))
+                       for _ in range(self.crawler.max_in_flight)]
+            await jobs.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _async_worker(self, engine, session, jobs):
+        while True:
+            __, __, job = await jobs.get()
+            try:
+                for new_job in await self._run_job_async(engine, session, job):
+                    jobs.put_nowait(new_job)
+            finally:
+                jobs.task_done()
+
+    async def _run_job_async(self, engine, session, job):
+        if job[0] == PAGE:
+            __, category, page_number = job
+            page_url = category.get_page_url(category.name, page_number)
+            try:
+                content = await engine.fetch(session, page_url, kind=LISTING)
+                articles_urls = await asyncio.to_thread(category.parse_page, page_url, content)
+            except Exception as e:
+                self.logger.info(f"Couldn't get urls of {page_url}: {e!r}")
+                return self.next_page_jobs(category)
+            if not articles_urls:
+                self.crawler.throttle.backoff(page_url)
+            return self.add_urls(category, page_number, articles_urls)
+
+        __, category, url, index, __, due_at = job
+        delay = due_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        failure = await engine.crawl_url(session, url, self.crawler.get_output_fpath(category.results_dpath, index))
+        return self.add_result(job, failure)
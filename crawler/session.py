@@ -0,0 +1,126 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import Retry, make_headers
+
+
+class SessionPool:
+    """
+    Thread-safe pool of keep-alive HTTP sessions, one per host.
+    Connections are reused between articles instead of doing a new TCP+TLS handshake for each request.
+    """
+
+    def __init__(self, pool_size=1, connect_timeout=5, read_timeout=20,
+                 max_retries=3, backoff_factor=0.5, user_agent=None, on_connect=None):
+        """
+        @param pool_size (int): max number of kept-alive connections per host (usually num_workers)
+        @param connect_timeout (float): seconds to wait for the connection to be established
+        @param read_timeout (float): seconds to wait between bytes sent by the server
+        @param max_retries (int): number of retries on connection errors, 429 and 5xx responses
+        @param backoff_factor (float): exponential backoff factor between retries
+        @param user_agent (str): User-Agent header, default is the requests one
+        @param on_connect (callable): called with (host, seconds) after a new connection (DNS, TCP and TLS)
+        """
+        self.pool_size = max(1, pool_size)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry = Retry(total=max_retries,
+                           backoff_factor=backoff_factor,
+                           status_forcelist=(429, 500, 502, 503, 504),
+                           allowed_methods=("GET", "HEAD"),
+                           respect_retry_after_header=True,
+                           raise_on_status=False)
+        # gzip/deflate, and brotli when the brotli package is installed
+        self.headers = make_headers(accept_encoding=True)
+        if user_agent:
+            self.headers["User-Agent"] = user_agent
+        self.pool_classes = get_timed_pool_classes(on_connect) if on_connect else None
+
+        self._sessions = dict()
+        self._lock = threading.Lock()
+
+    def get_session(self, url) -> requests.Session:
+        """ Get (or create) the session of the url's host """
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create_session()
+                self._sessions[host] = session
+        return session
+
+    def _create_session(self):
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.pool_size,
+                              max_retries=self.retry,
+                              pool_block=True)
+        if self.pool_classes is not None:
+            adapter.poolmanager.pool_classes_by_scheme = self.pool_classes
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url, **kwargs) -> requests.Response:
+        """ Send a GET request with the pool timeouts """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.get_session(url).get(url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def get_timed_pool_classes(on_connect) -> dict:
+    """ urllib3 connection pools whose connections report how long connecting took """
+
+    class TimedHTTPConnection(HTTPConnection):
+        def connect(self):
+            started_at = time.perf_counter()
+            super().connect()
+            on_connect(self.host, time.perf_counter() - started_at)
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            started_at = time.perf_counter()
+            super().connect()
+            on_connect(self.host, time.perf_counter() - started_at)
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def get_received_bytes(response) -> int:
+    """ Bytes of the response body received from the network, before decompression """
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+
+def get_reported_status(response) -> int:
+    """
+    Status of a response, or the first 429/503 status received by the retries leading to it
+    so that throttling still sees overload signals hidden by urllib3 retries
+    """
+    retries = getattr(response.raw, "retries", None)
+    for history in (retries.history if retries else ()):
+        if history.status in (429, 503):
+            return history.status
+    return response.status_code
@@ -0,0 +1,377 @@
+import csv
+import gzip
+import hashlib
+import io
+import os
+import queue
+import threading
+
+from logger import log
+from utils import create_dir
+
+logger = log.get_logger(name=__name__)
+
+COMPRESSION_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+CSV_FIELDS = ("src", "img", "title", "description", "paragraphs", "duplicate_of")
+# seconds a worker blocked by a full QueueSink waits before checking whether the consumer is gone
+QUEUE_POLL_SECONDS = 0.5
+
+
+class Sink:
+    """
+    Destination of crawled articles
+    on_written(url, output_fpath, content_hash) is called once an article is written,
+    on_failed(url, output_fpath, error) once a sink writing in the background couldn't write it
+    """
+
+    def __init__(self, on_written=None, on_failed=None):
+        self.on_written = on_written
+        self.on_failed = on_failed
+
+    def write(self, article, output_fpath):
+        """
+        @param article (Article): crawled article
+        @param output_fpath (str): file of the article, only its directory is used by bulk sinks
+        """
+        raise NotImplementedError
+
+    def depth(self) -> int:
+        """ Number of articles waiting to be written """
+        return 0
+
+    def close(self):
+        pass
+
+
+class TextSink(Sink):
+    """ One url_<index>.txt file per article """
+
+    def write(self, article, output_fpath):
+        text = str(article)
+        with open(output_fpath, "w", encoding="utf-8") as file:
+            file.write(text)
+
+        if self.on_written is not None:
+            self.on_written(article.src, output_fpath, hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+
+class QueueSink(Sink):
+    """
+    Articles handed to a consumer of the same process through a bounded queue instead of files (see crawler.api):
+    crawling workers wait while max_queued articles are waiting for the consumer
+    """
+
+    def __init__(self, on_written=None, max_queued=100):
+        super().__init__(on_written)
+        self.queue = queue.Queue(maxsize=max_queued)
+        self._is_closed = False
+        self._is_cancelled = False
+
+    def write(self, article, output_fpath):
+        if self._put(article) and self.on_written is not None:
+            # nothing is stored, the consumer got the article
+            self.on_written(article.src, output_fpath, None)
+
+    def _put(self, item) -> bool:
+        """ @return (bool): False if the consumer is gone """
+        while not self._is_cancelled:
+            try:
+                self.queue.put(item, timeout=QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        """ @return (Article): next article, None once the crawl is over """
+        return self.queue.get()
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def cancel(self):
+        """ The consumer stopped reading: articles written from now on are dropped """
+        self._is_cancelled = True
+
+    def close(self):
+        if not self._is_closed:
+            self._is_closed = True
+            self._put(None)
+
+
+class ShardWriter:
+    """ Rotating series of compressed files articles-<writer>-<shard>.<ext> in a directory """
+
+    def __init__(self, dpath, prefix, extension, compression, rotate_bytes):
+        self.dpath = dpath
+        self.prefix = prefix
+        self.extension = extension + COMPRESSION_EXTENSIONS[compression]
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.shard = 0
+        self.fpath = None
+        self._raw = self._stream = self.file = None
+        create_dir(dpath)
+
+    def open(self):
+        while True:
+            self.shard += 1
+            self.fpath = "/".join([self.dpath, f"{self.prefix}-{self.shard:05d}{self.extension}"])
+            # never overwrite the shards of previous runs
+            if not os.path.exists(self.fpath):
+                break
+        self._raw = open(self.fpath, "wb")
+        match self.compression:
+            case "gzip":
+                self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+            case "zstd":
+                import zstandard
+                self._stream = zstandard.ZstdCompressor(level=3).stream_writer(self._raw, closefd=False)
+            case _:
+                self._stream = None
+        self.file = io.TextIOWrapper(self._stream or self._raw, encoding="utf-8", newline="")
+        self.on_open()
+
+    def on_open(self):
+        """ Called after a new shard is opened (e.g. to write a header) """
+        pass
+
+    def ensure_open(self):
+        if self.file is None:
+            self.open()
+
+    def flush(self):
+        """ Flush the batch and rotate when the compressed shard is bigger than rotate_bytes """
+        self.file.flush()
+        if self.rotate_bytes and self._raw.tell() >= self.rotate_bytes:
+            self.close()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        if self._stream is not None and not self._raw.closed:
+            self._raw.close()
+        self._raw = self._stream = self.file = None
+
+
+class BulkSink(Sink):
+    """
+    Articles of every output directory are appended to a few big shards by writer threads.
+    Writers take batches of up to batch_size articles from a bounded queue, so crawling workers only
+    wait when the writers are behind.
+    """
+    extension = ""
+
+    def __init__(self, on_written=None, on_failed=None, compression="none", rotate_mb=256, num_writers=1,
+                 batch_size=100):
+        super().__init__(on_written, on_failed)
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression}, use one of {list(COMPRESSION_EXTENSIONS)}")
+        if compression == "zstd":
+            # fail now rather than in the writer threads
+            import zstandard  # noqa: F401
+        self.compression = compression
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024)
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=batch_size * num_writers * 2)
+        self._writers = [threading.Thread(target=self._run_writer, args=(i,), daemon=True)
+                         for i in range(num_writers)]
+        for writer in self._writers:
+            writer.start()
+
+    def write(self, article, output_fpath):
+        self._queue.put((article, output_fpath))
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        for _ in self._writers:
+            self._queue.put(None)
+        for writer in self._writers:
+            writer.join()
+
+    def create_shard_writer(self, dpath, writer_index) -> ShardWriter:
+        return ShardWriter(dpath, f"articles-{writer_index}", self.extension, self.compression, self.rotate_bytes)
+
+    def write_article(self, shard_writer, article) -> str:
+        """
+        Serialize article in shard_writer
+        @return (str): content hash of the serialized article
+        """
+        raise NotImplementedError
+
+    def _run_writer(self, writer_index):
+        shard_writers = dict()
+        is_closed = False
+        while not is_closed:
+            batch = list()
+            item = self._queue.get()
+            # stop at the first None: every writer must only take its own one
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                is_closed = True
+            try:
+                self._write_batch(shard_writers, writer_index, batch)
+            except Exception as e:
+                # keep draining the queue, otherwise crawling workers would wait forever
+                logger.error(f"Couldn't write {len(batch)} articles: {e!r}")
+                self._fail(batch, e)
+
+        for shard_writer in shard_writers.values():
+            shard_writer.close()
+
+    def _write_batch(self, shard_writers, writer_index, batch):
+        written = list()
+        touched = set()
+        for article, output_fpath in batch:
+            dpath = os.path.dirname(output_fpath)
+            try:
+                shard_writer = shard_writers.get(dpath)
+                if shard_writer is None:
+                    shard_writer = shard_writers[dpath] = self.create_shard_writer(dpath, writer_index)
+                shard_writer.ensure_open()
+                touched.add(dpath)
+                content_hash = self.write_article(shard_writer, article)
+            except Exception as e:
+                logger.error(f"Couldn't write article {getattr(article, 'src', article)}: {e!r}")
+                self._fail([(article, output_fpath)], e)
+                continue
+            written.append((article, output_fpath, shard_writer.fpath, content_hash))
+
+        try:
+            for dpath in touched:
+                shard_writers[dpath].flush()
+        except Exception as e:
+            # the articles of the batch may be lost with the shard
+            logger.error(f"Couldn't write {len(written)} articles: {e!r}")
+            self._fail([(article, output_fpath) for article, output_fpath, __, __ in written], e)
+            return
+
+        if self.on_written is not None:
+            for article, __, fpath, content_hash in written:
+                self.on_written(article.src, fpath, content_hash)
+
+    def _fail(self, items, error):
+        """ Report articles which couldn't be written, items are (article, output_fpath) """
+        if self.on_failed is not None:
+            for article, output_fpath in items:
+                self.on_failed(article.src, output_fpath, error)
+
+
+class JsonlSink(BulkSink):
+    """ One JSON object per line, description and paragraphs are streamed to the file """
+    extension = ".jsonl"
+
+    def write_article(self, shard_writer, article):
+        content_hash = hashlib.sha1()
+        for piece in article.iter_json():
+            shard_writer.file.write(piece)
+            content_hash.update(piece.encode("utf-8"))
+        shard_writer.file.write("\n")
+        return content_hash.hexdigest()
+
+
+class CsvShardWriter(ShardWriter):
+
+    def on_open(self):
+        self.csv_writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+        self.csv_writer.writeheader()
+
+
+class CsvSink(BulkSink):
+    """ CSV with a header per shard, description and paragraphs are joined by new lines """
+    extension = ".csv"
+
+    def create_shard_writer(self, dpath, writer_index):
+        return CsvShardWriter(dpath, f"articles-{writer_index}", self.extension, self.compression, self.rotate_bytes)
+
+    def write_article(self, shard_writer, article):
+        record = article.to_record()
+        shard_writer.csv_writer.writerow(record)
+        return hashlib.sha1("\0".join(record[field] or "" for field in CSV_FIELDS).encode("utf-8")).hexdigest()
+
+
+class ParquetShardWriter:
+    """ Rotating series of Parquet files, each batch is a row group compressed by Parquet itself """
+
+    def __init__(self, dpath, prefix, compression, rotate_bytes):
+        import pyarrow
+        self.schema = pyarrow.schema([(field, pyarrow.string()) for field in CSV_FIELDS])
+        self.dpath = dpath
+        self.prefix = prefix
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.shard = 0
+        self.fpath = None
+        self.parquet_writer = None
+        self.rows = list()
+        create_dir(dpath)
+
+    def ensure_open(self):
+        if self.parquet_writer is not None:
+            return
+        import pyarrow.parquet
+        while True:
+            self.shard += 1
+            self.fpath = "/".join([self.dpath, f"{self.prefix}-{self.shard:05d}.parquet"])
+            if not os.path.exists(self.fpath):
+                break
+        self.parquet_writer = pyarrow.parquet.ParquetWriter(self.fpath, self.schema, compression=self.compression)
+
+    def _write_rows(self):
+        import pyarrow
+        if self.rows:
+            self.parquet_writer.write_table(pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = list()
+
+    def flush(self):
+        self._write_rows()
+        if self.rotate_bytes and os.path.getsize(self.fpath) >= self.rotate_bytes:
+            self.close()
+
+    def close(self):
+        if self.parquet_writer is None:
+            return
+        self._write_rows()
+        self.parquet_writer.close()
+        self.parquet_writer = None
+
+
+class ParquetSink(BulkSink):
+    """ Parquet files (requires pyarrow), one row group per batch """
+
+    def __init__(self, on_written=None, on_failed=None, **kwargs):
+        import pyarrow.parquet  # noqa: F401
+        super().__init__(on_written, on_failed, **kwargs)
+
+    def create_shard_writer(self, dpath, writer_index):
+        return ParquetShardWriter(dpath, f"articles-{writer_index}", self.compression, self.rotate_bytes)
+
+    def write_article(self, shard_writer, article):
+        record = article.to_record()
+        shard_writer.rows.append(record)
+        return hashlib.sha1("\0".join(record[field] or "" for field in CSV_FIELDS).encode("utf-8")).hexdigest()
+
+
+SINKS = {"txt": TextSink,
+         "jsonl": JsonlSink,
+         "csv": CsvSink,
+         "parquet": ParquetSink}
+
+
+def get_sink(output_format, on_written=None, on_failed=None, **kwargs) -> Sink:
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output_format {output_format}, use one of {list(SINKS)}")
+    if output_format == "txt":
+        # written by the crawling workers, a failure is the failure of their url
+        return TextSink(on_written)
+    return SINKS[output_format](on_written, on_failed, **kwargs)
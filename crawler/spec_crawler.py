@@ -0,0 +1,123 @@
+import os
+import re
+from urllib.parse import urljoin
+
+from models import Article
+
+from .base_crawler import BaseCrawler
+from .extraction import ExtractionSpec
+from .pagination import ListingUrls, parse_date
+from logger import log
+from utils import get_config
+
+SITES_FPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sites.yml")
+SITES = get_config(SITES_FPATH)
+
+
+class SpecCrawler(BaseCrawler):
+    """
+    Crawler of a website described in sites.yml: urls of its listing pages and CSS selectors of the extracted fields
+    Specs are compiled once per class, and all fields of a page are extracted in a single pass of the parser
+    """
+    # key of the website in sites.yml
+    site = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.site is None:
+            return
+        spec = SITES[cls.site]
+        cls.spec = spec
+        cls.base_url = spec["base_url"]
+        cls.search_url = spec.get("search_url", spec["base_url"])
+        if spec.get("article_container"):
+            cls.article_container = tuple(spec["article_container"])
+        cls.article_spec = ExtractionSpec(spec["article"])
+        cls.listing_spec = ExtractionSpec(spec["listing"])
+        cls.search_spec = ExtractionSpec(spec["search"]) if "search" in spec else cls.listing_spec
+        cls.category_pattern = spec.get("category_pattern")
+        cls.drop_params = tuple(spec.get("drop_params", ()))
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.logger = log.get_logger(name=type(self).__module__)
+        self.article_type_dict = dict(enumerate(self.spec["article_types"]))
+
+    def parse_content(self, url, content) -> Article:
+        """
+        Extract title, description and paragraphs from downloaded page
+        @param url (str): url of the page
+        @param content (bytes): page content
+        @return title (str)
+        @return description (list)
+        @return paragraphs (list)
+        """
+        fields = self.article_spec.extract(content, self.parser)
+        if fields is None:
+            return None
+
+        description = fields.get("description") or []
+        paragraphs = fields.get("paragraphs") or []
+        return Article(fields["title"],
+                       [description] if isinstance(description, str) else description,
+                       [paragraphs] if isinstance(paragraphs, str) else paragraphs,
+                       url,
+                       fields.get("img"),
+                       fields.get("images"))
+
+    def get_type_page_url(self, article_type, page_number):
+        return self.spec["type_page_url"].format(base_url=self.base_url, article_type=article_type,
+                                                 page_number=page_number)
+
+    def parse_type_page(self, page_url, content):
+        """" Get urls of articles in a specific type in a page"""
+        return self.parse_page_urls(page_url, content, self.listing_spec)
+
+    def get_rss_url(self, article_type):
+        if "rss_url" not in self.spec:
+            return super().get_rss_url(article_type)
+        return self.spec["rss_url"].format(base_url=self.base_url, article_type=article_type)
+
+    def get_sitemap_urls(self, article_type):
+        if self.category_pattern is None:
+            self.logger.warning(f"{self.site} has no category_pattern, urls of its sitemaps aren't filtered by category")
+        if "sitemap_urls" not in self.spec:
+            return super().get_sitemap_urls(article_type)
+        return [url.format(base_url=self.base_url, article_type=article_type) for url in self.spec["sitemap_urls"]]
+
+    def is_url_of_type(self, url, article_type):
+        if self.category_pattern is None:
+            return True
+        pattern = self.category_pattern.format(base_url=re.escape(self.base_url), article_type=re.escape(article_type))
+        return re.match(pattern, url) is not None
+
+    def get_search_page_url(self, search_query, page_number):
+        if "search_page_url" not in self.spec:
+            return super().get_search_page_url(search_query, page_number)
+        return self.spec["search_page_url"].format(base_url=self.base_url, search_url=self.search_url,
+                                                   search_query=search_query, page_number=page_number)
+
+    def parse_search_page(self, page_url, content):
+        """
+        Fetch URLs of articles from a downloaded search result page.
+
+        @param page_url (str): The search result page url.
+        @param content (bytes): The search result page content.
+
+        @return articles_urls (list): List of article URLs from the search result page.
+        """
+        if "search_page_url" not in self.spec:
+            return super().parse_search_page(page_url, content)
+        return self.parse_page_urls(page_url, content, self.search_spec)
+
+    def parse_page_urls(self, page_url, content, spec):
+        """ Urls of the articles of a listing page, in order, with their publish dates """
+        fields = spec.extract(content, self.parser) or {}
+        hrefs = fields.get("urls", [])
+
+        if (len(hrefs) == 0):
+            self.logger.info(f"Couldn't find any news in {page_url} \nMaybe you sent too many requests, try using less workers")
+
+        # duplicates and variants of the same url are removed by the frontier of the discovery
+        return ListingUrls((urljoin(page_url, href) for href in hrefs),
+                           (parse_date(date) for date in fields.get("dates", [])))
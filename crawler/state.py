@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    output_dpath TEXT,
+    output_index INTEGER,
+    output_fpath TEXT,
+    content_hash TEXT,
+    fetched_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS urls_status ON urls (status);
+CREATE TABLE IF NOT EXISTS output_dirs (
+    output_dpath TEXT PRIMARY KEY,
+    next_index INTEGER NOT NULL
+);
+"""
+
+
+class StateStore:
+    """
+    Persistent state of crawled urls (SQLite), shared by the workers of a crawler.
+    Urls crawled by previous runs are skipped, and an interrupted run writes its remaining urls
+    in the files they were given instead of overwriting the output of other urls.
+    """
+
+    def __init__(self, db_fpath):
+        self.db_fpath = db_fpath
+        self._connection = sqlite3.connect(db_fpath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a commit doesn't wait for fsync, a crash loses at most the last commits
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def is_done(self, url) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT status FROM urls WHERE url = ?", (url,)).fetchone()
+        return row is not None and row[0] == DONE
+
+    def is_settled(self, url, max_attempts) -> bool:
+        """ Done, or failed by max_attempts runs: not worth crawling again """
+        with self._lock:
+            row = self._connection.execute("SELECT status, attempts FROM urls WHERE url = ?", (url,)).fetchone()
+        return row is not None and (row[0] == DONE or (row[0] == FAILED and row[1] >= max_attempts))
+
+    def claim(self, url, output_dpath) -> int:
+        """
+        Mark url as being crawled into output_dpath
+        @return (int): output index of url in output_dpath, the same one if url was already claimed there
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT output_dpath, output_index FROM urls WHERE url = ?",
+                                           (url,)).fetchone()
+            if row is not None and row[0] == output_dpath and row[1] is not None:
+                index = row[1]
+            else:
+                index = self._next_index(output_dpath)
+            self._connection.execute(
+                "INSERT INTO urls (url, status, output_dpath, output_index, attempts) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (url) DO UPDATE SET status = excluded.status, output_dpath = excluded.output_dpath, "
+                "output_index = excluded.output_index, attempts = attempts + 1",
+                (url, PENDING, output_dpath, index))
+        return index
+
+    def _next_index(self, output_dpath):
+        row = self._connection.execute("SELECT next_index FROM output_dirs WHERE output_dpath = ?",
+                                       (output_dpath,)).fetchone()
+        index = 0 if row is None else row[0]
+        self._connection.execute("INSERT OR REPLACE INTO output_dirs (output_dpath, next_index) VALUES (?, ?)",
+                                 (output_dpath, index + 1))
+        return index
+
+    def mark_done(self, url, output_fpath, content_hash):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO urls (url, status, output_fpath, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET status = excluded.status, output_fpath = excluded.output_fpath, "
+                "content_hash = excluded.content_hash, fetched_at = excluded.fetched_at",
+                (url, DONE, output_fpath, content_hash, time.time()))
+
+    def mark_failed(self, url):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO urls (url, status, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET status = excluded.status, fetched_at = excluded.fetched_at",
+                (url, FAILED, time.time()))
+
+    def count(self, status) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM urls WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,99 @@
+import threading
+
+from lxml import etree
+
+
+class ContainerWatcher:
+    """
+    Incremental HTML parser telling when the article container (e.g. <article class="fck_detail">) is closed,
+    everything after it (comments, related articles, scripts) doesn't need to be downloaded
+    """
+
+    def __init__(self, container):
+        """
+        @param container (tuple): (tag, class) of the element holding the last extracted fields
+        """
+        self.tag, self.class_name = container
+        self._parser = etree.HTMLPullParser(events=("end",), tag=self.tag)
+        self.is_closed = False
+
+    def feed(self, chunk) -> bool:
+        """
+        @param chunk (bytes): next bytes of the page
+        @return (bool): True once the container has been closed
+        """
+        if self.is_closed:
+            return True
+        self._parser.feed(chunk)
+        for __, element in self._parser.read_events():
+            if self.class_name in (element.get("class") or "").split():
+                self.is_closed = True
+                break
+        return self.is_closed
+
+
+def read_until_closed(chunks, container) -> tuple:
+    """
+    Read chunks until the container is closed
+    @param chunks (iterable): bytes of the page
+    @param container (tuple): (tag, class) of the article container
+    @return (bytes): page content, up to the chunk closing the container
+    @return (bool): True if the rest of the page was left unread
+    """
+    watcher = ContainerWatcher(container)
+    content = bytearray()
+    for chunk in chunks:
+        content += chunk
+        if watcher.feed(chunk):
+            return truncate_after_last_tag(content), True
+    return bytes(content), False
+
+
+def truncate_after_last_tag(content) -> bytes:
+    """ Drop the bytes after the last ">", a chunk may end in the middle of a multi-byte character """
+    return bytes(content[:content.rfind(b">") + 1])
+
+
+class StreamStats:
+    """ Bytes read and saved by streamed downloads of a website """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.num_pages = 0
+        self.num_truncated = 0
+        self.num_unknown_size = 0
+        self.bytes_read = 0
+        self.bytes_saved = 0
+
+    def add(self, bytes_read, content_length, is_truncated):
+        """
+        @param bytes_read (int): bytes received from the server
+        @param content_length (int): size of the whole response, None if the server didn't send it
+        @param is_truncated (bool): the download was stopped before the end of the page
+        """
+        with self._lock:
+            self.num_pages += 1
+            self.bytes_read += bytes_read
+            if not is_truncated:
+                return
+            self.num_truncated += 1
+            if content_length is None:
+                self.num_unknown_size += 1
+            else:
+                self.bytes_saved += max(content_length - bytes_read, 0)
+
+    def report(self) -> str:
+        total = self.bytes_read + self.bytes_saved
+        ratio = self.bytes_saved / total if total else 0
+        report = (f"stopped early on {self.num_truncated} / {self.num_pages} pages, "
+                  f"read {self.bytes_read / 1024 / 1024:.1f} MB, saved {self.bytes_saved / 1024 / 1024:.1f} MB ({ratio:.0%})")
+        if self.num_unknown_size:
+            report += f", {self.num_unknown_size} truncated pages had no Content-Length"
+        return report
+
+
+def get_content_length(headers) -> int:
+    try:
+        return int(headers["Content-Length"])
+    except (KeyError, TypeError, ValueError):
+        return None
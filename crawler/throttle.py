@@ -0,0 +1,328 @@
+import asyncio
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+BACKOFF_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """ Token bucket allowing rate requests per second with bursts up to capacity (rate = 0 means unlimited) """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def reserve(self) -> float:
+        """
+        Take a token
+        @return (float): seconds to wait before a token is available, 0 if it has been taken
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.rate:
+            return 0.0
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """ Don't give any token for the next seconds (e.g. Retry-After header) """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class HostThrottle:
+    """
+    Rate limiter and AIMD concurrency controller of a single host.
+    The number of concurrent requests is halved on 429/503 responses, empty listing pages or latency
+    going up, and grows again by one request per round trip while the host is healthy.
+    """
+
+    def __init__(self, max_concurrency, rate=0, burst=10, min_concurrency=1,
+                 decrease_factor=0.5, latency_factor=3.0):
+        """
+        @param max_concurrency (int): upper bound of concurrent requests
+        @param rate (float): upper bound of requests per second, 0 for no limit
+        @param burst (int): number of requests that can be sent at once by the token bucket
+        @param min_concurrency (int): lower bound of concurrent requests
+        @param decrease_factor (float): multiplicative decrease of concurrency and rate on backoff
+        @param latency_factor (float): backoff when latency exceeds latency_factor times the baseline
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_rate = rate
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.bucket = TokenBucket(rate, burst)
+        self.baseline_latency = None
+        self.latency = None
+        self.last_backoff = 0.0
+
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> float:
+        """
+        Take a request slot if possible
+        @return (float): 0 if the slot has been taken, otherwise seconds to wait before retrying
+        """
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return 0.01
+            wait = self.bucket.reserve()
+            if wait == 0:
+                self.in_flight += 1
+            return wait
+
+    def acquire(self):
+        """ Block until a request slot is taken """
+        while True:
+            with self._condition:
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                wait = self.bucket.reserve()
+                if wait == 0:
+                    self.in_flight += 1
+                    return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """ Wait on the event loop until a request slot is taken """
+        while wait := self.try_acquire():
+            await asyncio.sleep(wait)
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """
+        Give back a request slot and adapt the limits to the response
+        @param status (int): HTTP status, None if the request failed without response
+        @param latency (float): seconds taken by the request
+        @param retry_after (float): seconds the server asked to wait
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if status in BACKOFF_STATUSES:
+                self._backoff(retry_after)
+            elif status is not None and latency is not None:
+                self._observe_latency(latency)
+            self._condition.notify_all()
+
+    def backoff(self, retry_after=None):
+        """ Report a sign of overload which isn't visible in the response status (e.g. empty listing page) """
+        with self._condition:
+            self._backoff(retry_after)
+
+    def _observe_latency(self, latency):
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            # let the baseline follow slow changes of the network
+            self.baseline_latency = 0.99 * self.baseline_latency + 0.01 * latency
+
+        if self.latency > self.latency_factor * self.baseline_latency:
+            self._backoff()
+        else:
+            # additive increase: about one more request per round trip
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            if self.max_rate and self.bucket.rate < self.max_rate:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 100)
+
+    def _backoff(self, retry_after=None):
+        if retry_after:
+            self.bucket.pause(retry_after)
+
+        # a burst of errors usually comes from requests sent together, decrease once per round trip
+        now = time.monotonic()
+        if now - self.last_backoff < (self.latency or 1.0):
+            return
+        self.last_backoff = now
+
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        if self.max_rate:
+            self.bucket.rate = max(self.max_rate / 100, self.bucket.rate * self.decrease_factor)
+        # forget the latency of the overloaded period
+        self.latency = self.baseline_latency
+
+
+class WorkerBudget:
+    """
+    Global budget of concurrent requests shared by the crawlers of a multi-site run.
+    Each site holds at most its cap, and a free slot goes to the waiting site holding the fewest slots
+    so that a slow site keeping its slots busy doesn't starve the others.
+    """
+
+    def __init__(self, total, site_caps=None):
+        """
+        @param total (int): max number of concurrent requests of all sites
+        @param site_caps (dict): max number of concurrent requests of a site, total by default
+        """
+        self.total = max(1, total)
+        self.site_caps = site_caps or dict()
+        self.in_use = 0
+        self.by_site = collections.Counter()
+        self._waiting = collections.Counter()
+        self._condition = threading.Condition()
+
+    def get_cap(self, site) -> int:
+        return max(1, min(self.site_caps.get(site, self.total), self.total))
+
+    def _can_take(self, site):
+        if self.in_use >= self.total or self.by_site[site] >= self.get_cap(site):
+            return False
+        waiting_sites = [other for other, count in self._waiting.items()
+                         if count and self.by_site[other] < self.get_cap(other)]
+        return not waiting_sites or self.by_site[site] <= min(self.by_site[other] for other in waiting_sites)
+
+    def _take(self, site):
+        self.in_use += 1
+        self.by_site[site] += 1
+
+    def acquire(self, site):
+        """ Block until site gets a slot """
+        with self._condition:
+            self._waiting[site] += 1
+            try:
+                while not self._can_take(site):
+                    self._condition.wait()
+            finally:
+                self._waiting[site] -= 1
+            self._take(site)
+
+    async def acquire_async(self, site):
+        """ Wait on the event loop until site gets a slot """
+        with self._condition:
+            if self._can_take(site):
+                self._take(site)
+                return
+            self._waiting[site] += 1
+        try:
+            while True:
+                await asyncio.sleep(0.005)
+                with self._condition:
+                    if self._can_take(site):
+                        self._take(site)
+                        return
+        finally:
+            with self._condition:
+                self._waiting[site] -= 1
+
+    def release(self, site):
+        with self._condition:
+            self.in_use -= 1
+            self.by_site[site] -= 1
+            self._condition.notify_all()
+
+
+class Throttle:
+    """ Registry of HostThrottle, every fetch of a crawler goes through it """
+
+    def __init__(self, max_concurrency, rate=0, burst=10, enabled=True, budget=None, site=None):
+        """
+        @param budget (WorkerBudget): global budget shared with the crawlers of other sites, if any
+        @param site (str): name of the site in budget
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.enabled = enabled
+        self.budget = budget
+        self.site = site
+        self._hosts = dict()
+        self._lock = threading.Lock()
+
+    def get_host(self, url) -> HostThrottle:
+        host = urlsplit(url).netloc
+        with self._lock:
+            host_throttle = self._hosts.get(host)
+            if host_throttle is None:
+                if self.enabled:
+                    host_throttle = HostThrottle(self.max_concurrency, self.rate, self.burst)
+                else:
+                    host_throttle = HostThrottle(self.max_concurrency, self.rate, self.burst,
+                                                 min_concurrency=self.max_concurrency,
+                                                 decrease_factor=1.0, latency_factor=float("inf"))
+                self._hosts[host] = host_throttle
+        return host_throttle
+
+    @contextmanager
+    def request(self, url):
+        """
+        Hold a request slot of url's host while sending the request
+        Usage:
+            with throttle.request(url) as slot:
+                response = session.get(url)
+                slot.status = response.status_code
+        """
+        host_throttle = self.get_host(url)
+        requested_at = time.monotonic()
+        host_throttle.acquire()
+        self.acquire_budget()
+        slot = RequestSlot()
+        slot.waited = slot.started_at - requested_at
+        try:
+            yield slot
+        finally:
+            self.release_budget()
+            host_throttle.release(slot.status, time.monotonic() - slot.started_at, slot.retry_after)
+
+    def acquire_budget(self):
+        """ Take a slot of the global budget, once a slot of the host is taken """
+        if self.budget is not None:
+            self.budget.acquire(self.site)
+
+    async def acquire_budget_async(self):
+        if self.budget is not None:
+            await self.budget.acquire_async(self.site)
+
+    def release_budget(self):
+        if self.budget is not None:
+            self.budget.release(self.site)
+
+    def backoff(self, url, retry_after=None):
+        self.get_host(url).backoff(retry_after)
+
+    def in_flight(self) -> dict:
+        """ Number of requests being sent to each host """
+        with self._lock:
+            return {host: host_throttle.in_flight for host, host_throttle in self._hosts.items()}
+
+    def limits(self) -> dict:
+        """ Current concurrency limit of each host """
+        with self._lock:
+            return {host: host_throttle.limit for host, host_throttle in self._hosts.items()}
+
+
+class RequestSlot:
+    """ Outcome of a throttled request, filled by the caller """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        # seconds spent waiting for the slot
+        self.waited = 0.0
+        self.status = None
+        self.retry_after = None
+
+    def set_response(self, status, headers):
+        self.status = status
+        self.retry_after = parse_retry_after(headers.get("Retry-After"))
+
+
+def parse_retry_after(value):
+    """ Seconds of a Retry-After header, None if it is missing or is a HTTP date """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
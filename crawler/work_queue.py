@@ -0,0 +1,333 @@
+"""
+Work queue of the distributed mode: a coordinator enqueues article urls, workers on any host lease batches of them,
+crawl them and acknowledge the results. Leases which aren't acknowledged in time are given to other workers.
+"""
+import json
+import sqlite3
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    subdir TEXT NOT NULL,
+    output_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    output_fpath TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+CREATE TABLE IF NOT EXISTS subdirs (
+    subdir TEXT PRIMARY KEY,
+    next_index INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class WorkQueueError(Exception):
+    """ Error of a queue served by QueueServer, raised by HttpWorkQueue """
+
+
+class WorkQueue:
+    """
+    Lease-based queue of urls to crawl, shared by a coordinator and its workers.
+    A task is a dict {"id", "url", "subdir", "index", "attempts"}: the article of url is written
+    as the index-th file of <output_dpath>/<subdir> of the worker.
+    """
+
+    def put(self, urls, subdir="") -> int:
+        """
+        Enqueue urls which were never enqueued, their output index in subdir is given in order
+        @return (int): number of enqueued urls
+        """
+        raise NotImplementedError
+
+    def seal(self):
+        """ Tell the workers that no more urls will be enqueued """
+        raise NotImplementedError
+
+    def lease(self, worker, batch_size, lease_seconds) -> list:
+        """
+        Lease up to batch_size tasks for lease_seconds, queued ones or ones whose lease expired
+        @return (list): leased tasks
+        """
+        raise NotImplementedError
+
+    def renew(self, worker, task_ids, lease_seconds) -> list:
+        """
+        Extend the leases of tasks still being crawled by worker for lease_seconds from now
+        @return (list): ids of the tasks still leased by worker, the others were given to other workers
+        """
+        raise NotImplementedError
+
+    def complete(self, worker, results):
+        """
+        Acknowledge results of tasks leased by worker, results of tasks since leased by another worker are ignored
+        @param results (list): dicts {"id", "error", "permanent"}, error is None for a crawled url,
+        failed urls are leased again until max_attempts unless their failure is permanent
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """ Number of tasks by status, and whether the queue is sealed """
+        raise NotImplementedError
+
+    def failed_urls(self) -> list:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def is_finished(self) -> bool:
+        """ Sealed and every task is done or failed """
+        stats = self.stats()
+        return stats["sealed"] and not stats[QUEUED] and not stats[LEASED]
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue in a SQLite database, shared by the processes of a host (or a network file system).
+    Leases are taken in IMMEDIATE transactions so that two processes never lease the same task.
+    """
+
+    def __init__(self, db_fpath, max_attempts=3):
+        self.db_fpath = db_fpath
+        self.max_attempts = max_attempts
+        # autocommit, transactions are opened explicitly
+        self._connection = sqlite3.connect(db_fpath, timeout=60, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection, self._lock)
+
+    def put(self, urls, subdir=""):
+        num_urls = 0
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute("SELECT next_index FROM subdirs WHERE subdir = ?", (subdir,)).fetchone()
+            next_index = 0 if row is None else row[0]
+            for url in urls:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO tasks (url, subdir, output_index, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, subdir, next_index, QUEUED, now))
+                if cursor.rowcount:
+                    next_index += 1
+                    num_urls += 1
+            connection.execute("INSERT OR REPLACE INTO subdirs (subdir, next_index) VALUES (?, ?)", (subdir, next_index))
+        return num_urls
+
+    def seal(self):
+        with self._transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sealed', '1')")
+
+    def lease(self, worker, batch_size, lease_seconds):
+        now = time.time()
+        with self._transaction() as connection:
+            # expired leases of tasks which already had all their attempts are given up
+            connection.execute("UPDATE tasks SET status = ?, error = 'lease expired', updated_at = ? "
+                               "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                               (FAILED, now, LEASED, now, self.max_attempts))
+            rows = connection.execute(
+                "SELECT id, url, subdir, output_index, attempts FROM tasks "
+                "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY id LIMIT ?",
+                (QUEUED, LEASED, now, batch_size)).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                [(LEASED, worker, now + lease_seconds, now, row[0]) for row in rows])
+        return [{"id": task_id, "url": url, "subdir": subdir, "index": index, "attempts": attempts + 1}
+                for task_id, url, subdir, index, attempts in rows]
+
+    def renew(self, worker, task_ids, lease_seconds):
+        now = time.time()
+        renewed = list()
+        with self._transaction() as connection:
+            for task_id in task_ids:
+                cursor = connection.execute("UPDATE tasks SET lease_until = ?, updated_at = ? "
+                                            "WHERE id = ? AND status = ? AND worker = ?",
+                                            (now + lease_seconds, now, task_id, LEASED, worker))
+                if cursor.rowcount:
+                    renewed.append(task_id)
+        return renewed
+
+    def complete(self, worker, results):
+        now = time.time()
+        with self._transaction() as connection:
+            for result in results:
+                # a lease given to another worker is theirs, only their result counts
+                if result.get("error") is None:
+                    connection.execute("UPDATE tasks SET status = ?, error = NULL, updated_at = ? "
+                                       "WHERE id = ? AND status = ? AND worker = ?",
+                                       (DONE, now, result["id"], LEASED, worker))
+                else:
+                    # retried by the next lease until max_attempts
+                    connection.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? OR ? THEN ? ELSE ? END, "
+                                       "error = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                                       (self.max_attempts, result.get("permanent", False), FAILED, QUEUED,
+                                        result["error"], now, result["id"], LEASED, worker))
+
+    def stats(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+            sealed = self._connection.execute("SELECT value FROM meta WHERE key = 'sealed'").fetchone()
+        stats = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+        stats["sealed"] = sealed is not None
+        return stats
+
+    def failed_urls(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT url, error, subdir, output_index, attempts FROM tasks "
+                                            "WHERE status = ? ORDER BY id", (FAILED,)).fetchall()
+        return [{"url": url, "error": error, "subdir": subdir, "index": index, "attempts": attempts}
+                for url, error, subdir, index, attempts in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class _ImmediateTransaction:
+    """ BEGIN IMMEDIATE ... COMMIT, rolled back on error """
+
+    def __init__(self, connection, lock):
+        self.connection = connection
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+class HttpWorkQueue(WorkQueue):
+    """ Client of a queue served by QueueServer, for workers running on other hosts """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _call(self, method, **params):
+        response = self._session.post(f"{self.base_url}/{method}", json=params, timeout=self.timeout)
+        if response.status_code == 500:
+            raise WorkQueueError(f"{method} failed on {self.base_url}: {response.json()['error']}")
+        response.raise_for_status()
+        return response.json()
+
+    def put(self, urls, subdir=""):
+        return self._call("put", urls=list(urls), subdir=subdir)
+
+    def seal(self):
+        self._call("seal")
+
+    def lease(self, worker, batch_size, lease_seconds):
+        return self._call("lease", worker=worker, batch_size=batch_size, lease_seconds=lease_seconds)
+
+    def renew(self, worker, task_ids, lease_seconds):
+        return self._call("renew", worker=worker, task_ids=list(task_ids), lease_seconds=lease_seconds)
+
+    def complete(self, worker, results):
+        self._call("complete", worker=worker, results=results)
+
+    def stats(self):
+        return self._call("stats")
+
+    def failed_urls(self):
+        return self._call("failed_urls")
+
+    def close(self):
+        self._session.close()
+
+
+class QueueServer(ThreadingHTTPServer):
+    """
+    Serve a work queue to HttpWorkQueue clients, every method is a POST /<method> with JSON parameters.
+    Requests aren't authenticated: the queue is only served on localhost unless another host is given
+    """
+    daemon_threads = True
+    METHODS = ("put", "seal", "lease", "renew", "complete", "stats", "failed_urls")
+
+    def __init__(self, queue, host="127.0.0.1", port=8765):
+        super().__init__((host, port), QueueRequestHandler)
+        self.queue = queue
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class QueueRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        method = self.path.strip("/")
+        if method not in QueueServer.METHODS:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        params = json.loads(self.rfile.read(length) or b"{}")
+        try:
+            body = json.dumps(getattr(self.server.queue, method)(**params))
+            status = 200
+        except Exception as e:
+            body = json.dumps({"error": repr(e)})
+            status = 500
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+QUEUE_BACKENDS = {"sqlite": SQLiteWorkQueue,
+                  "http": HttpWorkQueue}
+
+
+def open_work_queue(queue_url, max_attempts=3) -> WorkQueue:
+    """
+    @param queue_url (str): "http://host:port" of a coordinator serving its queue,
+                            otherwise the path of the SQLite database ("sqlite:///path" or "path")
+    """
+    if queue_url.startswith(("http://", "https://")):
+        return QUEUE_BACKENDS["http"](queue_url)
+    return QUEUE_BACKENDS["sqlite"](queue_url.removeprefix("sqlite://"), max_attempts=max_attempts)
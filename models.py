@@ -1,21 +1,88 @@
+import json
+from dataclasses import dataclass
+
+DEFAULT_IMG = "https://assets.appsmith.com/widgets/default.png"
+
+
+@dataclass(slots=True)
 class Article:
-    def __init__(self, title: str, description, paragraphs, src: str, img: str):
-        self.title = title
-        self.description = description
-        self.paragraphs = paragraphs
-        self.src = src
-        self.img = img
+    """
+    Extracted article, its description, paragraphs and images are materialized once as tuples:
+    an article can be read by several threads, written by several sinks and pickled
+    """
+    title: str
+    description: tuple
+    paragraphs: tuple
+    src: str
+    img: str
+    # urls of all the images of the article, downloaded with download_images: "all"
+    images: tuple = ()
+    # url of the first crawled copy of a near-duplicate article, see dedup_policy
+    duplicate_of: str = None
 
-    def __str__(self):
-        _str = self.src + "\n\n"
-        _str += (self.img or "https://assets.appsmith.com/widgets/default.png") + "\n\n"
-        _str += self.title + "\n\n"
+    def __post_init__(self):
+        self.description = tuple(self.description)
+        self.paragraphs = tuple(self.paragraphs)
+        self.images = tuple(self.images or ())
+
+    def iter_text(self):
+        """ Pieces of the text representation, a near-duplicate ends with a "duplicate_of: <url>" line """
+        yield self.src
+        yield "\n\n"
+        yield self.img or DEFAULT_IMG
+        yield "\n\n"
+        yield self.title
+        yield "\n\n"
 
         for p in self.description:
-            _str += p + "\n"
-        _str += "\n"
+            yield p
+            yield "\n"
+        yield "\n"
 
         for p in self.paragraphs:
-            _str += p + "\n"
+            yield p
+            yield "\n"
+
+        if self.duplicate_of is not None:
+            yield "\nduplicate_of: "
+            yield self.duplicate_of
+            yield "\n"
 
-        return _str
+    def iter_json(self):
+        """ Pieces of a one-line JSON object """
+        yield '{"src": '
+        yield json.dumps(self.src, ensure_ascii=False)
+        yield ', "img": '
+        yield json.dumps(self.img, ensure_ascii=False)
+        yield ', "title": '
+        yield json.dumps(self.title, ensure_ascii=False)
+
+        yield ', "description": ['
+        for i, p in enumerate(self.description):
+            if i:
+                yield ", "
+            yield json.dumps(p, ensure_ascii=False)
+
+        yield '], "paragraphs": ['
+        for i, p in enumerate(self.paragraphs):
+            if i:
+                yield ", "
+            yield json.dumps(p, ensure_ascii=False)
+        yield "]"
+
+        if self.duplicate_of is not None:
+            yield ', "duplicate_of": '
+            yield json.dumps(self.duplicate_of, ensure_ascii=False)
+        yield "}"
+
+    def to_record(self) -> dict:
+        """ Flat record with description and paragraphs joined by new lines (CSV, Parquet) """
+        return {"src": self.src,
+                "img": self.img,
+                "title": self.title,
+                "description": "\n".join(self.description),
+                "paragraphs": "\n".join(self.paragraphs),
+                "duplicate_of": self.duplicate_of}
+
+    def __str__(self):
+        return "".join(self.iter_text())
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# modules of the repository are imported from its root, like VNNewsCrawler.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.server import NewsServer  # noqa: E402
+
+
+@pytest.fixture
+def news_server():
+    """ Local vnexpress stand-in serving the same article page for every article url """
+    server = NewsServer(webname="vnexpress", pages_per_type=1, per_page=5, seed=0).start()
+    yield server
+    server.stop()
+
+
+def write_urls(fpath, urls):
+    with open(fpath, "w", encoding="utf-8") as file:
+        file.write("\n".join(urls))
+    return fpath
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from conftest import write_urls
+from crawler.factory import get_crawler
+from models import Article
+
+
+def read_duplicate_of(fpath):
+    """ duplicate_of line of a txt article, None for an original """
+    with open(fpath, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    if lines and lines[-1].startswith("duplicate_of: "):
+        return lines[-1].removeprefix("duplicate_of: ")
+    return None
+
+
+def test_text_of_duplicate_ends_with_duplicate_of():
+    article = Article("Tiêu đề", ["Mô tả"], ["Đoạn 1", "Đoạn 2"], "https://a.vn/2.html", None,
+                      duplicate_of="https://a.vn/1.html")
+    assert str(article).endswith("Đoạn 2\n\nduplicate_of: https://a.vn/1.html\n")
+    assert "duplicate_of" not in str(Article("Tiêu đề", [], [], "https://a.vn/1.html", None))
+
+
+@pytest.mark.parametrize("policy", ["tag", "link"])
+def test_txt_output_of_near_duplicates_links_the_original(tmp_path, news_server, policy):
+    # the server answers the same article for every url: the first one is the original of the others
+    urls = [f"{news_server.base_url}/thoi-su-{i}.html" for i in range(3)]
+    urls_fpath = write_urls(tmp_path / "urls.txt", urls)
+    output_dpath = str(tmp_path / "result")
+    crawler = get_crawler("vnexpress", task="url", urls_fpath=str(urls_fpath), output_dpath=output_dpath,
+                          num_workers=1, dedup="minhash", dedup_policy=policy)
+    assert crawler.start_crawling() == 0
+
+    fpaths = sorted(os.path.join(output_dpath, name) for name in os.listdir(output_dpath) if name.startswith("url_"))
+    assert len(fpaths) == 3
+    assert read_duplicate_of(fpaths[0]) is None
+    for fpath in fpaths[1:]:
+        assert read_duplicate_of(fpath) == urls[0]
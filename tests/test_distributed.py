@@ -0,0 +1,22 @@
+import logging
+import os
+
+from conftest import write_urls
+from crawler.factory import get_crawler
+
+
+def test_worker_crawls_with_threads_when_engine_is_async(tmp_path, news_server, caplog):
+    urls = [f"{news_server.base_url}/thoi-su-{i}.html" for i in range(3)]
+    urls_fpath = write_urls(tmp_path / "urls.txt", urls)
+    output_dpath = str(tmp_path / "result")
+    coordinator = get_crawler("vnexpress", task="url", urls_fpath=str(urls_fpath), output_dpath=output_dpath,
+                              distributed="coordinator", coordinator_wait=False)
+    assert coordinator.start_crawling() == 0
+
+    worker = get_crawler("vnexpress", task="url", output_dpath=output_dpath, num_workers=2, engine="async",
+                         distributed="worker", poll_seconds=0.05)
+    with caplog.at_level(logging.WARNING):
+        assert worker.start_crawling() == 0
+    assert any("engine: async isn't supported by distributed workers" in record.message for record in caplog.records)
+    assert sorted(name for name in os.listdir(output_dpath) if name.startswith("url_")) == \
+        ["url_000001.txt", "url_000002.txt", "url_000003.txt"]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from benchmarks.server import NewsServer
+from crawler import feeds
+from crawler.factory import get_crawler
+from crawler.feeds import FeedDiscovery
+
+
+@pytest.fixture
+def sitemap_server():
+    server = NewsServer(webname="vnexpress", pages_per_type=3, per_page=10, seed=0).start()
+    yield server
+    server.stop()
+
+
+def test_sitemaps_stream_into_the_frontier(monkeypatch, sitemap_server):
+    monkeypatch.setattr(feeds, "FRONTIER_BATCH_SIZE", 4)
+    num_workers = 2
+    crawler = get_crawler("vnexpress", task="type", base_url=sitemap_server.base_url, num_workers=num_workers)
+    discovery = FeedDiscovery(crawler)
+
+    lock = threading.Lock()
+    in_flight = max_in_flight = 0
+    iter_entries = discovery.iter_entries
+
+    def count_in_flight(feed_url):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        try:
+            yield from iter_entries(feed_url)
+        finally:
+            with lock:
+                in_flight -= 1
+
+    batch_sizes = list()
+    create_frontier = crawler.create_frontier
+
+    def spy_frontier():
+        frontier = create_frontier()
+        add = frontier.add
+        frontier.add = lambda urls, dates=None: batch_sizes.append(len(urls)) or add(urls, dates)
+        return frontier
+
+    monkeypatch.setattr(discovery, "iter_entries", count_in_flight)
+    monkeypatch.setattr(crawler, "create_frontier", spy_frontier)
+    urls = discovery.get_urls("sitemap", "thoi-su")
+
+    assert not isinstance(urls, list)
+    urls = list(urls)
+    assert len(urls) == len(set(urls)) > 0
+    assert 1 < max_in_flight <= num_workers
+    assert max(batch_sizes) <= 4
+
+
+def test_frontier_iter_urls_matches_urls():
+    crawler = get_crawler("vnexpress", task="type", frontier_order="newest")
+    frontier = crawler.create_frontier()
+    frontier.add([f"https://vnexpress.net/{i}.html" for i in range(2500)])
+    assert list(frontier.iter_urls(batch_size=1000)) == frontier.urls()
+    frontier.close()
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from crawler.factory import get_crawler
+from crawler.media import ImageSkipped
+from models import Article
+
+IMAGE_URL = "https://cdn.a.vn/thumbnail.jpg"
+
+
+def test_articles_waiting_on_a_skipped_download_are_linked(tmp_path, monkeypatch):
+    crawler = get_crawler("vnexpress", output_dpath=str(tmp_path), download_images="lead", image_workers=4)
+    crawler.open_media()
+    media = crawler.media
+    fetching = threading.Event()
+    skipped = threading.Event()
+
+    def skip_after_waiters(url):
+        fetching.set()
+        skipped.wait(5)
+        raise ImageSkipped("too large")
+
+    monkeypatch.setattr(media, "fetch", skip_after_waiters)
+    articles = [Article("Tiêu đề", [], [], f"https://a.vn/{i}.html", IMAGE_URL) for i in range(3)]
+    media.submit(articles[0])
+    assert fetching.wait(5)
+    # the other articles wait on the download of the same url
+    for article in articles[1:]:
+        media.submit(article)
+    time.sleep(0.1)
+    skipped.set()
+    media.close()
+    assert media.skipped == {"too large": 1, "same url skipped": 2}
+
+    # stored by a later run, the image is listed with every article
+    path, __ = media.store.put(IMAGE_URL, b"\xff\xd8\xff", "image/jpeg")
+    for article in articles:
+        assert media.store.images_of(article.src) == [path]
+    media.store.close()
@@ -0,0 +1,33 @@
+import os
+
+from crawler.factory import get_crawler
+
+
+def crawl_type(news_server, output_dpath, **config):
+    crawler = get_crawler("vnexpress", task="type", article_type="thoi-su", output_dpath=str(output_dpath),
+                          base_url=news_server.base_url, total_pages=1, num_workers=2, **config)
+    return crawler.start_crawling()
+
+
+def list_articles(output_dpath):
+    return sorted(os.listdir(os.path.join(output_dpath, "thoi-su")))
+
+
+def test_pipelined_files_are_named_like_other_runs(tmp_path, news_server):
+    assert crawl_type(news_server, tmp_path / "pipelined", pipeline=True) == 0
+    assert crawl_type(news_server, tmp_path / "sequential") == 0
+    pipelined = [name for name in list_articles(tmp_path / "pipelined") if name.startswith("url_")]
+    assert pipelined == [name for name in list_articles(tmp_path / "sequential") if name.startswith("url_")]
+    assert pipelined[0] == "url_000001.txt"
+
+
+def test_pipelined_resume_crawls_the_urls_found_before(tmp_path, news_server):
+    urls_dpath = tmp_path / "urls"
+    urls_dpath.mkdir()
+    found_urls = [f"{news_server.base_url}/thoi-su-found-{i}.html" for i in range(3)]
+    (urls_dpath / "thoi-su.txt").write_text("\n".join(found_urls) + "\n", encoding="utf-8")
+
+    assert crawl_type(news_server, tmp_path, pipeline=True, resume=True) == 0
+    # listing pages aren't fetched again: only the urls of the interrupted run are crawled
+    assert len([name for name in list_articles(tmp_path) if name.startswith("url_")]) == 3
+    assert (urls_dpath / "thoi-su.txt").read_text(encoding="utf-8").split() == found_urls
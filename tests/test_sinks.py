@@ -0,0 +1,49 @@
+import json
+import os
+
+from conftest import write_urls
+from crawler.factory import get_crawler
+from crawler.failures import DEAD_LETTER_FNAME, WRITE
+from crawler.sinks import JsonlSink
+
+
+def read_jsonl(fpath):
+    with open(fpath, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def read_articles(output_dpath):
+    return [article for name in sorted(os.listdir(output_dpath)) if name.startswith("articles-")
+            for article in read_jsonl(os.path.join(output_dpath, name))]
+
+
+def test_articles_the_writer_couldnt_write_are_dead_letters(tmp_path, news_server, monkeypatch):
+    urls = [f"{news_server.base_url}/thoi-su-{i}.html" for i in range(3)]
+    urls_fpath = write_urls(tmp_path / "urls.txt", urls)
+    output_dpath = str(tmp_path / "result")
+    write_article = JsonlSink.write_article
+
+    def fail_second_url(self, shard_writer, article):
+        if article.src == urls[1]:
+            raise OSError("No space left on device")
+        return write_article(self, shard_writer, article)
+
+    monkeypatch.setattr(JsonlSink, "write_article", fail_second_url)
+    crawler = get_crawler("vnexpress", task="url", urls_fpath=str(urls_fpath), output_dpath=output_dpath,
+                          num_workers=1, output_format="jsonl")
+    assert crawler.start_crawling() == 1
+
+    assert sorted(article["src"] for article in read_articles(output_dpath)) == [urls[0], urls[2]]
+    [record] = read_jsonl(os.path.join(output_dpath, DEAD_LETTER_FNAME))
+    assert record["url"] == urls[1]
+    assert record["kind"] == WRITE
+    assert record["output_fpath"] == f"{output_dpath}/url_000002.txt"
+
+    # retried like any other failed url once the writer works again
+    monkeypatch.setattr(JsonlSink, "write_article", write_article)
+    crawler = get_crawler("vnexpress", task="retry-failed", output_dpath=output_dpath, num_workers=1,
+                          output_format="jsonl")
+    assert crawler.start_crawling() == 0
+    assert sorted(article["src"] for article in read_articles(output_dpath)) == urls
+    assert read_jsonl(os.path.join(output_dpath, DEAD_LETTER_FNAME)) == []
+
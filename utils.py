@@ -1,4 +1,5 @@
-import os           
+import os
+import sys
 
 import yaml 
 from bs4 import NavigableString
@@ -9,10 +10,29 @@ def create_dir(path):
         os.makedirs(path)
 
 def read_file(path):
+    """ Lazily read lines of path, "-" reads stdin """
+    if path == "-":
+        for line in sys.stdin:
+            yield line.rstrip("\n")
+        return
+
     with open(path, encoding="utf-8") as file:
         for line in file:
             yield line.rstrip("\n")
 
+def write_lines(path, lines) -> int:
+    """
+    Write lines one by one in path, without joining them in memory
+    @return (int): number of lines written
+    """
+    num_lines = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for line in lines:
+            file.write(line)
+            file.write("\n")
+            num_lines += 1
+    return num_lines
+
 def init_output_dirs(output_dpath):
     create_dir(output_dpath)
 